@@ -53,38 +53,41 @@
 #     and if it looks like a valid OFX file, will be processed the same as a downloaded statement (scrubbed, etc.)
 #19Jun2023*rlc
 #   - add logging
-
-import os, sys, glob, time, re
-import ofx, quotes, site_cfg, scrubber
+#19Oct2026
+#   - save statements to the local warehouse (warehouse.py) when enabled in sites.dat
+#   - large import files are validated, matched and scrubbed as memory-mapped bytes (see mmapFileLimit)
+#   - startup: modules (ofx, quotes, scrubber, warehouse), sites.dat and the logger are loaded on first use,
+#     not at import.  See tools/startup_bench.py
+#   - get decrypted accounts from the credential agent (credagent.py) if it's running
+#   - split the run into getAccounts, download and sendToMoney, shared with the daemon (getdatad.py)
+
+import os, sys, glob, time, re, logging
+import site_cfg
 from control2 import *
 from rlib1 import *
 
-#startup
-print('')
-userdat = site_cfg.site_cfg()
-log = create_logger('root', 'getdata.log')
-if Debug:
-    log.warning("**DEBUG Enabled: See Control2.py to disable.")
-    log.debug('xfrdir = %s' % xfrdir)
+log = logging.getLogger('root')
 
 def getSite(ofx):
     # find matching site entry for ofx
     # matches on FID or BANKID value found in ofx and in sites list
 
     #get fid value from ofx
+    #ofx can be a str or a MappedFile
     site = None
+    search = ofx.search if isinstance(ofx, MappedFile) else lambda p: p.search(ofx)
     p = re.compile(r'<FID>(.*?)[<\s]',re.IGNORECASE | re.DOTALL)
-    r = p.search(ofx)
+    r = search(p)
     fid = r.groups()[0] if r else 'undefined'
     p = re.compile(r'<BANKID>(.*?)[<\s]',re.IGNORECASE | re.DOTALL)
-    r = p.search(ofx)
+    r = search(p)
     bankid = r.groups()[0] if r else 'undefined'
-    sites = userdat.sites
+    sites = site_cfg.userdat().sites
     if fid or bankid:
         for s in sites:
             if not site: site=sites[s]   #defaults to first site found, if matching fid/bankid not found
-            thisFid    = FieldVal(sites[s], 'fid')
-            thisBankid = FieldVal(sites[s], 'bankid')
+            thisFid    = sites[s].fid
+            thisBankid = sites[s].bankid
             if thisFid == fid or thisBankid == bankid:
                 site = sites[s]
                 log.info('Matched import file to site *%s*' % s)
@@ -92,9 +95,185 @@ def getSite(ofx):
 
     return site
 
-if __name__=="__main__":
+def getAccounts():
+    #get account info.  returns getquotes, AcctArray
+    #AcctArray = [['SiteName', 'Account#', 'AcctType', 'UserName', 'PassWord'], ...]
+    pwkey, getquotes, AcctArray = get_cfg()
+
+    if len(AcctArray) and len(pwkey):
+        #if accounts are encrypted... get them from the credential agent, or decrypt them
+        import credagent
+        agentAccts = credagent.fetch()
+        if agentAccts is not None:
+            AcctArray = agentAccts
+        else:
+            pwkey=decrypt_pw(pwkey)
+            AcctArray = acctDecrypt(AcctArray, pwkey)
+
+    return getquotes, AcctArray
 
+def download(AcctArray, getquotes, interval, accounts=True):
+    #download statements and quotes, and process the import folder, in the order they are sent to Money
+    #accounts=False skips the account downloads (e.g., scheduled quotes-only runs)
+    #returns stat1, ofxList, quoteFile1, quoteFile2, htmFileName
+    userdat = site_cfg.userdat()
     stat1 = True    #overall status flag across all operations (true == no errors getting data)
+    ofxList = []
+    quoteFile1, quoteFile2, htmFileName = '','',''
+
+    #delete old data files
+    ofxfiles = xfrdir+'*.ofx'
+    #if glob.glob(ofxfiles) != []:
+    #    os.system("del "+ofxfiles)
+    for ofxfile in glob.glob(ofxfiles):
+        os.remove(ofxfile)
+
+    log.info("Default download interval= {0} days".format(interval))
+
+    #create process Queue in the right order
+    Queue = ['Accts', 'importFiles'] if accounts else ['importFiles']
+    if userdat.savetickersfirst:
+        Queue.insert(0,'Quotes')
+    else:
+        Queue.append('Quotes')
+
+    for QEntry in Queue:
+
+        if QEntry == 'Accts':
+            if len(AcctArray) == 0:
+              log.info("No accounts have been configured. Run SETUP.PY to add accounts")
+
+            #process accounts
+            import ofx
+            badConnects = []   #track [sitename, username] for failed connections so we don't risk locking an account
+            for acct in AcctArray:
+                if [acct[0], acct[3]] not in badConnects:
+                    status, ofxFile = ofx.getOFX(acct, interval)
+                    if not status and userdat.skipFailedLogon:
+                        badConnects.append([acct[0], acct[3]])
+                    else:
+                        ofxList.append([acct[0], acct[1], ofxFile])
+                    stat1 = stat1 and status
+                    print("")
+
+        if QEntry == 'importFiles':
+            #process files from import folder [manual user downloaded files]
+            #include anything that looks like a valid ofx file regardless of extension
+            #attempts to find site entry by FID found in the ofx file
+
+            log.info('Searching %s for statements to import' % importdir)
+            import scrubber
+            for f in glob.glob(importdir+'*.*'):
+                fname     = os.path.basename(f)   #full base filename.extension
+                bname = os.path.splitext(fname)[0]     #basename w/o extension
+                bext  = os.path.splitext(fname)[1]     #file extension
+                mapped = useMappedFile(f)
+                if mapped:
+                    dat = MappedFile(f)     #large file: process as memory-mapped bytes
+                else:
+                    with open(f) as ifile:
+                        dat = ifile.read()
+
+                #only import if it looks like an ofx file
+                if validOFX(dat) != '':
+                    if mapped: dat.close()
+                else:
+                    log.info("Importing %s" % fname)
+                    if 'NEWFILEUID:PSIMPORT' not in dat[:200]:
+                        #only scrub if it hasn't already been imported (and hence, scrubbed)
+                        try:
+                            site = getSite(dat)
+                            if mapped: dat.close()
+                            scrubber.scrub(f, site)
+                        except:
+                            log.info('No site defined for %s in sites.dat: skipping scrub routines' % fname)
+                    if mapped: dat.close()
+
+                    #set NEWFILEUID:PSIMPORT to flag the file as having already been imported/scrubbed
+                    #don't want to accidentally scrub twice
+                    p = re.compile(r'NEWFILEUID:[^\r\n]*')
+                    if mapped:
+                        dat = MappedFile(f)
+                        dat.sub(p, 'NEWFILEUID:PSIMPORT')
+                        dat.save()
+                    else:
+                        with open(f, 'r') as ifile:
+                            dat = ifile.read()
+                        ofx2 = p.sub('NEWFILEUID:PSIMPORT', dat)
+                        if ofx2:
+                            with open(f, 'w') as ofile:
+                                ofile.write(ofx2)
+                    #preserve original file type but save w/ ofx extension
+                    outname = xfrdir+fname + ('' if bext=='.ofx' else '.ofx')
+                    os.rename(f, outname)
+                    ofxList.append(['import file', '', outname])
+                    log.info('%s saved to %s' % (fname, outname))
+
+        #get stock/fund quotes
+        if QEntry == 'Quotes' and getquotes:
+            import quotes
+            status, quoteFile1, quoteFile2, htmFileName = quotes.getQuotes()
+            z = ['Stock/Fund Quotes','',quoteFile1]
+            stat1 = stat1 and status
+            if glob.glob(quoteFile1) != []:
+                ofxList.append(z)
+            print("")
+
+            # display the HTML file after download if requested to always do so
+            if status and userdat.showquotehtm: os.startfile(htmFileName)
+
+    #save statements to the local warehouse (quote statements aren't saved)
+    if userdat.warehouse:
+        import warehouse
+        stmtList = [f for f in ofxList if f[2] != quoteFile1]
+        try:
+            with warehouse.Warehouse(userdat.warehouseFile) as wh:
+                n = wh.ingestList(stmtList)
+            log.info('Saved %d statement(s) to %s' % (n, userdat.warehouseFile))
+        except Exception:
+            log.exception('An error occurred saving statements to %s' % userdat.warehouseFile)
+
+    return stat1, ofxList, quoteFile1, quoteFile2, htmFileName
+
+def sendToMoney(ofxList, cfile, quoteFile2, gogo='Y', interactive=True):
+    #send the downloaded statements to Money.  gogo = Y (all files) or V (verify each file)
+    #cfile = combined file (CombineOFX), or ''.  interactive=False: the ForceQuotes statement is skipped,
+    #since it has to be accepted in Money before the others are sent
+    userdat = site_cfg.userdat()
+    if glob.glob(quoteFile2) != []:
+        if interactive:
+            if Debug: log.debug("Importing ForceQuotes statement: %s" % quoteFile2)
+            runFile(quoteFile2)  #force transactions for MoneyUK
+            input('ForceQuote statement loaded.  Accept in Money and press <Enter> to continue.')
+        else:
+            log.info('ForceQuotes statement not sent (requires confirmation): %s' % quoteFile2)
+
+    log.info('Sending statement(s) to Money...')
+    if userdat.combineofx and cfile and gogo != 'V':
+        runFile(cfile)
+    else:
+        for file in ofxList:
+            upload = True
+            if gogo == 'V':
+                #file[0] = site, file[1] = accnt#, file[2] = ofxFile
+                upload = input('Upload ' + file[0] + ' : ' + file[1] + ' (Y/N) ').upper() == 'Y'
+
+            if upload:
+               log.info("Importing " + file[2])
+               runFile(file[2])
+
+            time.sleep(0.5)   #slight delay, to force load order in Money
+
+if __name__=="__main__":
+
+    #startup
+    print('')
+    userdat = site_cfg.userdat()
+    log = create_logger('root', 'getdata.log')
+    if Debug:
+        log.warning("**DEBUG Enabled: See Control2.py to disable.")
+        log.debug('xfrdir = %s' % xfrdir)
+
     quotesExist = False
     print('')
     log.info(AboutTitle + ", Ver: " + AboutVersion)
@@ -117,107 +296,14 @@ if __name__=="__main__":
             except:
                 log.info("Invalid entry. Using defaultInterval=" + str(interval))
 
-        #get account info
-        #AcctArray = [['SiteName', 'Account#', 'AcctType', 'UserName', 'PassWord'], ...]
-        pwkey, getquotes, AcctArray = get_cfg()
-        ofxList = []
-        quoteFile1, quoteFile2, htmFileName = '','',''
-
-        if len(AcctArray) and len(pwkey):
-            #if accounts are encrypted... decrypt them
-            pwkey=decrypt_pw(pwkey)
-            AcctArray = acctDecrypt(AcctArray, pwkey)
-
-        #delete old data files
-        ofxfiles = xfrdir+'*.ofx'
-        #if glob.glob(ofxfiles) != []:
-        #    os.system("del "+ofxfiles)
-        for ofxfile in glob.glob(ofxfiles):
-            os.remove(ofxfile)
-
-        log.info("Default download interval= {0} days".format(interval))
-
-        #create process Queue in the right order
-        Queue = ['Accts', 'importFiles']
-        if userdat.savetickersfirst:
-            Queue.insert(0,'Quotes')
-        else:
-            Queue.append('Quotes')
-
-        for QEntry in Queue:
-
-            if QEntry == 'Accts':
-                if len(AcctArray) == 0:
-                  log.info("No accounts have been configured. Run SETUP.PY to add accounts")
-
-                #process accounts
-                badConnects = []   #track [sitename, username] for failed connections so we don't risk locking an account
-                for acct in AcctArray:
-                    if [acct[0], acct[3]] not in badConnects:
-                        status, ofxFile = ofx.getOFX(acct, interval)
-                        if not status and userdat.skipFailedLogon:
-                            badConnects.append([acct[0], acct[3]])
-                        else:
-                            ofxList.append([acct[0], acct[1], ofxFile])
-                        stat1 = stat1 and status
-                        print("")
-
-            if QEntry == 'importFiles':
-                #process files from import folder [manual user downloaded files]
-                #include anything that looks like a valid ofx file regardless of extension
-                #attempts to find site entry by FID found in the ofx file
-
-                log.info('Searching %s for statements to import' % importdir)
-                for f in glob.glob(importdir+'*.*'):
-                    fname     = os.path.basename(f)   #full base filename.extension
-                    bname = os.path.splitext(fname)[0]     #basename w/o extension
-                    bext  = os.path.splitext(fname)[1]     #file extension
-                    with open(f) as ifile:
-                        dat = ifile.read()
-
-                    #only import if it looks like an ofx file
-                    if validOFX(dat) == '':
-                        log.info("Importing %s" % fname)
-                        if 'NEWFILEUID:PSIMPORT' not in dat[:200]:
-                            #only scrub if it hasn't already been imported (and hence, scrubbed)
-                            try:
-                                site = getSite(dat)
-                                scrubber.scrub(f, site)
-                            except:
-                                log.info('No site defined for %s in sites.dat: skipping scrub routines' % fname)
-
-                        #set NEWFILEUID:PSIMPORT to flag the file as having already been imported/scrubbed
-                        #don't want to accidentally scrub twice
-                        with open(f, 'r') as ifile:
-                            ofx = ifile.read()
-                        p = re.compile(r'NEWFILEUID:.*')
-                        ofx2 = p.sub('NEWFILEUID:PSIMPORT', ofx)
-                        if ofx2:
-                            with open(f, 'w') as ofile:
-                                ofile.write(ofx2)
-                        #preserve original file type but save w/ ofx extension
-                        outname = xfrdir+fname + ('' if bext=='.ofx' else '.ofx')
-                        os.rename(f, outname)
-                        ofxList.append(['import file', '', outname])
-                        log.info('%s saved to %s' % (fname, outname))
-
-            #get stock/fund quotes
-            if QEntry == 'Quotes' and getquotes:
-                status, quoteFile1, quoteFile2, htmFileName = quotes.getQuotes()
-                z = ['Stock/Fund Quotes','',quoteFile1]
-                stat1 = stat1 and status
-                if glob.glob(quoteFile1) != []:
-                    ofxList.append(z)
-                else: quotesExist=False
-                print("")
-
-                # display the HTML file after download if requested to always do so
-                if status and userdat.showquotehtm: os.startfile(htmFileName)
+        getquotes, AcctArray = getAccounts()
+        stat1, ofxList, quoteFile1, quoteFile2, htmFileName = download(AcctArray, getquotes, interval)
 
         if len(ofxList) > 0:
             log.info('Downloads completed.')
             verify = False
             gogo = 'Y'
+            cfile = ''
             if userdat.combineofx and gogo != 'V':
                 cfile=combineOfx(ofxList)       #create combined file
 
@@ -228,26 +314,7 @@ if __name__=="__main__":
             if gogo == 'N': log.info('Results not sent to Money.  User cancelled.')
 
             if gogo in 'YV':
-                if glob.glob(quoteFile2) != []:
-                    if Debug: log.debug("Importing ForceQuotes statement: %s" % quoteFile2)
-                    runFile(quoteFile2)  #force transactions for MoneyUK
-                    input('ForceQuote statement loaded.  Accept in Money and press <Enter> to continue.')
-
-                log.info('Sending statement(s) to Money...')
-                if userdat.combineofx and cfile and gogo != 'V':
-                    runFile(cfile)
-                else:
-                    for file in ofxList:
-                        upload = True
-                        if gogo == 'V':
-                            #file[0] = site, file[1] = accnt#, file[2] = ofxFile
-                            upload = input('Upload ' + file[0] + ' : ' + file[1] + ' (Y/N) ').upper() == 'Y'
-
-                        if upload:
-                           log.info("Importing " + file[2])
-                           runFile(file[2])
-
-                        time.sleep(0.5)   #slight delay, to force load order in Money
+                sendToMoney(ofxList, cfile, quoteFile2, gogo)
 
             #ask to show quotes.htm if defined in sites.dat
             if userdat.askquotehtm and quotesExist:
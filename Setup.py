@@ -36,18 +36,15 @@
 #   - minor bug fix (print statement)
 #19Jun2023*rlc
 #   - add logging
+#19Oct2026
+#   - load ofx, quotes, pyDes and the logger on first use, not at import
 
-import os, sys, glob, re, pickle, shutil, time
-import pyDes, ofx, quotes, site_cfg, filecmp
+import os, sys, glob, re, shutil, time, logging
+import site_cfg, filecmp
 import rlib1
 from control2 import *  #global settings
 
-#startup
-print('')
-log = rlib1.create_logger('root', 'setup.log')
-if Debug:
-    log.warning("**DEBUG Enabled: See Control2.py to disable.")
-    log.debug('xfrdir = %s' % xfrdir)
+log = logging.getLogger('root')
 
 #global vars
 
@@ -76,12 +73,12 @@ def list_accounts(showConnectKeys=False):
         type     = acct[2]
         user     = acct[3]
         if sitename in Sites:
-            type = rlib1.FieldVal(Sites[sitename], 'caps')[1]  #default to showing the acctType from sites.dat
-            url = rlib1.FieldVal(Sites[sitename],'url')
-            ofxVer = rlib1.FieldVal(Sites[sitename], 'ofxver')
+            site = Sites[sitename]
+            type = site.caps[1]  #default to showing the acctType from sites.dat
+            url = site.url
             #clientuid can be defined for the site (sites.dat), or for the account (via setup)
-            clientUID = rlib1.FieldVal(Sites[sitename], 'clientuid')
-            if clientUID is None and rlib1.int2(ofxVer) > 102:
+            clientUID = site.clientuid
+            if clientUID is None and site.ofxver > 102:
                 clientUID = rlib1.clientUID(url, user)
             if   type == 'INVSTMT': type = 'INVESTMENT'
             elif type == 'CCSTMT':  type = 'CREDIT CARD'
@@ -95,6 +92,7 @@ def list_accounts(showConnectKeys=False):
 def config_account():
 
     #configure account settings
+    import ofx
     tmpfile='acctQuery.tmp'
     i=1
     separator_line('Site List', 1)
@@ -166,7 +164,7 @@ def config_account():
 
             acctype = ''
             #if this is a bank account, get the type (checking/savings)
-            if 'BASTMT' in rlib1.FieldVal(Sites[sitename],'CAPS'):
+            if 'BASTMT' in Sites[sitename].caps:
                 selnum = -1
                 while selnum < 0 or selnum > len(BankTypes):
                     i = 1
@@ -206,6 +204,7 @@ def config_account():
                 test_acct(acct)
 
 def test_acct(acct):
+    import ofx
     status, ofxfile = ofx.getOFX(acct, 31)
     if status:
         if ofxfile !='':
@@ -221,6 +220,7 @@ def test_acct(acct):
 
 
 def test_quotes():
+        import quotes
         status, ofxFile1, ofxFile2, htmFile = quotes.getQuotes()
         if status:
             log.info('Download completed successfully')
@@ -243,6 +243,13 @@ def test_quotes():
 #----------------------------------------------------------------------------------------
 if __name__=="__main__":
 
+    #startup
+    print('')
+    log = rlib1.create_logger('root', 'setup.log')
+    if Debug:
+        log.warning("**DEBUG Enabled: See Control2.py to disable.")
+        log.debug('xfrdir = %s' % xfrdir)
+
     print('')
     log.info(AboutTitle + ", Ver: " + AboutVersion)
 
@@ -254,7 +261,7 @@ if __name__=="__main__":
         if backup: shutil.copy('sites.dat', 'sites.bak')
 
     #get the user parameters
-    userdat = site_cfg.site_cfg()
+    userdat = site_cfg.userdat()
     Sites = userdat.sites
 
     #build a Sitenames list one time
@@ -340,7 +347,7 @@ if __name__=="__main__":
                 acctnum = AcctArray[actIndex][1]
                 user=AcctArray[actIndex][3]
                 site = Sites.get(sitename, None)
-                if site: url = rlib1.FieldVal(site,'url')      #example: url='https://test.ofx.com/my/script'
+                if site: url = site.url      #example: url='https://test.ofx.com/my/script'
 
                 if actIndex <= len(AcctArray) and actIndex >= 0 and action=='D':
                     #delete the account
@@ -426,10 +433,12 @@ if __name__=="__main__":
         #encrypt the accounts
         rlib1.acctEncrypt(AcctArray,pwkey)
         #encrypt the passkey
+        import pyDes
         k = pyDes.des(pwkey)
         pwkey = k.encrypt(pwkey, ' ')
 
     #write the data
+    import pickle
     f = open(cfgFile, 'wb')
     pickle.dump(pwkey, f)        #encrypted key (pw)
     pickle.dump(c_getquotes, f)  #get stock quotes?
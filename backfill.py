@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+# backfill.py
+# fill the quote history store (quotehist.py) with daily prices
+# Initial version: Oct-2026
+
+# Reads daily closing prices from the chart url (YahooChartURL in sites.dat, or --url) for the
+# sites.dat stocks and funds, or the tickers given, and saves them to the quote history store.
+# Symbols are fetched concurrently (quoteWorkers).  Each symbol's rows are written in one
+# transaction together with its progress, so an interrupted backfill resumes where it stopped,
+# and a later run only fetches the days since the last one.
+#
+# The url is a template with {ticker}, {period1} and {period2} (epoch seconds).  The response must
+# be in the Yahoo chart api format.  Urls that aren't on yahoo.com (e.g., a local stand-in) are
+# read without the Yahoo cookie/crumb.
+#
+# Prices include the sites.dat m: multiplier, and are saved under the s: symbol, as with getQuotes.
+# Each day is saved at the market close (QuoteMarketHours), the same key getQuotes uses, so a
+# backfilled day replaces the quote saved by a live run instead of adding a second row.
+#
+# Symbols with a c: currency are converted to QuoteCurrency with the daily closes of the Yahoo currency
+# pair (e.g., EURUSD=X), read from the same chart url.  Each day uses the rate of that day, or the last
+# one before it.  Days without a rate aren't saved, and if the pair can't be read, the symbol fails.
+# Prices in another currency are never saved.
+#
+# Usage:  backfill.py [-s start] [-e end] [-w workers] [-u url] [--restart] [ticker ...]
+
+import sys, json, argparse, logging, bisect
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import site_cfg, quotes, quotehist
+from control2 import *
+from rlib1 import *
+
+log = logging.getLogger('root')
+
+_epoch = datetime(1970,1,1)
+
+def chartURL(url, ticker, start, end):
+    #url for ticker's daily history, start through end ('YYYY-MM-DD', inclusive)
+    period1 = int((datetime.strptime(start, '%Y-%m-%d') - _epoch).total_seconds())
+    period2 = int((datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1) - _epoch).total_seconds())
+    return url.format(ticker=urllib.parse.quote(ticker, safe=''), period1=period1, period2=period2)
+
+def dailyCloses(result):
+    #chart api result --> [(day, close), ...] in date order.  day is the exchange date
+    offset = result['meta'].get('gmtoffset') or 0
+    closes = result['indicators']['quote'][0]['close']
+    days = {}
+    for t, close in zip(result.get('timestamp') or [], closes):
+        if close is None: continue      #no trading
+        days[(_epoch + timedelta(seconds=t + offset)).strftime('%Y-%m-%d')] = close
+    return sorted(days.items())
+
+def rateOn(rates, day):
+    #rate for day from rates = [(day, rate), ...] (dailyCloses): that day's, or the last one before it
+    i = bisect.bisect_right(rates, (day, float('inf')))
+    return rates[i-1][1] if i else None
+
+def parseChart(text, sec, hours, rates=None):
+    #chart api response --> quote history rows (symbol, time, name, price, pclose, pchange), one per day
+    #rates = exchange rates to QuoteCurrency (rateOn) for a c: currency.  days without a rate are dropped
+    result = json.loads(text)['chart']['result'][0]
+    meta = result['meta']
+    name = quotes.cleanName(meta.get('longName') or meta.get('shortName') or '') or sec.ticker
+    pclose = meta.get('chartPreviousClose')
+
+    rows = []
+    for day, close in dailyCloses(result):
+        factor = sec.multiplier
+        if rates is not None:
+            rate = rateOn(rates, day)
+            if rate is None:
+                pclose = close
+                continue
+            factor *= rate
+        pchange = round((close - pclose) / pclose * 100, 2) if pclose else None
+        rows.append((sec.symbol, quotehist.dailyTime(day, hours), name, round(close * factor, 2),
+                     round(pclose * factor, 2) if pclose else None, pchange))
+        pclose = close
+    return rows
+
+def request(get, url, ticker, start, end):
+    jsonURL = chartURL(url, ticker, start, end)
+    log.info('Getting history for %s: %s to %s' % (ticker, start, end))
+    if Debug: log.debug('Reading ' + jsonURL)
+    with quotes.hostLimit(jsonURL):
+        response = get(jsonURL)
+    if response.status_code != 200:
+        raise ValueError('HTTP %d' % response.status_code)
+    return response.text
+
+def fetch(get, url, sec, start, end, hours, rates=None):
+    return parseChart(request(get, url, sec.ticker, start, end), sec, hours, rates)
+
+def fetchRates(get, url, pair, start, end):
+    #daily closes of a currency pair.  starts a week early, so the first days have a rate to carry forward
+    start = (datetime.strptime(start, '%Y-%m-%d') - timedelta(days=7)).strftime('%Y-%m-%d')
+    rates = dailyCloses(json.loads(request(get, url, pair, start, end))['chart']['result'][0])
+    if not rates: raise ValueError('no rates')
+    return rates
+
+def plan(qh, secs, start, end, restart=False):
+    #returns [(sec, from, recorded start), ...] for symbols that aren't filled through end
+    jobs = []
+    for sec in secs:
+        status = None if restart else qh.backfillStatus(sec.symbol)
+        if status and status['start'] <= start and status['through'] >= start:
+            if status['through'] >= end: continue
+            frm = (datetime.strptime(status['through'], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+            jobs.append((sec, frm, status['start']))
+        else:
+            jobs.append((sec, start, start))
+    return jobs
+
+def backfill(qh, secs, start, end, url, workers, hours, timeout=None, restart=False, currency='USD'):
+    #hours = QuoteMarketHours: rows are saved at the close, as with getQuotes.  timeout = seconds per request
+    #currency = QuoteCurrency.  symbols with another c: currency are converted (fetchRates)
+    #returns (symbols filled, rows saved, symbols failed)
+    jobs = plan(qh, secs, start, end, restart)
+    log.info('%d of %d symbol(s) to backfill' % (len(jobs), len(secs)))
+    if not jobs: return 0, 0, 0
+
+    #today isn't complete until the close.  leave it to be fetched again
+    through = min(end, (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d'))
+
+    if urllib.parse.urlparse(url).netloc.endswith('yahoo.com'):
+        auth = quotes.YahooAuth(timeout=timeout)
+        session, get = auth.session, auth.get
+    else:
+        import requests
+        session = requests.session()
+        get = lambda url: session.get(url, timeout=timeout)
+
+    base = currency.upper()
+    convert = lambda sec: sec.currency and sec.currency.upper() != base
+    filled, count, failed = 0, 0, 0
+    with session, ThreadPoolExecutor(max_workers=max(1, min(workers, len(jobs)))) as pool:
+        #exchange rates first, from the earliest day needed for each currency
+        pairStart = {}
+        for sec, frm, recorded in jobs:
+            if convert(sec):
+                cur = sec.currency.upper()
+                pairStart[cur] = min(frm, pairStart.get(cur, frm))
+        futures = {pool.submit(fetchRates, get, url, '%s%s=X' % (cur, base), frm, end): cur
+                   for cur, frm in pairStart.items()}
+        rates = {}
+        for future in as_completed(futures):
+            cur = futures[future]
+            try:
+                rates[cur] = future.result()
+            except Exception as e:
+                log.warning('** %s%s=X: exchange rate request failed (%s)' % (cur, base, e))
+
+        futures = {}
+        for sec, frm, recorded in jobs:
+            secRates = None
+            if convert(sec):
+                secRates = rates.get(sec.currency.upper())
+                if secRates is None:
+                    log.warning('** %s: no exchange rates for %s to %s. Skipping.' % (sec.ticker, sec.currency, base))
+                    failed += 1
+                    continue
+            futures[pool.submit(fetch, get, url, sec, frm, end, hours, secRates)] = (sec, recorded)
+
+        for future in as_completed(futures):
+            sec, recorded = futures[future]
+            try:
+                rows = future.result()
+            except Exception as e:
+                log.warning('** %s: history request failed (%s)' % (sec.ticker, e))
+                failed += 1
+                continue
+            count += qh.addBackfill(sec.symbol, sec.ticker, rows, recorded, through)
+            filled += 1
+            log.info('%s: %d day(s) saved' % (sec.symbol, len(rows)))
+
+    return filled, count, failed
+
+def main(argv):
+    """ Main """
+
+    userdat = site_cfg.userdat()
+    today = datetime.now().strftime('%Y-%m-%d')
+    parser = argparse.ArgumentParser(description='Fill the quote history store with daily prices.')
+    parser.add_argument('tickers', nargs='*', help='ticker symbols [default: sites.dat stocks and funds]')
+    parser.add_argument('-s', '--start', help='first day (YYYY-MM-DD) [default: one year before end]')
+    parser.add_argument('-e', '--end', default=today, help='last day (YYYY-MM-DD) [default: today]')
+    parser.add_argument('-w', '--workers', type=int, default=quoteWorkers,
+                        help='concurrent requests [default: %d]' % quoteWorkers)
+    parser.add_argument('-u', '--url', default=userdat.YahooChartURL, help='chart url template [default: YahooChartURL]')
+    parser.add_argument('-d', '--db', default=userdat.quoteHistoryFile, help='database file [default: %(default)s]')
+    parser.add_argument('--restart', action='store_true', help='ignore saved progress and fetch the whole range')
+    args = parser.parse_args(argv)
+    if not args.start:
+        args.start = (datetime.strptime(args.end, '%Y-%m-%d') - timedelta(days=365)).strftime('%Y-%m-%d')
+
+    global log
+    log = create_logger('root', 'backfill.log')
+
+    items = [{'ticker': t.upper(), 'm': 1, 's': t.upper()} for t in args.tickers] or userdat.stocks + userdat.funds
+    if not items:
+        print('No stocks or funds are defined in sites.dat')
+        return 1
+    secs = [quotes.Security(item) for item in items]
+
+    with quotehist.QuoteHistory(args.db) as qh:
+        filled, count, failed = backfill(qh, secs, args.start, args.end, args.url, args.workers,
+                                         userdat.quoteMarketHours, userdat.quoteTimeout or None, args.restart,
+                                         userdat.quotecurrency)
+
+    log.info('Backfill: %d symbol(s) filled, %d day(s) saved, %d failed' % (filled, count, failed))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -15,6 +15,13 @@
 #   - Moved utility functions to rlib1 module
 # 20Jun2023
 #   - Add logging
+# 19Oct2026
+#   - Add mmapFileLimit
+#   - Add credAgentDir and credAgentIdle (credagent.py)
+#   - Add quoteWorkers and quoteHostLimit
+#   - Add quoteCacheFile
+#   - Add securityFile and securityRefresh (security master)
+#   - Add fxCacheFile
 #------------------------------------------------------------------------------------
 
 #---MODULES---
@@ -37,5 +44,23 @@ xfrdir    = os.path.join(os.path.curdir,"xfr") + os.sep
 importdir = os.path.join(os.path.curdir,"import") + os.sep
 cfgFile  = 'ofx_config.cfg'    #user account settings (can be encrypted)
 
+#statement files larger than this (MB) are validated and scrubbed as memory-mapped bytes
+mmapFileLimit = 8
+
+#credential agent (credagent.py): socket folder, and minutes without a request before the agent exits
+credAgentDir  = os.path.join(os.path.expanduser('~'), '.ofxpy')
+credAgentIdle = 120
+
+#stock/fund quotes: concurrent requests, and the limit per host (quote server)
+quoteWorkers   = 12
+quoteHostLimit = 8
+quoteCacheFile = 'quotes.cache'     #downloaded quotes, reused for QuoteCacheTTL minutes (sites.dat)
+fxCacheFile    = 'fxrates.cache'    #exchange rates for c: conversion, reused for FxCacheTTL minutes
+
+#security master: names, types, currencies and exchange time zones by ticker.  entries are
+#refreshed (full quote request) after securityRefresh days
+securityFile    = 'securities.cache'
+securityRefresh = 30
+
 DefaultAppID  = 'QWIN'
 DefaultAppVer = '2700'
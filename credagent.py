@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+
+# credagent.py
+# credential agent for unattended (scheduled) Getdata.py runs
+# Intial version: 19Oct2026
+
+# The agent asks for the Setup.py password once, decrypts the accounts in ofx_config.cfg,
+# and then serves them to Getdata.py over a Unix socket, so scheduled runs don't prompt.
+#   - the socket is created in credAgentDir (mode 0700) with mode 0600.  where supported,
+#     the connecting process must also belong to the same user (SO_PEERCRED)
+#   - the agent exits after credAgentIdle minutes without a request, or when ofx_config.cfg
+#     changes (e.g., after running Setup.py).  Getdata.py then asks for the password again
+#   - the password itself isn't kept, only the decrypted account list
+#
+# Usage:  credagent.py start [--idle minutes] [--foreground]
+#         credagent.py status | stop
+
+import os, sys, socket, struct, json, time, hashlib, argparse, logging
+from control2 import *
+from rlib1 import *
+
+log = logging.getLogger('root')
+
+_maxRequest = 65536
+
+def socketPath(cfg=cfgFile):
+    #one agent (socket) per configuration file
+    key = hashlib.sha1(os.path.realpath(cfg).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(credAgentDir, 'agent-%s.sock' % key)
+
+def _cfgKey(cfg):
+    try:
+        st = os.stat(cfg)
+        return [st.st_mtime_ns, st.st_size]
+    except OSError:
+        return None
+
+def request(cmd, cfg=cfgFile, timeout=5.0):
+    #send a request to the agent for cfg.  returns the reply (dict), or None if there's no agent
+    if not hasattr(socket, 'AF_UNIX'): return None
+    path = socketPath(cfg)
+    if not os.path.exists(path): return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(timeout)
+            s.connect(path)
+            s.sendall(json.dumps({'cmd': cmd, 'cfg': os.path.realpath(cfg)}).encode('utf-8') + b'\n')
+            with s.makefile('rb') as f:
+                reply = f.readline()
+        return json.loads(reply.decode('utf-8'))
+    except (OSError, ValueError):
+        return None
+
+def fetch(cfg=cfgFile):
+    #get the decrypted AcctArray from a running agent.  returns None if not available
+    reply = request('get', cfg)
+    if not reply: return None
+    if not reply.get('ok'):
+        log.info('Credential agent: %s' % reply.get('error'))
+        return None
+    log.info('Account credentials provided by credential agent')
+    return reply['accounts']
+
+class CredAgent:
+    """serve decrypted account credentials on a Unix socket"""
+
+    def __init__(self, cfg, AcctArray, idle):
+        self.cfg = os.path.realpath(cfg)
+        self.cfgKey = _cfgKey(cfg)
+        self.accounts = AcctArray
+        self.idle = idle * 60
+        self.path = socketPath(cfg)
+        self.started = time.time()
+        self.requests = 0
+        self.running = False
+
+    def listen(self):
+        os.makedirs(credAgentDir, mode=0o700, exist_ok=True)
+        os.chmod(credAgentDir, 0o700)
+        if os.path.exists(self.path):
+            os.remove(self.path)    #left behind by an agent that didn't exit cleanly
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(umask)
+        os.chmod(self.path, 0o600)
+        sock.listen(5)
+        return sock
+
+    def serve(self, sock):
+        self.running = True
+        deadline = time.time() + self.idle
+        try:
+            while self.running:
+                sock.settimeout(max(deadline - time.time(), 0.001))
+                try:
+                    conn, addr = sock.accept()
+                except socket.timeout:
+                    log.info('Credential agent idle for %d minutes.  Exiting.' % (self.idle // 60))
+                    break
+                with conn:
+                    conn.settimeout(5.0)
+                    try:
+                        if self.handle(conn):
+                            deadline = time.time() + self.idle
+                    except (OSError, ValueError):
+                        log.exception('Credential agent: bad request')
+        finally:
+            sock.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            self.accounts = None
+
+    def peerOK(self, conn):
+        #the client must be running as the same user (Linux).  elsewhere, the socket file mode protects it
+        if not hasattr(socket, 'SO_PEERCRED'): return True
+        pid, uid, gid = struct.unpack('3i', conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i')))
+        return uid == os.getuid()
+
+    def handle(self, conn):
+        #handle one request.  returns True if it counts as activity (resets the idle timer)
+        if not self.peerOK(conn):
+            log.warning('Credential agent: rejected connection from another user')
+            return False
+        with conn.makefile('rb') as f:
+            req = json.loads(f.readline(_maxRequest).decode('utf-8'))
+        cmd = req.get('cmd') if isinstance(req, dict) else None
+
+        if not isinstance(req, dict):
+            reply = {'ok': False, 'error': 'invalid request'}
+        elif req.get('cfg') != self.cfg:
+            reply = {'ok': False, 'error': 'agent is serving %s' % self.cfg}
+        elif cmd == 'status':
+            reply = {'ok': True, 'pid': os.getpid(), 'accounts': len(self.accounts), 'requests': self.requests,
+                     'uptime': int(time.time() - self.started), 'idle': self.idle // 60}
+        elif cmd == 'stop':
+            reply = {'ok': True}
+            self.running = False
+            log.info('Credential agent stopped.')
+        elif cmd == 'get':
+            if _cfgKey(self.cfg) != self.cfgKey:
+                #credentials changed (Setup.py).  stop, so the next run asks for the password again
+                reply = {'ok': False, 'error': '%s has changed.  Agent stopped.' % cfgFile}
+                self.running = False
+                log.info('Credential agent: %s has changed.  Exiting.' % cfgFile)
+            else:
+                self.requests += 1
+                reply = {'ok': True, 'accounts': self.accounts}
+        else:
+            reply = {'ok': False, 'error': 'unknown request'}
+
+        conn.sendall(json.dumps(reply).encode('utf-8') + b'\n')
+        return cmd == 'get'
+
+def start(idle, foreground):
+    if not hasattr(socket, 'AF_UNIX'):
+        print('The credential agent requires Unix domain sockets, which are not available on this system.')
+        return 1
+
+    reply = request('status')
+    if reply and reply.get('ok'):
+        print('Credential agent already running (pid %d).' % reply['pid'])
+        return 0
+
+    pwkey, getquotes, AcctArray = get_cfg()
+    if not len(pwkey):
+        print('%s is not encrypted.  The credential agent is not needed.' % cfgFile)
+        return 1
+    if not len(AcctArray):
+        print('No accounts have been configured.  Run SETUP.PY to add accounts')
+        return 1
+
+    pwkey = decrypt_pw(pwkey)
+    agent = CredAgent(cfgFile, acctDecrypt(AcctArray, pwkey), idle)
+    pwkey = None
+    sock = agent.listen()
+
+    if not foreground and hasattr(os, 'fork'):
+        if daemonize():
+            print('Credential agent started.  Idle expiry: %d minutes' % idle)
+            return 0
+    else:
+        print('Credential agent running.  Idle expiry: %d minutes.  Press Ctrl-C to stop.' % idle)
+
+    log.info('Credential agent started (pid %d)' % os.getpid())
+    try:
+        agent.serve(sock)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def main(argv):
+    """ Main """
+
+    parser = argparse.ArgumentParser(description='Credential agent for unattended Getdata.py runs.')
+    parser.add_argument('command', choices=['start', 'stop', 'status'])
+    parser.add_argument('-i', '--idle', type=int, default=credAgentIdle,
+                        help='exit after this many minutes without a request [default: %d]' % credAgentIdle)
+    parser.add_argument('-f', '--foreground', action='store_true', help="don't run in the background")
+    args = parser.parse_args(argv)
+
+    global log
+    log = create_logger('root', 'credagent.log')
+
+    if args.command == 'start':
+        return start(args.idle, args.foreground)
+
+    reply = request(args.command)
+    if not reply:
+        print('Credential agent is not running.')
+        return 1
+    if not reply.get('ok'):
+        print('Credential agent: %s' % reply.get('error'))
+        return 1
+    if args.command == 'status':
+        print('Credential agent running (pid %d): %d accounts, %d requests, up %d minutes, idle expiry %d minutes'
+              % (reply['pid'], reply['accounts'], reply['requests'], reply['uptime'] // 60, reply['idle']))
+    else:
+        print('Credential agent stopped.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
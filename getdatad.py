@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+# getdatad.py
+# run Getdata.py downloads on a schedule, as a long-running process (daemon)
+# Initial version: Oct-2026
+
+# The schedule is the <schedule> section of sites.dat: one line per target, followed by a cron
+# expression (minute hour day-of-month month day-of-week).  Targets:
+#   SITENAME            all accounts at the site
+#   SITENAME:ACCOUNT#   one account (overrides the site entry)
+#   default             accounts without a site or account entry
+#   quotes              stock/fund quotes (when enabled in Setup.py)
+# Accounts without an entry (and no default entry) aren't downloaded by the daemon.
+#
+# Each run is a normal Getdata.py run without the prompts: old statements in xfr are deleted, the
+# import folder is processed, statements are saved to the warehouse, and the files are combined
+# (CombineOFX) and sent to Money.  Targets that are due at the same time are downloaded in one run.
+# The ForceQuotes statement isn't sent, since it has to be accepted in Money first.
+#
+# The daemon keeps sites.dat, the decrypted accounts, the https sessions and the Yahoo cookie/crumb
+# in memory between runs.  sites.dat is read again when it changes (schedule entries that didn't change
+# keep their next run).  ofx_config.cfg is read again when it changes if it isn't encrypted, or if
+# the credential agent (credagent.py) is running.  Otherwise, restart the daemon to use the new accounts.
+#
+# Usage:  getdatad.py [--foreground] [--show]
+#         stop with kill (SIGTERM) or Ctrl-C
+
+import os, sys, signal, threading, argparse, logging
+from datetime import datetime, timedelta
+import site_cfg, Getdata
+from control2 import *
+from rlib1 import *
+
+log = logging.getLogger('root')
+
+class Cron:
+    """cron expression:  minute hour day-of-month month day-of-week (0-7, 0 and 7 = Sunday)"""
+
+    _ranges = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+    def __init__(self, expr):
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError('expected 5 fields: %s' % expr)
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, self.weekdays = \
+            [self._field(f, lo, hi) for f, (lo, hi) in zip(fields, self._ranges)]
+        if 7 in self.weekdays: self.weekdays.add(0)
+        #as with cron: if both day fields are restricted, a day matching either one is used
+        self.anyDay = fields[2] == '*'
+        self.anyWeekday = fields[4] == '*'
+
+    @staticmethod
+    def _field(field, lo, hi):
+        #'*', 'n', 'a-b', with an optional '/step', or a comma separated list of them
+        values = set()
+        for part in field.split(','):
+            rng, slash, step = part.partition('/')
+            try:
+                if rng == '*':
+                    a, b = lo, hi
+                elif '-' in rng:
+                    a, b = [int(v) for v in rng.split('-')]
+                else:
+                    a = b = int(rng)
+                    if slash: b = hi
+                step = int(step) if slash else 1
+            except ValueError:
+                raise ValueError('invalid field: %s' % field)
+            if a < lo or b > hi or a > b or step < 1:
+                raise ValueError('invalid field: %s' % field)
+            values.update(range(a, b + 1, step))
+        return values
+
+    def dayMatch(self, t):
+        weekday = (t.weekday() + 1) % 7         #cron weekdays start on Sunday
+        if self.anyDay: return weekday in self.weekdays
+        if self.anyWeekday: return t.day in self.days
+        return t.day in self.days or weekday in self.weekdays
+
+    def next(self, after):
+        #first whole minute after 'after' (datetime) that matches, or None if there isn't one
+        t = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=5*366)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self.dayMatch(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        return None
+
+class Job:
+    """schedule entry: the accounts (and quotes) downloaded when cron is due"""
+
+    def __init__(self, target, cron):
+        self.target = target
+        self.cron = cron
+        self.accounts = []
+        self.quotes = False
+        self.due = None
+
+def buildJobs(schedule, AcctArray, getquotes):
+    #schedule = [[target, cron expression], ...] (sites.dat).  each account goes to its most specific entry
+    entries = {}
+    for target, expr in schedule:
+        try:
+            entries[target] = Cron(expr)
+        except ValueError as e:
+            log.warning('sites.dat schedule for %s: %s.  Ignored.' % (target, e))
+
+    jobs = {}
+    for acct in AcctArray:
+        for target in [('%s:%s' % (acct[0], acct[1])).upper(), acct[0].upper(), 'DEFAULT']:
+            if target in entries:
+                jobs.setdefault(target, Job(target, entries[target])).accounts.append(acct)
+                break
+        else:
+            log.info('%s: %s has no schedule entry.  Not downloaded.' % (acct[0], acct[1]))
+    if getquotes and 'QUOTES' in entries:
+        jobs.setdefault('QUOTES', Job('QUOTES', entries['QUOTES'])).quotes = True
+    return list(jobs.values())
+
+def _fileKey(filename):
+    try:
+        st = os.stat(filename)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+class Daemon:
+    """scheduled Getdata runs, with config, accounts and sessions kept in memory"""
+
+    def __init__(self, getquotes, AcctArray):
+        import ofx
+        ofx.sessionPool = {}        #keep https connections open between runs
+        self.userdat = site_cfg.userdat()
+        self.getquotes = getquotes
+        self.accounts = AcctArray
+        self.cfgKey = _fileKey(cfgFile)
+        self.stop = threading.Event()
+        self.jobs = []
+        self.lastCheck = None       #when due jobs were last looked for (serve)
+        self.schedule(datetime.now())
+
+    def schedule(self, now):
+        #entries that didn't change (target and cron expression) keep their next run.  new ones are due
+        #from the last check, so a run that came due since then (e.g., while sites.dat was saved) isn't skipped
+        dues = {(job.target, job.cron.expr): job.due for job in self.jobs}
+        since = self.lastCheck or now
+        self.jobs = buildJobs(self.userdat.schedule, self.accounts, self.getquotes)
+        for job in self.jobs:
+            key = (job.target, job.cron.expr)
+            job.due = dues[key] if key in dues else job.cron.next(since)
+            if job.due is None:
+                log.warning('Schedule for %s (%s) is never due' % (job.target, job.cron.expr))
+        if not self.jobs:
+            log.warning('Nothing is scheduled.  Add a <schedule> section to sites.dat')
+
+    def reload(self, now):
+        #read sites.dat and ofx_config.cfg again if they've changed, and rebuild the schedule
+        changed = False
+        userdat = site_cfg.userdat()
+        if userdat is not self.userdat:
+            log.info('%s changed.  Reloaded.' % userdat.datfile)
+            self.userdat = userdat
+            changed = True
+
+        key = _fileKey(cfgFile)
+        if key != self.cfgKey:
+            self.cfgKey = key
+            pwkey, getquotes, AcctArray = get_cfg()
+            if len(AcctArray) and len(pwkey):
+                import credagent
+                AcctArray = credagent.fetch()
+            if AcctArray is None:
+                log.warning('%s changed, but is encrypted.  Restart getdatad.py to use the new accounts.' % cfgFile)
+            else:
+                log.info('%s changed.  Accounts reloaded.' % cfgFile)
+                self.getquotes, self.accounts = getquotes, AcctArray
+                changed = True
+
+        if changed: self.schedule(now)
+
+    def run(self, jobs):
+        #one Getdata run for the jobs that are due.  accounts are downloaded in ofx_config.cfg order
+        due = [acct for job in jobs for acct in job.accounts]
+        AcctArray = [acct for acct in self.accounts if acct in due]
+        getquotes = any(job.quotes for job in jobs)
+        log.info('Scheduled run: %s' % ', '.join(job.target for job in jobs))
+
+        if getquotes and self.userdat.enableYahooFinance:
+            import quotes
+            try:
+                if quotes.yahooAuth is None:
+                    quotes.yahooAuth = quotes.YahooAuth(timeout=self.userdat.quoteTimeout or None)
+                quotes.yahooAuth.refreshes = 0      #maxRefresh is per run
+            except Exception:
+                log.exception('Error connecting to Yahoo Finance')
+
+        #quotes-only runs skip the account downloads
+        stat1, ofxList, quoteFile1, quoteFile2, htmFileName = \
+            Getdata.download(AcctArray, getquotes, self.userdat.defaultInterval, accounts=bool(AcctArray))
+
+        if len(ofxList) > 0:
+            log.info('Downloads completed.')
+            cfile = combineOfx(ofxList) if self.userdat.combineofx else ''
+            Getdata.sendToMoney(ofxList, cfile, quoteFile2, interactive=False)
+        else:
+            log.warning("No files were downloaded. Verify network connection and try again later.")
+        if not stat1:
+            log.warning("One or more accounts (or quotes) may not have downloaded correctly.")
+
+    def serve(self):
+        while not self.stop.is_set():
+            now = datetime.now()
+            self.reload(now)
+            due = [job for job in self.jobs if job.due and job.due <= now]
+            self.lastCheck = now
+            if due:
+                try:
+                    self.run(due)
+                except Exception:
+                    log.exception('An error occurred during the scheduled run')
+                log.info('-----------------------------------------------------------------------------------')
+                #runs missed while this one was running are skipped
+                now = datetime.now()
+                for job in due: job.due = job.cron.next(now)
+                self.lastCheck = now
+                continue
+
+            #wake at the next run, or after a minute to check for changes
+            wait = 60.0
+            for job in self.jobs:
+                if job.due: wait = min(wait, (job.due - now).total_seconds())
+            self.stop.wait(max(wait, 0.1))
+        log.info('getdatad stopped.')
+
+def show(daemon):
+    print('{0:30}{1:20}{2:>10}  {3}'.format('Target', 'Schedule', 'Accounts', 'Next run'))
+    for job in daemon.jobs:
+        print('{0:30}{1:20}{2:>10}  {3}'.format(job.target, job.cron.expr,
+              '%d%s' % (len(job.accounts), ' + quotes' if job.quotes else ''),
+              job.due.strftime('%Y-%m-%d %H:%M') if job.due else 'never'))
+
+def main(argv):
+    """ Main """
+
+    parser = argparse.ArgumentParser(description='Run Getdata.py downloads on a schedule (<schedule> in sites.dat).')
+    parser.add_argument('-f', '--foreground', action='store_true', help="don't run in the background")
+    parser.add_argument('--show', action='store_true', help='list the schedule and next run times, and exit')
+    args = parser.parse_args(argv)
+
+    global log
+    log = create_logger('root', 'getdatad.log')
+
+    getquotes, AcctArray = Getdata.getAccounts()
+    daemon = Daemon(getquotes, AcctArray)
+    if args.show:
+        show(daemon)
+        return 0
+
+    if not args.foreground and hasattr(os, 'fork'):
+        if daemonize():
+            print('getdatad started.  See getdatad.log')
+            return 0
+    else:
+        print('getdatad running.  Press Ctrl-C to stop.')
+
+    signal.signal(signal.SIGTERM, lambda signum, frame: daemon.stop.set())
+    log.info('getdatad started (pid %d): %d scheduled target(s)' % (os.getpid(), len(daemon.jobs)))
+    try:
+        daemon.serve()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
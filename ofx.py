@@ -81,9 +81,15 @@
 #   - encode requests response to ascii
 #19Jun2023*rlc
 #   - add logging
-
-import time, os, sys, urllib.parse, glob, random, re
-import requests, collections
+#19Oct2026
+#   - use the process-wide site_cfg.userdat()
+#   - import requests when first needed
+#   - read site fields as SiteRecord attributes.  url host/path are parsed by site_cfg
+#   - split request building out of getOFX (startDate, buildQuery) for planner.py.  OFXClient dryrun option
+#   - sessionPool: keep https sessions (connections) between runs, per site host and user (getdatad.py)
+
+import time, os, sys, glob, random, re
+import collections
 import getpass, scrubber, site_cfg, uuid
 from control2 import *
 from rlib1 import *
@@ -95,12 +101,23 @@ if Debug:
 join = str.join
 argv = sys.argv
 
-#define some globals
-userdat = site_cfg.site_cfg()
+#requests sessions kept between queries: {(host, user): Session}.  None = new session for each query
+#set by getdatad.py, so repeated runs reuse the open connections
+sessionPool = None
+
+def getSession(host, user):
+    import requests
+    if sessionPool is None:
+        return requests.Session()
+    key = (host, user)
+    if key not in sessionPool:
+        sessionPool[key] = requests.Session()
+    return sessionPool[key]
 
 class OFXClient:
-    #Encapsulate an ofx client, site is a dict containg site configuration
-    def __init__(self, site, user, password):
+    #Encapsulate an ofx client, site is a SiteRecord containg site configuration
+    #dryrun=True: build queries only.  a missing clientUID isn't created (or saved to connect.key)
+    def __init__(self, site, user, password, dryrun=False):
         global log
         log = logging.getLogger('root')
 
@@ -108,19 +125,19 @@ class OFXClient:
         self.status = True
         self.user = user
         self.site = site
-        self.ofxver = FieldVal(site,"ofxver")
-        self.url = FieldVal(self.site,"url")
-        self.dtacctup = FieldVal(self.site,"dtacctup") or '19700101'
-        self.clientuid =  FieldVal(self.site,"clientuid")  #<optional> user-entered clientUID for site
+        self.ofxver = str(site.ofxver)
+        self.url = site.url
+        self.dtacctup = site.dtacctup or '19700101'
+        self.clientuid =  site.clientuid  #<optional> user-entered clientUID for site
         #if the user hasn't defined a clientUID and ofxVer>102, auto-create and save
-        if self.clientuid is None and int(self.ofxver) > 102:
-            self.clientuid = clientUID(self.url, self.user)
-        self.useragent  =  FieldVal(self.site,"useragent")
+        if self.clientuid is None and site.ofxver > 102:
+            self.clientuid = 'CLIENTUID' if dryrun else clientUID(self.url, self.user)
+        self.useragent  =  site.useragent
 
         #example: url='https://test.ofx.com/my/script'
         #path='//test.ofx.com/my/script';  Host= 'test.ofx.com' ; Selector= '/my/script'
-        self.urlHost = urllib.parse.urlparse(self.url).netloc
-        self.urlSelector = urllib.parse.urlparse(self.url).path
+        self.urlHost = site.host
+        self.urlSelector = site.path
         if Debug:
             log.debug('urlHost    :' + self.urlHost)
             log.debug('urlSelector:' + self.urlSelector)
@@ -136,12 +153,12 @@ class OFXClient:
         ver  = self.ofxver
 
         clientuid=''
-        if int(ver) > 102:
+        if site.ofxver > 102:
             #include clientuid if version=103+, otherwise the server may reject the request
             clientuid = OfxField("CLIENTUID", self.clientuid, ver)
 
-        fidata = [OfxField("ORG",FieldVal(site,"fiorg"), ver)]
-        fidata += [OfxField("FID",FieldVal(site,"fid"), ver)]
+        fidata = [OfxField("ORG",site.fiorg, ver)]
+        fidata += [OfxField("FID",site.fid, ver)]
         rtn = OfxTag("SIGNONMSGSRQV1",
                 OfxTag("SONRQ",
                 #OfxField("DTCLIENT",dateTimeStr(utc=True, tz=True), ver),
@@ -150,8 +167,8 @@ class OFXClient:
                 OfxField("USERPASS",self.password, ver),
                 OfxField("LANGUAGE","ENG", ver),
                 OfxTag("FI", *fidata),
-                OfxField("APPID",FieldVal(site,"APPID"), ver),
-                OfxField("APPVER", FieldVal(site,"APPVER"), ver),
+                OfxField("APPID",site.appid, ver),
+                OfxField("APPVER", site.appver, ver),
                 clientuid
                 ))
         return rtn
@@ -263,7 +280,7 @@ class OFXClient:
         response=None
         try:
             errmsg= "** An ERROR occurred attempting HTTPS connection to"
-            s = requests.Session()
+            s = getSession(self.urlHost, self.user)
 
             #fiddler env vars config for debug.  HTTPSPROXY auto-recognized by Requests, but not PYTHONHTTPSVERIFY
             #   set PYTHONHTTPSVERIFY=0
@@ -317,6 +334,52 @@ class OFXClient:
         if response: response.close()
 #------------------------------------------------------------------------------
 
+def startDate(site, interval):
+    #return the download interval (days) and start date (YYYYMMDD) for site
+    minInterval = site.mininterval    #minimum interval (days) defined for this site (optional)
+    if minInterval:
+         interval = max(minInterval, interval)    #use the longer of the two
+    dtstart = time.strftime("%Y%m%d",time.localtime(time.time()-interval*86400))
+    return interval, dtstart
+
+def requestType(site, acct_num):
+    #statement type that will be requested for an account.  ACCTINFO if acct_num is blank
+    if acct_num == '': return 'ACCTINFO'
+    for stmt in ['CCSTMT', 'INVSTMT', 'BASTMT']:
+        if stmt in site.caps: return stmt
+    return ''
+
+def buildQuery(client, sitename, acct_num, acct_type, dtstart):
+    #build the ofx request for an account (or an account info request if acct_num is blank)
+    site = client.site
+    stmt = requestType(site, acct_num)
+    if stmt == 'ACCTINFO':
+        query = client.acctQuery()
+
+    elif stmt == 'CCSTMT':
+        query = client.ccQuery(acct_num, dtstart)
+
+    elif stmt == 'INVSTMT':
+        #if we have a brokerid, use it.  Otherwise, try the fiorg value.
+        orgID = site.brokerid or site.fiorg
+        if orgID == '':
+            msg = '** Error: Site', sitename, 'missing (REQUIRED) BrokerID or FIORG value(s).'
+            raise Exception(msg)
+        query = client.invstQuery(orgID, acct_num, dtstart)
+
+    elif stmt == 'BASTMT':
+        bankid = site.bankid
+        if bankid == '':
+            msg='** Error: Site', sitename, 'missing (REQUIRED) BANKID value.'
+            raise Exception(msg)
+        query = client.baQuery(bankid, acct_num, dtstart, acct_type)
+
+    else:
+        msg='** Error: Site', sitename, 'missing (REQUIRED) AcctType value.'
+        raise Exception(msg)
+
+    return query
+
 def getOFX(account, interval):
 
     sitename   = account[0]
@@ -330,19 +393,15 @@ def getOFX(account, interval):
     log = logging.getLogger('root')
 
     #get site and other user-defined data
+    userdat = site_cfg.userdat()
     site = userdat.sites[sitename]
 
-    #set the interval (days)
-    minInterval = FieldVal(site,'mininterval')    #minimum interval (days) defined for this site (optional)
-    if minInterval:
-         interval = max(minInterval, interval)    #use the longer of the two
-
-    #set the start date/time
-    dtstart = time.strftime("%Y%m%d",time.localtime(time.time()-interval*86400))
+    #set the interval (days) and start date
+    interval, dtstart = startDate(site, interval)
     dtnow = time.strftime("%Y%m%d%H%M%S",time.localtime())
 
     #add delay prior to connect if defined for site
-    delay = FieldVal(site, "DELAY")
+    delay = site.delay
     if delay > 0.0:
         log.info('Delaying %.1f seconds...' % delay)
         time.sleep(delay)
@@ -360,32 +419,7 @@ def getOFX(account, interval):
     ofxFileName = xfrdir + sitename + dtnow + ofxFileSuffix
 
     try:
-        if acct_num == '':
-            query = client.acctQuery()
-        else:
-            caps = FieldVal(site, "CAPS")
-
-            if "CCSTMT" in caps:
-                query = client.ccQuery(acct_num, dtstart)
-            elif "INVSTMT" in caps:
-                #if we have a brokerid, use it.  Otherwise, try the fiorg value.
-                orgID = FieldVal(site, 'BROKERID')
-                if orgID == '': orgID = FieldVal(site, 'FIORG')
-                if orgID == '':
-                    msg = '** Error: Site', sitename, 'missing (REQUIRED) BrokerID or FIORG value(s).'
-                    raise Exception(msg)
-                query = client.invstQuery(orgID, acct_num, dtstart)
-
-            elif "BASTMT" in caps:
-                bankid = FieldVal(site, "BANKID")
-                if bankid == '':
-                    msg='** Error: Site', sitename, 'missing (REQUIRED) BANKID value.'
-                    raise Exception(msg)
-                query = client.baQuery(bankid, acct_num, dtstart, acct_type)
-
-            else:
-                msg='** Error: Site', sitename, 'missing (REQUIRED) AcctType value.'
-                raise Exception(msg)
+        query = buildQuery(client, sitename, acct_num, acct_type, dtstart)
 
         #do the deed
         client.doQuery(query, ofxFileName)
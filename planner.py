@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+# planner.py
+# dry run: build every request that Getdata.py would send, without connecting to any site
+# Intial version: 19Oct2026
+
+# Reads ofx_config.cfg and sites.dat and reports, for each account:
+#   the statement type, download window (dtstart), site delay and request size.
+# Also reports per-site request counts, accounts that could share one signon (batching),
+# and the estimated run time for the given number of workers.
+#
+# Passwords are never decrypted.  If accounts are encrypted (Setup.py password), account
+# numbers and usernames are shown as placeholders and the password is masked in all queries.
+#
+# Usage:  planner.py [-i days] [-w workers] [-l seconds] [-q]
+
+import os, sys, argparse, logging
+import site_cfg, ofx
+from control2 import *
+from rlib1 import *
+
+log = logging.getLogger('root')
+
+maskedPW = '********'
+
+def planAccounts(AcctArray, encrypted, interval):
+    #return a list of planned requests (dict) for AcctArray
+    userdat = site_cfg.userdat()
+    plan = []
+    users = {}      #encrypted username: placeholder.  the same username encrypts to the same value
+    for n, acct in enumerate(AcctArray, 1):
+        sitename, acct_type = acct[0], acct[2]
+        if encrypted:
+            _acct_num = 'ACCOUNT%d' % n
+            user = users.setdefault(acct[3], 'USER%d' % (len(users)+1))
+        else:
+            _acct_num, user = acct[1], acct[3]
+        acct_num = _acct_num.split(':')[0]
+
+        req = {'n': n, 'site': sitename, 'acct': _acct_num, 'user': user, 'stmt': '', 'dtstart': '',
+               'interval': interval, 'delay': 0.0, 'query': '', 'error': ''}
+        plan.append(req)
+
+        site = userdat.sites.get(sitename)
+        if site is None:
+            req['error'] = 'Site not found in sites.dat'
+            continue
+
+        req['interval'], req['dtstart'] = ofx.startDate(site, interval)
+        req['delay'] = site.delay
+        req['stmt'] = ofx.requestType(site, acct_num)
+        try:
+            client = ofx.OFXClient(site, user, maskedPW, dryrun=True)
+            req['query'] = ofx.buildQuery(client, sitename, acct_num, acct_type, req['dtstart'])
+        except Exception as e:
+            req['error'] = ' '.join(str(a) for a in e.args[0]) if isinstance(e.args[0], tuple) else str(e)
+
+    return plan
+
+def siteJobs(plan, latency, batch=False):
+    #estimated run time (seconds) per site.  requests to the same site are sent one at a time,
+    #each after the site delay.  batch=True: one request per site+user (OFX allows several statements per signon)
+    jobs = {}
+    seen = set()
+    for req in plan:
+        if req['error']: continue
+        if batch and req['stmt'] != 'ACCTINFO':
+            if (req['site'], req['user']) in seen: continue
+            seen.add((req['site'], req['user']))
+        jobs[req['site']] = jobs.get(req['site'], 0.0) + req['delay'] + latency
+    return jobs
+
+def runTime(jobs, workers):
+    #critical path when site jobs are spread across workers (longest job first)
+    load = [0.0] * max(workers, 1)
+    for t in sorted(jobs.values(), reverse=True):
+        i = load.index(min(load))
+        load[i] += t
+    return max(load)
+
+def printPlan(plan, showQueries=False):
+    print('{0:4}{1:18}{2:20}{3:10}{4:10}{5:>6}{6:>8}{7:>8}'.format(
+          '#', 'Site', 'Account', 'Request', 'DtStart', 'Days', 'Delay', 'Bytes'))
+    print('-'*84)
+    for req in plan:
+        if req['error']:
+            print('{0:4}{1:18}{2:20}** {3}'.format(str(req['n'])+'.', req['site'], req['acct'], req['error']))
+            continue
+        print('{0:4}{1:18}{2:20}{3:10}{4:10}{5:6d}{6:8.1f}{7:8d}'.format(
+              str(req['n'])+'.', req['site'], req['acct'], req['stmt'], req['dtstart'],
+              req['interval'], req['delay'], len(req['query'])))
+        if showQueries:
+            print('\n' + req['query'] + '\n')
+
+def printSummary(plan, getquotes, stocks, workers, latency):
+    sites = {}
+    for req in plan:
+        s = sites.setdefault(req['site'], {'requests': 0, 'errors': 0, 'users': {}})
+        if req['error']:
+            s['errors'] += 1
+        else:
+            s['requests'] += 1
+            s['users'][req['user']] = s['users'].get(req['user'], 0) + 1
+
+    print('\n{0:22}{1:>10}{2:>10}{3:>10}'.format('Site', 'Requests', 'Signons', 'Errors'))
+    print('-'*52)
+    for name, s in sites.items():
+        print('{0:22}{1:10d}{2:10d}{3:10d}'.format(name, s['requests'], len(s['users']), s['errors']))
+        for user, count in s['users'].items():
+            if count > 1:
+                print('    %d accounts for %s could share one signon' % (count, user))
+
+    jobs = siteJobs(plan, latency)
+    if getquotes and stocks:
+        jobs['Stock/Fund Quotes'] = latency
+    print('\nEstimated run time (%.1f s per request):' % latency)
+    print('    sequential        : %6.1f s' % sum(jobs.values()))
+    print('    %2d worker(s)      : %6.1f s' % (workers, runTime(jobs, workers)))
+    bjobs = siteJobs(plan, latency, batch=True)
+    if bjobs != jobs:
+        if 'Stock/Fund Quotes' in jobs: bjobs['Stock/Fund Quotes'] = latency
+        print('    batched signons   : %6.1f s' % runTime(bjobs, workers))
+
+def main(argv):
+    """ Main """
+
+    userdat = site_cfg.userdat()
+    parser = argparse.ArgumentParser(
+        description='Dry run: build the requests Getdata.py would send, without connecting.')
+    parser.add_argument('-i', '--interval', type=int, default=userdat.defaultInterval,
+                        help='download interval (days) [default: %d]' % userdat.defaultInterval)
+    parser.add_argument('-w', '--workers', type=int, default=1, help='concurrent sites [default: 1]')
+    parser.add_argument('-l', '--latency', type=float, default=3.0,
+                        help='estimated seconds per request [default: 3.0]')
+    parser.add_argument('-q', '--queries', action='store_true', help='show the request for each account')
+    args = parser.parse_args(argv)
+
+    pwkey, getquotes, AcctArray = get_cfg()
+    encrypted = len(pwkey) > 0
+    if encrypted:
+        print('Accounts are encrypted: account numbers and usernames are shown as placeholders.\n')
+
+    plan = planAccounts(AcctArray, encrypted, args.interval)
+    printPlan(plan, args.queries)
+    printSummary(plan, getquotes, userdat.stocks + userdat.funds, args.workers, args.latency)
+
+    return 1 if any(req['error'] for req in plan) else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -24,6 +24,17 @@
 #  * Santiago Palladino for providing the PKCS5 padding technique.
 #  * Shaya for correcting the PAD_PKCS5 triple des CBC errors.
 #
+# ofxpy changes:
+# 19Oct2026
+#   - crypt() uses an integer, table-driven DES engine (SP and IP/FP byte
+#     lookup tables) instead of lists of bits.  Output is unchanged.
+#   - key schedules are built with integers and kept in a small LRU cache,
+#     so creating des/triple_des objects for a key already used is cheap.
+#   - add encrypt_many() and decrypt_many(): crypt a list of fields in one
+#     pass (see acctEncrypt/acctDecrypt in rlib1.py)
+#   - triple_des runs each block through all 48 rounds in the integer engine,
+#     with CBC chaining done once per block rather than by each des stage
+#
 """A pure python implementation of the DES and TRIPLE DES encryption algorithms.
 
 Class initialization
@@ -85,6 +96,8 @@ Note: This code was not written for high-end systems needing a fast
 """
 
 import sys
+import struct
+import threading
 
 # _pythonMajorVersion is used to handle Python2 and Python3 differences.
 _pythonMajorVersion = sys.version_info[0]
@@ -225,6 +238,80 @@ class _baseDes(object):
 
 		return data
 
+	def _crypt_fields(self, fields, crypt_type):
+		"""Crypt a list of (padded) fields in one pass.
+		Returns the same values as [crypt(field, crypt_type) for field in fields]"""
+		buf = bytearray()
+		spans = []
+		for data in fields:
+			# Same checks as crypt()
+			if not data:
+				spans.append(self.crypt(data, crypt_type))
+				continue
+			if len(data) % self.block_size != 0:
+				if crypt_type == des.DECRYPT: # Decryption must work on 8 byte blocks
+					raise ValueError("Invalid data length, data must be a multiple of " + str(self.block_size) + " bytes\n.")
+				if not self.getPadding():
+					raise ValueError("Invalid data length, data must be a multiple of " + str(self.block_size) + " bytes\n. Try setting the optional padding character")
+				else:
+					data += (self.block_size - (len(data) % self.block_size)) * self.getPadding()
+			spans.append((len(buf) // self.block_size, len(data) // self.block_size))
+			buf += data
+
+		n = len(buf) // self.block_size
+		blocks = struct.unpack_from('>%dQ' % n, buf)
+		stages = self._stages(crypt_type)
+
+		if self.getMode() == CBC:
+			if not self.getIV():
+				raise ValueError("For CBC mode, you must supply the Initial Value (IV) for ciphering")
+			# each field is chained separately, starting from the IV
+			iv = struct.unpack('>Q', self.getIV())[0]
+			result = []
+			for span in spans:
+				if isinstance(span, tuple):
+					start, count = span
+					result += _crypt_blocks(blocks[start:start+count], stages, iv,
+								crypt_type == des.DECRYPT)
+		else:
+			result = _crypt_blocks(blocks, stages)
+
+		struct.pack_into('>%dQ' % n, buf, 0, *result)
+		view = memoryview(buf)
+		size = self.block_size
+		return [view[span[0]*size:(span[0]+span[1])*size].tobytes() if isinstance(span, tuple) else span
+			for span in spans]
+
+	def encrypt_many(self, fields, pad=None, padmode=None):
+		"""encrypt_many(fields, [pad], [padmode]) -> list of bytes
+
+		fields : list of bytes to be encrypted
+		pad  : Optional argument for encryption padding. Must only be one byte
+		padmode : Optional argument for overriding the padding mode.
+
+		Encrypts all fields in one pass, returning the same values as
+		[encrypt(field, pad, padmode) for field in fields].
+		"""
+		if pad is not None:
+			pad = self._guardAgainstUnicode(pad)
+		fields = [self._padData(self._guardAgainstUnicode(data), pad, padmode) for data in fields]
+		return self._crypt_fields(fields, des.ENCRYPT)
+
+	def decrypt_many(self, fields, pad=None, padmode=None):
+		"""decrypt_many(fields, [pad], [padmode]) -> list of bytes
+
+		fields : list of bytes to be decrypted
+		pad  : Optional argument for decryption padding. Must only be one byte
+		padmode : Optional argument for overriding the padding mode.
+
+		Decrypts all fields in one pass, returning the same values as
+		[decrypt(field, pad, padmode) for field in fields].
+		"""
+		if pad is not None:
+			pad = self._guardAgainstUnicode(pad)
+		fields = self._crypt_fields([self._guardAgainstUnicode(data) for data in fields], des.DECRYPT)
+		return [self._unpadData(data, pad, padmode) for data in fields]
+
 	def _guardAgainstUnicode(self, data):
 		# Only accept byte strings or ascii unicode values, otherwise
 		# there is no way to correctly decode the data into bytes.
@@ -241,6 +328,159 @@ class _baseDes(object):
 				raise ValueError("pyDes can only work with encoded strings, not Unicode.")
 		return data
 
+#############################################################################
+# 			Integer DES engine				    #
+#############################################################################
+# Blocks are 64-bit integers (first byte = most significant). The initial and
+# final permutations use one lookup table per input byte, and the S-boxes are
+# combined with the P permutation (SP tables), so a round is 8 table lookups.
+# Subkeys are stored as 8 6-bit values, one per S-box.
+# The tables are built from the des class tables on first use.
+
+_IP = None	# 8 x 256 lookup tables for the initial permutation
+_FP = None	# 8 x 256 lookup tables for the final permutation
+_SP = None	# 8 x 64 combined S-box + P permutation tables
+_PC1 = None	# 8 x 256 lookup tables for permuted choice 1 (64 -> 56 bits)
+_PC2 = None	# 7 x 256 lookup tables for permuted choice 2 (56 -> 48 bits)
+_ROTATIONS = None
+
+# Key schedules by key: (encryption subkeys, decryption subkeys), most
+# recently used last
+_SCHEDULE_CACHE_SIZE = 64
+_schedules = {}
+_schedule_order = []
+_schedule_lock = threading.Lock()
+
+def _byte_tables(table, inbits):
+	"""Lookup tables (one per input byte) for the permutation table, where
+	output bit i is input bit table[i] and bit 0 is the most significant bit."""
+	outbits = len(table)
+	tables = []
+	for k in range(inbits // 8):
+		# output bits set by each input bit of byte k
+		masks = [0] * 8
+		for i, src in enumerate(table):
+			if src // 8 == k:
+				masks[7 - src % 8] |= 1 << (outbits - 1 - i)
+		t = [0] * 256
+		for b in range(1, 256):
+			low = b & -b
+			t[b] = t[b ^ low] | masks[low.bit_length() - 1]
+		tables.append(t)
+	return tables
+
+def _init_tables(ip, fp, sbox, p, pc1, pc2, rotations):
+	"""Build the IP, FP, SP and key schedule lookup tables"""
+	global _IP, _FP, _SP, _PC1, _PC2, _ROTATIONS
+	sp = []
+	for j in range(8):
+		t = [0] * 64
+		for six in range(64):
+			# row = outer bits (b0, b5), column = inner bits (b1..b4)
+			v = sbox[j][(six & 0x20) | ((six & 1) << 4) | ((six >> 1) & 0xf)]
+			bn = v << (28 - 4 * j)
+			out = 0
+			for i in range(32):
+				if bn & (1 << (31 - p[i])):
+					out |= 1 << (31 - i)
+			t[six] = out
+		sp.append(t)
+	_IP = _byte_tables(ip, 64)
+	_FP = _byte_tables(fp, 64)
+	_PC1 = _byte_tables(pc1, 64)
+	_PC2 = _byte_tables(pc2, 56)
+	_ROTATIONS = rotations
+	_SP = sp
+
+def _crypt_blocks(blocks, stages, iv=None, decrypt=False):
+	"""Crypt a sequence of 64-bit integer blocks, returns a list of integers.
+
+	stages  : one subkey schedule for DES (three for triple DES), each a list
+		  of 16 rounds in the order they are applied
+	iv      : Initial Value as an integer for CBC mode, None for ECB
+	decrypt : CBC chaining direction
+	"""
+	ip0, ip1, ip2, ip3, ip4, ip5, ip6, ip7 = _IP
+	fp0, fp1, fp2, fp3, fp4, fp5, fp6, fp7 = _FP
+	sp0, sp1, sp2, sp3, sp4, sp5, sp6, sp7 = _SP
+
+	def des_block(block):
+		block = ip0[block >> 56] | ip1[(block >> 48) & 0xff] | \
+			ip2[(block >> 40) & 0xff] | ip3[(block >> 32) & 0xff] | \
+			ip4[(block >> 24) & 0xff] | ip5[(block >> 16) & 0xff] | \
+			ip6[(block >> 8) & 0xff] | ip7[block & 0xff]
+		L = block >> 32
+		R = block & 0xffffffff
+		for kn in stages:
+			for k0, k1, k2, k3, k4, k5, k6, k7 in kn:
+				# expansion: 6-bit group j is bits 4j-1 .. 4j+4 of R (wrapping)
+				x = ((R & 1) << 33) | (R << 1) | (R >> 31)
+				L, R = R, L ^ (sp0[((x >> 28) & 0x3f) ^ k0] ^ sp1[((x >> 24) & 0x3f) ^ k1] ^
+					       sp2[((x >> 20) & 0x3f) ^ k2] ^ sp3[((x >> 16) & 0x3f) ^ k3] ^
+					       sp4[((x >> 12) & 0x3f) ^ k4] ^ sp5[((x >> 8) & 0x3f) ^ k5] ^
+					       sp6[((x >> 4) & 0x3f) ^ k6] ^ sp7[(x & 0x3f) ^ k7])
+			L, R = R, L
+		block = (L << 32) | R
+		return fp0[block >> 56] | fp1[(block >> 48) & 0xff] | \
+			fp2[(block >> 40) & 0xff] | fp3[(block >> 32) & 0xff] | \
+			fp4[(block >> 24) & 0xff] | fp5[(block >> 16) & 0xff] | \
+			fp6[(block >> 8) & 0xff] | fp7[block & 0xff]
+
+	if iv is None:
+		return [des_block(block) for block in blocks]
+
+	result = []
+	if decrypt:
+		for block in blocks:
+			result.append(des_block(block) ^ iv)
+			iv = block
+	else:
+		for block in blocks:
+			iv = des_block(block ^ iv)
+			result.append(iv)
+	return result
+
+def _table_lookup(tables, value, nbytes):
+	"""Permute value (nbytes long) using per-byte lookup tables"""
+	result = 0
+	for k in range(nbytes):
+		result |= tables[k][(value >> (8 * (nbytes - 1 - k))) & 0xff]
+	return result
+
+def _build_schedule(key):
+	"""Create the 16 subkeys K[1] to K[16] for an 8 byte key.
+	Returns (encryption subkeys, decryption subkeys)."""
+	cd = _table_lookup(_PC1, struct.unpack('>Q', key)[0], 8)
+	c = cd >> 28
+	d = cd & 0xfffffff
+	kn = []
+	for r in _ROTATIONS:
+		# circular left shifts of the 28-bit halves
+		c = ((c << r) | (c >> (28 - r))) & 0xfffffff
+		d = ((d << r) | (d >> (28 - r))) & 0xfffffff
+		k = _table_lookup(_PC2, (c << 28) | d, 7)
+		kn.append(tuple((k >> (42 - 6 * j)) & 0x3f for j in range(8)))
+	return tuple(kn), tuple(kn[::-1])
+
+def _key_schedule(key):
+	"""Return the (cached) key schedule for an 8 byte key"""
+	with _schedule_lock:
+		schedule = _schedules.get(key)
+		if schedule is not None:
+			if _schedule_order[-1] != key:
+				_schedule_order.remove(key)
+				_schedule_order.append(key)
+			return schedule
+
+	schedule = _build_schedule(key)
+	with _schedule_lock:
+		if key not in _schedules:
+			_schedules[key] = schedule
+			_schedule_order.append(key)
+			while len(_schedule_order) > _SCHEDULE_CACHE_SIZE:
+				del _schedules[_schedule_order.pop(0)]
+	return schedule
+
 #############################################################################
 # 				    DES					    #
 #############################################################################
@@ -401,168 +641,26 @@ class des(_baseDes):
 		_baseDes.__init__(self, mode, IV, pad, padmode)
 		self.key_size = 8
 
-		self.L = []
-		self.R = []
-		self.Kn = [ [0] * 48 ] * 16	# 16 48-bit keys (K1 - K16)
-		self.final = []
-
 		self.setKey(key)
 
 	def setKey(self, key):
 		"""Will set the crypting key for this object. Must be 8 bytes."""
+		if _SP is None:
+			_init_tables(des.__ip, des.__fp, des.__sbox, des.__p,
+				     des.__pc1, des.__pc2, des.__left_rotations)
 		_baseDes.setKey(self, key)
-		self.__create_sub_keys()
+		# Subkeys, in encryption and decryption order
+		self._enc_keys, self._dec_keys = _key_schedule(self.getKey())
 
-	def __String_to_BitList(self, data):
-		"""Turn the string data, into a list of bits (1, 0)'s"""
-		if _pythonMajorVersion < 3:
-			# Turn the strings into integers. Python 3 uses a bytes
-			# class, which already has this behaviour.
-			data = [ord(c) for c in data]
-		l = len(data) * 8
-		result = [0] * l
-		pos = 0
-		for ch in data:
-			i = 7
-			while i >= 0:
-				if ch & (1 << i) != 0:
-					result[pos] = 1
-				else:
-					result[pos] = 0
-				pos += 1
-				i -= 1
-
-		return result
-
-	def __BitList_to_String(self, data):
-		"""Turn the list of bits -> data, into a string"""
-		result = []
-		pos = 0
-		c = 0
-		while pos < len(data):
-			c += data[pos] << (7 - (pos % 8))
-			if (pos % 8) == 7:
-				result.append(c)
-				c = 0
-			pos += 1
-
-		if _pythonMajorVersion < 3:
-			return ''.join([ chr(c) for c in result ])
-		else:
-			return bytes(result)
-
-	def __permutate(self, table, block):
-		"""Permutate this block with the specified table"""
-		return list(map(lambda x: block[x], table))
-	
-	# Transform the secret key, so that it is ready for data processing
-	# Create the 16 subkeys, K[1] - K[16]
-	def __create_sub_keys(self):
-		"""Create the 16 subkeys K[1] to K[16] from the given key"""
-		key = self.__permutate(des.__pc1, self.__String_to_BitList(self.getKey()))
-		i = 0
-		# Split into Left and Right sections
-		self.L = key[:28]
-		self.R = key[28:]
-		while i < 16:
-			j = 0
-			# Perform circular left shifts
-			while j < des.__left_rotations[i]:
-				self.L.append(self.L[0])
-				del self.L[0]
-
-				self.R.append(self.R[0])
-				del self.R[0]
-
-				j += 1
-
-			# Create one of the 16 subkeys through pc2 permutation
-			self.Kn[i] = self.__permutate(des.__pc2, self.L + self.R)
-
-			i += 1
-
-	# Main part of the encryption algorithm, the number cruncher :)
-	def __des_crypt(self, block, crypt_type):
-		"""Crypt the block of data through DES bit-manipulation"""
-		block = self.__permutate(des.__ip, block)
-		self.L = block[:32]
-		self.R = block[32:]
-
-		# Encryption starts from Kn[1] through to Kn[16]
+	def _stages(self, crypt_type):
+		# Subkey schedules for the integer engine
 		if crypt_type == des.ENCRYPT:
-			iteration = 0
-			iteration_adjustment = 1
-		# Decryption starts from Kn[16] down to Kn[1]
-		else:
-			iteration = 15
-			iteration_adjustment = -1
-
-		i = 0
-		while i < 16:
-			# Make a copy of R[i-1], this will later become L[i]
-			tempR = self.R[:]
-
-			# Permutate R[i - 1] to start creating R[i]
-			self.R = self.__permutate(des.__expansion_table, self.R)
-
-			# Exclusive or R[i - 1] with K[i], create B[1] to B[8] whilst here
-			self.R = list(map(lambda x, y: x ^ y, self.R, self.Kn[iteration]))
-			B = [self.R[:6], self.R[6:12], self.R[12:18], self.R[18:24], self.R[24:30], self.R[30:36], self.R[36:42], self.R[42:]]
-			# Optimization: Replaced below commented code with above
-			#j = 0
-			#B = []
-			#while j < len(self.R):
-			#	self.R[j] = self.R[j] ^ self.Kn[iteration][j]
-			#	j += 1
-			#	if j % 6 == 0:
-			#		B.append(self.R[j-6:j])
-
-			# Permutate B[1] to B[8] using the S-Boxes
-			j = 0
-			Bn = [0] * 32
-			pos = 0
-			while j < 8:
-				# Work out the offsets
-				m = (B[j][0] << 1) + B[j][5]
-				n = (B[j][1] << 3) + (B[j][2] << 2) + (B[j][3] << 1) + B[j][4]
-
-				# Find the permutation value
-				v = des.__sbox[j][(m << 4) + n]
-
-				# Turn value into bits, add it to result: Bn
-				Bn[pos] = (v & 8) >> 3
-				Bn[pos + 1] = (v & 4) >> 2
-				Bn[pos + 2] = (v & 2) >> 1
-				Bn[pos + 3] = v & 1
-
-				pos += 4
-				j += 1
-
-			# Permutate the concatination of B[1] to B[8] (Bn)
-			self.R = self.__permutate(des.__p, Bn)
-
-			# Xor with L[i - 1]
-			self.R = list(map(lambda x, y: x ^ y, self.R, self.L))
-			# Optimization: This now replaces the below commented code
-			#j = 0
-			#while j < len(self.R):
-			#	self.R[j] = self.R[j] ^ self.L[j]
-			#	j += 1
-
-			# L[i] becomes R[i - 1]
-			self.L = tempR
-
-			i += 1
-			iteration += iteration_adjustment
-		
-		# Final permutation of R[16]L[16]
-		self.final = self.__permutate(des.__fp, self.R + self.L)
-		return self.final
-
+			return (self._enc_keys,)
+		return (self._dec_keys,)
 
 	# Data to be encrypted/decrypted
 	def crypt(self, data, crypt_type):
-		"""Crypt the data in blocks, running it through des_crypt()"""
+		"""Crypt the data in blocks, running it through the integer DES engine"""
 
 		# Error check the data
 		if not data:
@@ -578,66 +676,19 @@ class des(_baseDes):
 
 		if self.getMode() == CBC:
 			if self.getIV():
-				iv = self.__String_to_BitList(self.getIV())
+				iv = struct.unpack('>Q', self.getIV())[0]
 			else:
 				raise ValueError("For CBC mode, you must supply the Initial Value (IV) for ciphering")
+		else:
+			iv = None
 
-		# Split the data into blocks, crypting each one seperately
-		i = 0
-		dict = {}
-		result = []
-		#cached = 0
-		#lines = 0
-		while i < len(data):
-			# Test code for caching encryption results
-			#lines += 1
-			#if dict.has_key(data[i:i+8]):
-				#print "Cached result for: %s" % data[i:i+8]
-			#	cached += 1
-			#	result.append(dict[data[i:i+8]])
-			#	i += 8
-			#	continue
-				
-			block = self.__String_to_BitList(data[i:i+8])
-
-			# Xor with IV if using CBC mode
-			if self.getMode() == CBC:
-				if crypt_type == des.ENCRYPT:
-					block = list(map(lambda x, y: x ^ y, block, iv))
-					#j = 0
-					#while j < len(block):
-					#	block[j] = block[j] ^ iv[j]
-					#	j += 1
-
-				processed_block = self.__des_crypt(block, crypt_type)
-
-				if crypt_type == des.DECRYPT:
-					processed_block = list(map(lambda x, y: x ^ y, processed_block, iv))
-					#j = 0
-					#while j < len(processed_block):
-					#	processed_block[j] = processed_block[j] ^ iv[j]
-					#	j += 1
-					iv = block
-				else:
-					iv = processed_block
-			else:
-				processed_block = self.__des_crypt(block, crypt_type)
-
-
-			# Add the resulting crypted block to our list
-			#d = self.__BitList_to_String(processed_block)
-			#result.append(d)
-			result.append(self.__BitList_to_String(processed_block))
-			#dict[data[i:i+8]] = d
-			i += 8
-
-		# print "Lines: %d, cached: %d" % (lines, cached)
+		# Crypt all blocks as 64-bit integers
+		n = len(data) // self.block_size
+		blocks = struct.unpack('>%dQ' % n, data)
+		result = _crypt_blocks(blocks, self._stages(crypt_type), iv, crypt_type == des.DECRYPT)
 
 		# Return the full crypted string
-		if _pythonMajorVersion < 3:
-			return ''.join(result)
-		else:
-			return bytes.fromhex('').join(result)
+		return struct.pack('>%dQ' % n, *result)
 
 	def encrypt(self, data, pad=None, padmode=None):
 		"""encrypt(data, [pad], [padmode]) -> bytes
@@ -679,8 +730,6 @@ class des(_baseDes):
 		data = self.crypt(data, des.DECRYPT)
 		return self._unpadData(data, pad, padmode)
 
-
-
 #############################################################################
 # 				Triple DES				    #
 #############################################################################
@@ -760,6 +809,36 @@ class triple_des(_baseDes):
 		for key in (self.__key1, self.__key2, self.__key3):
 			key.setIV(IV)
 
+	def _stages(self, crypt_type):
+		# Subkey schedules for all 48 rounds: E1 D2 E3 to encrypt, D3 E2 D1 to decrypt
+		if crypt_type == des.ENCRYPT:
+			return (self.__key1._enc_keys, self.__key2._dec_keys, self.__key3._enc_keys)
+		return (self.__key3._dec_keys, self.__key2._enc_keys, self.__key1._dec_keys)
+
+	def crypt(self, data, crypt_type):
+		"""Crypt the data in blocks through all three DES stages.
+		Each block stays an integer for all 48 rounds."""
+		if len(data) % self.block_size != 0:
+			if crypt_type == des.DECRYPT: # Decryption must work on 8 byte blocks
+				raise ValueError("Invalid data length, data must be a multiple of " + str(self.block_size) + " bytes\n.")
+			# Pad with the instance padding, as encrypt() does
+			data = self._padData(self._guardAgainstUnicode(data), None, None)
+		if self.getMode() == CBC:
+			if not data:
+				return bytes.fromhex('') if _pythonMajorVersion >= 3 else ''
+			if not self.getIV():
+				raise ValueError("For CBC mode, you must supply the Initial Value (IV) for ciphering")
+			iv = struct.unpack('>Q', self.getIV())[0]
+		else:
+			if not data:
+				return ''
+			iv = None
+
+		n = len(data) // self.block_size
+		blocks = struct.unpack('>%dQ' % n, data)
+		result = _crypt_blocks(blocks, self._stages(crypt_type), iv, crypt_type == des.DECRYPT)
+		return struct.pack('>%dQ' % n, *result)
+
 	def encrypt(self, data, pad=None, padmode=None):
 		"""encrypt(data, [pad], [padmode]) -> bytes
 
@@ -773,36 +852,12 @@ class triple_des(_baseDes):
 		the padmode is set to PAD_PKCS5, as bytes will then added to
 		ensure the be padded data is a multiple of 8 bytes.
 		"""
-		ENCRYPT = des.ENCRYPT
-		DECRYPT = des.DECRYPT
 		data = self._guardAgainstUnicode(data)
 		if pad is not None:
 			pad = self._guardAgainstUnicode(pad)
 		# Pad the data accordingly.
 		data = self._padData(data, pad, padmode)
-		if self.getMode() == CBC:
-			self.__key1.setIV(self.getIV())
-			self.__key2.setIV(self.getIV())
-			self.__key3.setIV(self.getIV())
-			i = 0
-			result = []
-			while i < len(data):
-				block = self.__key1.crypt(data[i:i+8], ENCRYPT)
-				block = self.__key2.crypt(block, DECRYPT)
-				block = self.__key3.crypt(block, ENCRYPT)
-				self.__key1.setIV(block)
-				self.__key2.setIV(block)
-				self.__key3.setIV(block)
-				result.append(block)
-				i += 8
-			if _pythonMajorVersion < 3:
-				return ''.join(result)
-			else:
-				return bytes.fromhex('').join(result)
-		else:
-			data = self.__key1.crypt(data, ENCRYPT)
-			data = self.__key2.crypt(data, DECRYPT)
-			return self.__key3.crypt(data, ENCRYPT)
+		return self.crypt(data, des.ENCRYPT)
 
 	def decrypt(self, data, pad=None, padmode=None):
 		"""decrypt(data, [pad], [padmode]) -> bytes
@@ -820,33 +875,8 @@ class triple_des(_baseDes):
 		padding end markers will be removed from the data after
 		decrypting, no pad character is required for PAD_PKCS5.
 		"""
-		ENCRYPT = des.ENCRYPT
-		DECRYPT = des.DECRYPT
 		data = self._guardAgainstUnicode(data)
 		if pad is not None:
 			pad = self._guardAgainstUnicode(pad)
-		if self.getMode() == CBC:
-			self.__key1.setIV(self.getIV())
-			self.__key2.setIV(self.getIV())
-			self.__key3.setIV(self.getIV())
-			i = 0
-			result = []
-			while i < len(data):
-				iv = data[i:i+8]
-				block = self.__key3.crypt(iv,    DECRYPT)
-				block = self.__key2.crypt(block, ENCRYPT)
-				block = self.__key1.crypt(block, DECRYPT)
-				self.__key1.setIV(iv)
-				self.__key2.setIV(iv)
-				self.__key3.setIV(iv)
-				result.append(block)
-				i += 8
-			if _pythonMajorVersion < 3:
-				data = ''.join(result)
-			else:
-				data = bytes.fromhex('').join(result)
-		else:
-			data = self.__key3.crypt(data, DECRYPT)
-			data = self.__key2.crypt(data, ENCRYPT)
-			data = self.__key1.crypt(data, DECRYPT)
+		data = self.crypt(data, des.DECRYPT)
 		return self._unpadData(data, pad, padmode)
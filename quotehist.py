@@ -0,0 +1,241 @@
+# quotehist.py
+# http://sites.google.com/site/pocketsense/
+# SQLite quote history store (replaces xfrdir/QuoteHistory.csv)
+# Initial version: Oct-2026
+
+# Quotes are keyed by (symbol, time), so saving the same quote again updates it instead of
+# adding a duplicate row.  Quotes from getQuotes, backfill.py and imported csv files are saved at
+# the market close (QuoteMarketHours) of their date (see dailyTime), so each symbol has one row per
+# day: the last quote of the day, which a later backfill replaces with the closing price.
+# Symbol is the symbol sent to Money (s: option in sites.dat), and prices include the m:
+# multiplier, as in the quotes ofx file.
+# Enabled in sites.dat with "SaveQuoteHistory: Yes".  The database file defaults to quotehist.db,
+# and can be changed with "QuoteHistoryFile: filename"
+#
+# An existing QuoteHistory.csv is imported the first time quotes are saved.  Other csv files
+# (same format) can be imported with:  quotehist.py import filename
+#
+# Daily history for new symbols (or missed runs) can be added with backfill.py.  The backfill
+# table records how far each symbol has been filled, so an interrupted backfill resumes there.
+#
+# Example:
+#   import quotehist
+#   qh = quotehist.QuoteHistory()
+#   for q in qh.history('VFIAX', start='2026-01-01'):
+#       print(q['time'], q['price'])
+
+import os, sys, csv, sqlite3, argparse, logging
+from datetime import datetime, timedelta
+from control2 import *
+from rlib1 import create_logger
+
+log = logging.getLogger('root')
+
+csvFile = xfrdir + 'QuoteHistory.csv'
+
+_schema = """
+CREATE TABLE IF NOT EXISTS quotes (
+    symbol      TEXT NOT NULL,
+    time        TEXT NOT NULL,
+    name        TEXT,
+    price       REAL,
+    pclose      REAL,
+    pchange     REAL,
+    PRIMARY KEY (symbol, time)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS quote_time ON quotes (time);
+CREATE TABLE IF NOT EXISTS backfill (
+    symbol      TEXT PRIMARY KEY,
+    ticker      TEXT,
+    start       TEXT,
+    through     TEXT,
+    updated     TEXT
+);
+CREATE TABLE IF NOT EXISTS imports (
+    filename    TEXT PRIMARY KEY,
+    rows        INTEGER,
+    imported    TEXT
+);
+"""
+
+def _float(value):
+    #float, or None.  accepts formatted values (e.g., '1,234.50', '-0.45%')
+    try:
+        return float(str(value).replace(',', '').strip().rstrip('%'))
+    except (TypeError, ValueError):
+        return None
+
+def _endTime(end):
+    #end = 'YYYY-MM-DD' (inclusive) or 'YYYY-MM-DD HH:MM:SS'.  returns the exclusive upper bound
+    if len(end) > 10: return end + '~'
+    return (datetime.strptime(end, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+def closeTime(hours):
+    #'HH:MM:SS' market close, from QuoteMarketHours ('09:30-16:00')
+    return hours.split('-')[-1].strip() + ':00'
+
+def dailyTime(day, hours):
+    #time key for the quote of day ('YYYY-MM-DD'): the market close
+    return day + ' ' + closeTime(hours)
+
+class QuoteHistory:
+    """SQLite store of quote history.  See module notes for usage."""
+
+    def __init__(self, dbfile=None):
+        if dbfile is None:
+            import site_cfg
+            dbfile = site_cfg.userdat().quoteHistoryFile
+        self.dbfile = dbfile
+        self.db = sqlite3.connect(dbfile)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(_schema)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    #------------------------------------------------------------------------------
+    # save
+
+    def add(self, rows):
+        #upsert quotes: rows = [(symbol, time, name, price, pclose, pchange), ...]
+        #time = 'YYYY-MM-DD HH:MM:SS'.  returns the number of rows
+        rows = [r for r in rows if r[0] and r[1]]
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO quotes VALUES (?,?,?,?,?,?)', rows)
+        return len(rows)
+
+    def addQuotes(self, qList, hours=None):
+        #save a list of quotes.Security objects, keyed at the close of their exchange date
+        #hours = QuoteMarketHours (default: sites.dat)
+        if hours is None:
+            import site_cfg
+            hours = site_cfg.userdat().quoteMarketHours
+        return self.add([(s.symbol, dailyTime(s.tradeDate, hours), s.name,
+                          _float(s.price), _float(s.pclose), _float(s.pchange)) for s in qList])
+
+    def addBackfill(self, symbol, ticker, rows, start, through):
+        #save backfilled quotes for symbol, and record it as filled from start through the given date.
+        #both are saved in one transaction
+        rows = [r for r in rows if r[0] and r[1]]
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO quotes VALUES (?,?,?,?,?,?)', rows)
+            self.db.execute('INSERT OR REPLACE INTO backfill VALUES (?,?,?,?,?)',
+                            (symbol, ticker, start, through, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        return len(rows)
+
+    def importCsv(self, filename, force=False, hours=None):
+        #import a QuoteHistory.csv file (Symbol,Name,Price,Date/Time,LastClose,%Change)
+        #rows are keyed at the close of their day, as with addQuotes.  the last quote of each day is kept
+        #hours = QuoteMarketHours (default: sites.dat)
+        #each file is only imported once, unless force=True.  returns the number of rows
+        filename = os.path.realpath(filename)
+        if not force and self.db.execute('SELECT 1 FROM imports WHERE filename=?', (filename,)).fetchone():
+            return 0
+        if hours is None:
+            import site_cfg
+            hours = site_cfg.userdat().quoteMarketHours
+
+        days = {}       #{(symbol, day time): (time, row)}
+        with open(filename, newline='') as f:
+            reader = csv.reader(f)
+            for line in reader:
+                if len(line) < 6 or line[0] == 'Symbol': continue
+                try:
+                    t = datetime.strptime(line[3].strip(), '%m/%d/%Y %H:%M:%S')
+                except ValueError:
+                    log.info('%s line %d: invalid date (%s).  Skipped.' % (filename, reader.line_num, line[3]))
+                    continue
+                key = (line[0], dailyTime(t.strftime('%Y-%m-%d'), hours))
+                if key not in days or t >= days[key][0]:
+                    days[key] = (t, key + (line[1], _float(line[2]), _float(line[4]), _float(line[5])))
+
+        count = self.add([row for t, row in days.values()])
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO imports VALUES (?,?,?)',
+                            (filename, count, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+        log.info('Imported %d quote(s) from %s' % (count, filename))
+        return count
+
+    #------------------------------------------------------------------------------
+    # queries
+    #   start/end = 'YYYY-MM-DD' (inclusive) or 'YYYY-MM-DD HH:MM:SS'
+    #   all queries return a list of sqlite3.Row records (access by index or column name)
+
+    def history(self, symbol=None, start=None, end=None):
+        sql, where, args = 'SELECT * FROM quotes', [], []
+        if symbol is not None:
+            where.append('symbol = ?'); args.append(symbol)
+        if start:
+            where.append('time >= ?'); args.append(start)
+        if end:
+            where.append('time < ?'); args.append(_endTime(end))
+        if where: sql += ' WHERE ' + ' AND '.join(where)
+        return self.db.execute(sql + ' ORDER BY symbol, time', args).fetchall()
+
+    def latest(self, symbol=None, asof=None):
+        #last quote for each symbol (or just symbol), on or before asof
+        sql = ('SELECT q.* FROM quotes q JOIN (SELECT symbol, MAX(time) AS time FROM quotes %s GROUP BY symbol) m '
+               'ON q.symbol = m.symbol AND q.time = m.time ORDER BY q.symbol')
+        where, args = [], []
+        if symbol is not None:
+            where.append('symbol = ?'); args.append(symbol)
+        if asof:
+            where.append('time < ?'); args.append(_endTime(asof))
+        return self.db.execute(sql % ('WHERE ' + ' AND '.join(where) if where else ''), args).fetchall()
+
+    def backfillStatus(self, symbol=None):
+        #backfill progress records: symbol, ticker, start, through, updated
+        if symbol is not None:
+            return self.db.execute('SELECT * FROM backfill WHERE symbol = ?', (symbol,)).fetchone()
+        return self.db.execute('SELECT * FROM backfill ORDER BY symbol').fetchall()
+
+    def symbols(self):
+        return [r[0] for r in self.db.execute('SELECT DISTINCT symbol FROM quotes ORDER BY symbol')]
+
+def saveQuotes(qList, dbfile=None):
+    #save quotes to the history store.  imports QuoteHistory.csv the first time, if it exists
+    with QuoteHistory(dbfile) as qh:
+        if os.path.exists(csvFile):
+            qh.importCsv(csvFile)
+        count = qh.addQuotes(qList)
+        log.info('Saved %d quote(s) to %s' % (count, qh.dbfile))
+    return count
+
+def main(argv):
+    """ Main """
+
+    parser = argparse.ArgumentParser(description='Quote history store (see quotehist.py).')
+    parser.add_argument('-d', '--db', help='database file [default: QuoteHistoryFile in sites.dat]')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('import', help='import QuoteHistory.csv files')
+    p.add_argument('files', nargs='*', default=[csvFile])
+    p.add_argument('-f', '--force', action='store_true', help='import files that were already imported')
+    p = sub.add_parser('show', help='list quotes')
+    p.add_argument('symbol', nargs='?')
+    p.add_argument('-s', '--start', help='YYYY-MM-DD')
+    p.add_argument('-e', '--end', help='YYYY-MM-DD')
+    args = parser.parse_args(argv)
+
+    global log
+    log = create_logger('root', 'quotehist.log')
+
+    with QuoteHistory(args.db) as qh:
+        if args.command == 'import':
+            for filename in args.files:
+                print('%s: %d quote(s) imported' % (filename, qh.importCsv(filename, args.force)))
+        else:
+            for q in qh.history(args.symbol, args.start, args.end):
+                print('{0:12}{1:21}{2:>12}{3:>12}{4:>9}  {5}'.format(
+                      q['symbol'], q['time'], '%.2f' % q['price'] if q['price'] is not None else '',
+                      '%.2f' % q['pclose'] if q['pclose'] is not None else '',
+                      '%.2f%%' % q['pchange'] if q['pchange'] is not None else '', q['name'] or ''))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -77,53 +77,99 @@
 #   -Minor edits while implementing Requests pkg
 # 25May2023*rlc
 #   -Update to use Yahoo v10 service and cleanup json parse to remove csv-oriented format
-
-import os, requests, re, json, pickle
+# 19Oct2026
+#   -use the process-wide site_cfg.userdat()
+#   -import requests and pickle when first needed
+#   -get quotes concurrently (quoteWorkers threads, at most quoteHostLimit requests per host)
+#   -request quotes for up to QuoteBatchSize symbols at once (YahooBatchURL), with YahooURL as fallback
+#   -reuse quotes from quotes.cache for QuoteCacheTTL minutes, or until the market opens when the quote
+#    is from after the close.  only stale symbols are requested
+#   -OfxWriter writes the quotes statement with OfxStream (rlib1), rather than building it in memory
+#   -save quote history to the quotehist.py store instead of appending to QuoteHistory.csv
+#    (one row per symbol and exchange date, at the market close: the same key as backfill.py)
+#   -quote providers (QuoteProviders: yahoo, file), with hedged requests: if the primary hasn't answered
+#    within QuoteHedgeDelay seconds, the next provider is asked too.  symbols are skipped after QuoteTimeout
+#   -security master (securities.cache): name, type, currency and exchange time zone by ticker.  known
+#    securities are requested with price-only fields, and names are read from the master
+#   -convert quotes in another currency (c: option in sites.dat) to QuoteCurrency.  exchange rates are
+#    requested with the quotes and reused from fxrates.cache for FxCacheTTL minutes
+#   -yahooAuth: YahooAuth kept between runs by getdatad.py
+#   -quote settings are passed to the providers and fetchQuotes (cfg = site_cfg), instead of module
+#    globals set by getQuotes, so they can be used without getQuotes (e.g., getdatad.py, scripts)
+#   -YahooAuth replaces getYahooSession: refreshes the cookie/crumb once when Yahoo rejects them and
+#    resends the rejected requests.  cookies.dat is written atomically
+
+import os, io, re, json, time, threading, abc
+import urllib.parse
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
 import site_cfg
 from control2 import *
 from rlib1 import *
 from datetime import datetime, timedelta
 
-join = str.join
+log = logging.getLogger('root')
+
+_illegalChars = re.compile("[^a-zA-Z0-9 ,.-]+")
+
+def cleanName(name):
+    #security name without characters Money doesn't accept
+    return _illegalChars.sub("", name)
+
+def tzOffset(tz):
+    #seconds from UTC for a YahooTimeZone rule (e.g., '-5:EST').  0 if invalid
+    try:
+        return float(tz.split(':')[0]) * 3600
+    except ValueError:
+        return 0
+
+#quote fields requested for securities in the security master (YahooBatchURL)
+_priceFields = 'symbol,regularMarketPrice,regularMarketChangePercent,regularMarketTime,regularMarketPreviousClose,gmtOffSetMilliseconds'
+
+#YahooAuth (cookie, crumb and session) shared by all runs, when set (getdatad.py).
+#None = a new one for each run
+yahooAuth = None
+
+_hostLimits = {}
+_hostLock = threading.Lock()
+
+def hostLimit(url):
+    #semaphore limiting concurrent requests to the url host (quoteHostLimit)
+    host = urllib.parse.urlparse(url).netloc
+    with _hostLock:
+        if host not in _hostLimits:
+            _hostLimits[host] = threading.BoundedSemaphore(quoteHostLimit)
+        return _hostLimits[host]
 
 class Security:
     """
     Encapsulate a stock or mutual fund. A Security has a ticker, a name, a price quote, and
     the as-of date and time for the price quote. Name, price and as-of date and time are retrieved
-    from Yahoo! Finance.
+    from the quote providers (Yahoo! Finance by default).
 
     fields:
         status, source, ticker, name, price, quoteTime, pclose, pchange
+        tradeDate = 'YYYY-MM-DD' date of the quote at the exchange (quote history key)
+        info = security master entry (name, type, currency, timezone), or None
+        currency = currency of the quote (c: option), if it's converted.  rate = exchange rate used
     """
 
-    def __init__(self, item):
+    def __init__(self, item, tz=''):
         #item = {"ticker":TickerSym, 'm':multiplier, 's':symbol}
         # TickerSym = symbol to grab from Yahoo
         # m         = multiplier for quote
         # s         = symbol to pass to Money
+        #tz = YahooTimeZone, for quote times without an exchange offset
         self.ticker = item['ticker']
+        self.tz = tz
         self.multiplier = item['m']
         self.symbol = item['s']
+        self.currency = item.get('c', '')
+        self.rate = 1.0
         self.status = True
+        self.info = None
 
-    def _removeIllegalChars(self, inputString):
-        pattern = re.compile("[^a-zA-Z0-9 ,.-]+")
-        return pattern.sub("", inputString)
-
-    def getQuote(self):
-
-        #Yahoo! Finance:
-        #parse data packet from standard htm page
-
-        log.info('Getting quote for: %s' % self.ticker)
-
-        self.status=False
-        self.source='Y'
-        #note: each try for a quote sets self.status=true if successful
-        if eYahoo:
-            self.getYahooQuote()
-            if self.status: self.source='Y'
-
+    def logQuote(self):
         if not self.status:
             log.info('** %s: invalid quote response. Skipping.' % self.ticker)
             self.name = '*InvalidSymbol*'
@@ -132,46 +178,478 @@ class Security:
             name = self.ticker
             log.info('%s: %s %s %s %s' % (self.ticker, self.price, self.date, self.time, self.pchange))
 
-    def getYahooQuote(self):
-        #read Yahoo json data api, and return csv
-        #returns: quote= [name, price, quoteTime, pclose, pchange], all as strings
+    def setQuote(self, quote):
+        #set name, price, etc. from a quote dict (see yahooQuote).  applies the multiplier
+        #the name comes from the security master when known (quotes may be price-only)
+        if self.info:
+            self.name = self.info['name']
+        else:
+            self.name = cleanName(quote.get('name') or '')
+        if self.name.strip()=='': self.name = self.ticker
+        self.quote = quote
+        self.setPrice(self.rate)
+        self.pchange = quote['pchange']
+        self.datetime= datetime.fromtimestamp(quote['time'])
+        self.date=self.datetime.strftime("%m/%d/%Y")
+        self.time=self.datetime.strftime("%H:%M:%S")
+        self.quoteTime = self.datetime.strftime("%Y%m%d%H%M%S") + '[' + self.tz + ']'
+        offset = quote.get('gmtoffset')
+        if offset is None: offset = tzOffset(self.tz)
+        self.tradeDate = (_epoch + timedelta(seconds=quote['time'] + offset)).strftime('%Y-%m-%d')
+        self.status = True
 
-        jsonURL = (YahooURL+'&crumb={crumb}').format(ticker=self.ticker, crumb=yahooCrumb)
+    def setPrice(self, rate):
+        #price and pclose = quote * multiplier * exchange rate
+        self.rate = rate
+        factor = self.multiplier * rate
+        self.price = '%.2f' % (self.quote['price'] * factor)
+        self.pclose= '%.2f' % (self.quote['pclose'] * factor)
+
+    def useQuote(self, quote, source, info=None):
+        #set the quote from a provider result (quote=None if not found)
+        self.status = False
+        self.info = info
+        self.source = source
         self.quoteURL = 'https://finance.yahoo.com/quote/{ticker}'.format(ticker=self.ticker)  #link to pretty view
+        if quote:
+            try:
+                self.setQuote(quote)
+            except Exception:
+                #not formatted as expected?
+                if Debug: log.debug('Invalid quote data for %s' % self.ticker)
+                self.status = False
+        self.logQuote()
+
+    def getCachedQuote(self, cache, master=None):
+        #use a fresh quote from the QuoteCache.  returns True if found
+        quote = cache.get(self.ticker)
+        if quote is None: return False
+        log.info('Using cached quote for: %s' % self.ticker)
+        self.useQuote(quote, quote.get('source', 'Y'), master.get(self.ticker) if master else None)
+        return True
+
+def _raw(value):
+    #Yahoo values are either numbers, or {'raw': number, 'fmt': string}
+    return value['raw'] if isinstance(value, dict) else value
+
+def yahooQuote(quote):
+    #normalize a Yahoo quote (v10 quoteSummary price module, or v7 quote result)
+    #returns {'symbol', 'name', 'price', 'pchange', 'time', 'pclose'}.  price and pclose before multiplier
+    #full responses also give 'type' (stock/fund), 'currency' and 'timezone' (see SecurityMaster)
+    pchange = quote['regularMarketChangePercent']
+    if not isinstance(pchange, dict):
+        pchange = {'fmt': '%.2f%%' % pchange}
+    result = {'symbol': quote['symbol'],
+              'name': quote.get('shortName') or quote.get('longName') or '',
+              'price': _raw(quote['regularMarketPrice']),
+              'pchange': pchange['fmt'],
+              'time': _raw(quote['regularMarketTime']),
+              'pclose': _raw(quote['regularMarketPreviousClose'])}
+    if 'quoteType' in quote:
+        result['type'] = 'fund' if quote['quoteType'] == 'MUTUALFUND' else 'stock'
+    if 'currency' in quote:
+        result['currency'] = quote['currency']
+    if 'exchangeTimezoneName' in quote:
+        result['timezone'] = quote['exchangeTimezoneName']
+    if 'gmtOffSetMilliseconds' in quote:
+        result['gmtoffset'] = quote['gmtOffSetMilliseconds'] / 1000     #exchange time zone
+    return result
+
+#----------------------------------------------------------------------------
+# quote providers
+#   providers return quotes as dicts:  {'symbol', 'name', 'price', 'pchange', 'time', 'pclose'}
+#   (see yahooQuote).  register new sources with @registerProvider and list them in QuoteProviders
+
+providerTypes = {}
+
+def registerProvider(cls):
+    providerTypes[cls.name] = cls
+    return cls
+
+class QuoteProvider(abc.ABC):
+    """
+    Quote source.  quotes(tickers) returns {ticker: quote} for the tickers it found.
+    batchSize = number of tickers to request at once.  source = code shown in quotes.htm
+    cfg = site_cfg with the quote settings (YahooURL, QuoteFile, etc.)
+    """
+
+    name = ''
+    source = ''
+    batchSize = 1
+    master = None       #SecurityMaster, if used
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+
+    @abc.abstractmethod
+    def quotes(self, tickers):
+        pass
+
+    def close(self):
+        pass
+
+@registerProvider
+class YahooProvider(QuoteProvider):
+    """Yahoo Finance: YahooBatchURL for several tickers, YahooURL for one"""
+
+    name = 'yahoo'
+    source = 'Y'
+
+    def __init__(self, cfg):
+        QuoteProvider.__init__(self, cfg)
+        self.auth = None
+        self.lock = threading.Lock()
+        if cfg.YahooBatchURL and cfg.quoteBatchSize > 1: self.batchSize = cfg.quoteBatchSize
+
+    def get(self, url):
+        #cookie/crumb are loaded on first use.  single requests session for all
+        with self.lock:
+            if self.auth is None: self.auth = yahooAuth or YahooAuth(timeout=self.cfg.quoteTimeout or None)
+        with hostLimit(url):
+            return self.auth.get(url)
+
+    def quotes(self, tickers):
+        if len(tickers) > 1 and self.batchSize > 1:
+            return self.batch(tickers)
+        results = {}
+        for ticker in tickers:
+            quote = self.single(ticker)
+            if quote: results[ticker] = quote
+        return results
+
+    def single(self, ticker):
+        jsonURL = self.cfg.YahooURL.format(ticker=ticker)
+        log.info('Getting quote for: %s' % ticker)
+        if Debug: log.debug('Reading ' + jsonURL)
+        try:
+            response = self.get(jsonURL)
+        except Exception:
+            if Debug: log.debug('** Error reading %s' % jsonURL)
+            return None
+        try:
+            pdata = json.loads(response.text)
+            return yahooQuote(pdata['quoteSummary']['result'][0]['price'])
+        except Exception:
+            #not formatted as expected?
+            if Debug: log.debug('An error occured when parsing the Yahoo Finance response for %s' % ticker)
+            return None
+
+    def batch(self, tickers):
+        #a single YahooBatchURL request.  price fields only if all tickers are in the security master
+        symbols = ','.join(urllib.parse.quote(t, safe='') for t in tickers)
+        jsonURL = self.cfg.YahooBatchURL.format(symbols=symbols)
+        if self.master and all(self.master.known(t) for t in tickers):
+            jsonURL += ('&' if '?' in jsonURL else '?') + 'fields=' + _priceFields
+        log.info('Getting quotes for: %s' % ', '.join(tickers))
         if Debug: log.debug('Reading ' + jsonURL)
-        self.status=True
 
+        found = {}
         try:
-            response=yahooSession.get(jsonURL)
+            response = self.get(jsonURL)
+            for quote in json.loads(response.text)['quoteResponse']['result']:
+                found[quote['symbol'].upper()] = quote
+        except Exception:
+            if Debug: log.debug('** Error reading batch quotes for %s' % ', '.join(tickers))
+
+        results = {}
+        for ticker in tickers:
+            if ticker.upper() not in found: continue
+            try:
+                results[ticker] = yahooQuote(found[ticker.upper()])
+            except Exception:
+                if Debug: log.debug('An error occured when parsing the Yahoo Finance response for %s' % ticker)
+        return results
+
+    def close(self):
+        if self.auth and self.auth is not yahooAuth: self.auth.session.close()
 
-        except:
-            if Debug: log.debug('** Error reading %s' % self.quoteURL)
-            self.status = False
+@registerProvider
+class FileProvider(QuoteProvider):
+    """
+    Local price file (QuoteFile), for offline use or testing.  Read once per run.
+      csv:  header row with symbol (or ticker) and price columns.  optional: pclose, name, time, pchange
+      json: {"TICKER": price, ...} or {"TICKER": {"price": ..., "pclose": ..., ...}, ...}
+    time = epoch seconds or 'YYYY-MM-DD HH:MM:SS' (default: the file's modification time)
+    """
 
-        if self.status:
+    name = 'file'
+    source = 'F'
+
+    def __init__(self, cfg):
+        QuoteProvider.__init__(self, cfg)
+        self.filename = cfg.quoteFile
+        self.prices = None
+        self.lock = threading.Lock()
+        self.batchSize = 1000
+
+    def load(self):
+        import csv
+        mtime = os.path.getmtime(self.filename)
+        if self.filename.lower().endswith('.json'):
+            with open(self.filename) as f:
+                data = json.load(f)
+            rows = [dict(v, symbol=k) if isinstance(v, dict) else {'symbol': k, 'price': v} for k, v in data.items()]
+        else:
+            with open(self.filename, newline='') as f:
+                rows = [{k.strip().lower(): v for k, v in r.items() if k} for r in csv.DictReader(f)]
+
+        prices = {}
+        for r in rows:
+            symbol = (r.get('symbol') or r.get('ticker') or '').strip().upper()
             try:
-                ht = response.text
-                pdata = json.loads(ht)
-                quote = pdata['quoteSummary']['result'][0]['price']
-                self.name = quote['shortName'] or quote['longName'] or ''
-                self.name = self._removeIllegalChars(self.name)
-                if self.name.strip()=='': self.name = quote['symbol']
-                self.price = '%.2f' % (quote['regularMarketPrice']['raw'] * self.multiplier)
-                self.pchange = quote['regularMarketChangePercent']['fmt']
-                self.datetime= datetime.fromtimestamp(quote['regularMarketTime'])
-                self.date=self.datetime.strftime("%m/%d/%Y")
-                self.time=self.datetime.strftime("%H:%M:%S")
-                self.quoteTime = self.datetime.strftime("%Y%m%d%H%M%S") + '[' + YahooTimeZone + ']'
-                self.pclose= '%.2f' % (quote['regularMarketPreviousClose']['raw'] * self.multiplier)
-
-            except:
-                #not formatted as expected?
-                if Debug: log.debug('An error occured when parsing the Yahoo Finance response for %s' % self.ticker)
-                self.status=False
+                price = float(r['price'])
+                pclose = float(r.get('pclose') or price)
+                t = r.get('time') or mtime
+                try:
+                    t = float(t)
+                except ValueError:
+                    t = datetime.strptime(t.strip(), '%Y-%m-%d %H:%M:%S').timestamp()
+            except (KeyError, TypeError, ValueError):
+                log.info('%s: invalid entry for %s.  Skipped.' % (self.filename, symbol or '?'))
+                continue
+            pchange = r.get('pchange') or '%.2f%%' % ((price - pclose) / pclose * 100 if pclose else 0)
+            prices[symbol] = {'symbol': symbol, 'name': r.get('name') or '', 'price': price, 'pclose': pclose,
+                              'time': t, 'pchange': pchange if isinstance(pchange, str) else '%.2f%%' % pchange}
+        return prices
+
+    def quotes(self, tickers):
+        with self.lock:
+            if self.prices is None:
+                try:
+                    self.prices = self.load()
+                except (OSError, ValueError) as e:
+                    log.warning('Error reading QuoteFile %s: %s' % (self.filename, e))
+                    self.prices = {}
+        return {t: self.prices[t.upper()] for t in tickers if t.upper() in self.prices}
+
+def quoteProviders(cfg, master=None):
+    #provider objects for QuoteProviders (cfg = site_cfg), in order.  the first is the primary
+    providers = []
+    for name in cfg.quoteProviders:
+        if name == 'yahoo' and not cfg.enableYahooFinance: continue
+        if name not in providerTypes:
+            log.warning('Unknown quote provider: %s' % name)
+            continue
+        provider = providerTypes[name](cfg)
+        provider.master = master
+        providers.append(provider)
+    return providers
+
+def hedgedQuotes(tickers, providers, pool, deadline, hedgeDelay=0):
+    #get quotes for tickers from the first provider.  if it hasn't answered within hedgeDelay seconds,
+    #or answered without all of them, the next provider is asked for the rest too.  the first valid quote
+    #for each ticker is used.  gives up at deadline (time.time() value, or inf for no limit)
+    #returns {ticker: (quote, provider)}
+    found = {}
+    pending = {}
+    queue = list(providers)
+    if not queue or time.time() >= deadline: return found
+
+    def ask():
+        provider = queue.pop(0)
+        need = [t for t in tickers if t not in found]
+        pending[pool.submit(provider.quotes, need)] = provider
+
+    ask()
+    while pending and len(found) < len(tickers):
+        wait = deadline - time.time()
+        if wait <= 0:
+            log.info('** Quote timeout for: %s' % ', '.join(t for t in tickers if t not in found))
+            break
+        if queue and hedgeDelay > 0: wait = min(wait, hedgeDelay)
+        if wait == float('inf'): wait = None        #no limit
+        done, notDone = futures.wait(pending, timeout=wait, return_when=futures.FIRST_COMPLETED)
+        for f in done:
+            provider = pending.pop(f)
+            try:
+                results = f.result()
+            except Exception:
+                log.exception('Quote provider %s failed' % provider.name)
+                results = {}
+            for ticker, quote in results.items():
+                if ticker not in found: found[ticker] = (quote, provider)
+        if queue and len(found) < len(tickers) and (not done or not pending):
+            if not done: log.info('Quote provider %s is slow.  Also asking %s' % (pending[next(iter(pending))].name, queue[0].name))
+            ask()
+
+    return found
+
+_epoch = datetime(1970,1,1)
+
+class QuoteCache:
+    """
+    On-disk quote cache, keyed by ticker.  Entries are yahooQuote dicts plus the download time (fetched).
+    An entry is fresh for ttl minutes after download.  A quote stamped after the last market close
+    stays fresh until the market opens again.
+
+    hours = regular market hours ('09:30-16:00', Mon-Fri), in the timezone of tz (YahooTimeZone, e.g. '-5:EST')
+            None = no market hours (ttl only)
+    """
+
+    def __init__(self, filename, ttl, hours, tz):
+        self.filename = filename
+        self.ttl = ttl * 60
+        self.hours = hours
+        self.offset = 0
+        self.open, self.close = datetime.strptime('09:30','%H:%M').time(), datetime.strptime('16:00','%H:%M').time()
+        if hours:
+            try:
+                self.offset = float(tz.split(':')[0]) * 3600
+            except ValueError:
+                log.warning('Invalid YahooTimeZone (%s).  Using UTC for market hours.' % tz)
+            try:
+                self.open, self.close = [datetime.strptime(t.strip(),'%H:%M').time() for t in hours.split('-')]
+            except ValueError:
+                log.warning('Invalid QuoteMarketHours (%s).  Using 09:30-16:00.' % hours)
+
+        self.quotes = {}
+        if glob.glob(filename):
+            try:
+                with open(filename) as f:
+                    self.quotes = json.load(f)
+            except (OSError, ValueError):
+                log.info('Error reading %s.  Starting a new quote cache.' % filename)
+
+    def lastClose(self, now):
+        #time (epoch) of the last market close, or None if the market is open at now
+        local = _epoch + timedelta(seconds=now + self.offset)
+        if local.weekday() < 5 and self.open <= local.time() < self.close:
+            return None
+        day = local.date()
+        if local.weekday() >= 5 or local.time() < self.close:
+            day -= timedelta(days=1)
+        while day.weekday() >= 5:
+            day -= timedelta(days=1)
+        return (datetime.combine(day, self.close) - _epoch).total_seconds() - self.offset
+
+    def get(self, ticker, now=None):
+        #returns the cached quote for ticker if it's fresh, else None
+        quote = self.quotes.get(ticker)
+        if not quote: return None
+        now = now or time.time()
+        if now - quote['fetched'] < self.ttl:
+            return quote
+        close = self.lastClose(now) if self.hours else None
+        if close is not None and quote['time'] >= close:
+            return quote
+        return None
+
+    def put(self, ticker, quote):
+        self.quotes[ticker] = dict(quote, fetched=time.time())
+
+    def save(self):
+        #write to a temp file and rename, so a failed write doesn't leave a partial cache
+        tmp = self.filename + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.quotes, f)
+            os.replace(tmp, self.filename)
+        except OSError:
+            log.warning('Error writing %s' % self.filename)
+
+class FxRates:
+    """
+    Exchange rates to the quote currency (base), for securities with a c: option.  Rates are
+    Yahoo currency pairs (e.g., EURUSD=X = USD per EUR), requested together with the quotes.
+    Downloaded rates are reused for ttl minutes (0 = always download).
+    """
+
+    def __init__(self, base, filename, ttl):
+        self.base = base.upper()
+        self.rates = {}
+        self.pairs = {}
+        self.cache = QuoteCache(filename, ttl, None, None) if ttl > 0 else None
+
+    def need(self, secs):
+        #returns the pair tickers to request for secs (rates that aren't cached)
+        for sec in secs:
+            if sec.currency and sec.currency != self.base:
+                self.pairs[sec.currency] = '%s%s=X' % (sec.currency, self.base)
+        stale = []
+        for currency, pair in self.pairs.items():
+            quote = self.cache.get(pair) if self.cache else None
+            if quote:
+                self.rates[currency] = quote['price']
+            elif pair not in stale:
+                stale.append(pair)
+        return stale
+
+    def update(self, found):
+        #save rates from the provider results:  {ticker: (quote, provider)}
+        for currency, pair in self.pairs.items():
+            if pair in found:
+                quote = found[pair][0]
+                self.rates[currency] = quote['price']
+                if self.cache: self.cache.put(pair, quote)
+        if self.cache: self.cache.save()
+
+    def convert(self, secs):
+        #convert the prices of secs (valid quotes) to the base currency.  the rates for all securities are
+        #looked up first, then applied together.  securities without a rate are marked invalid
+        secs = [sec for sec in secs if sec.currency and sec.currency != self.base]
+        rates = [self.rates.get(sec.currency) for sec in secs]
+        for sec, rate in zip(secs, rates):
+            if rate:
+                sec.setPrice(rate)
+                log.info('%s: %s converted from %s at %s' % (sec.ticker, sec.price, sec.currency, rate))
+            else:
+                log.info('** %s: no exchange rate for %s to %s. Skipping.' % (sec.ticker, sec.currency, self.base))
+                sec.status = False
+
+class SecurityMaster:
+    """
+    On-disk security master, keyed by ticker:  {'name', 'type', 'currency', 'timezone', 'updated'}
+    Names are cleaned once, when saved.  An entry is known (price-only quotes are enough) for
+    refresh days after it was last updated from a full quote.
+    """
+
+    def __init__(self, filename, refresh):
+        self.filename = filename
+        self.refresh = refresh * 86400
+        self.changed = False
+        self.securities = {}
+        if glob.glob(filename):
+            try:
+                with open(filename) as f:
+                    self.securities = json.load(f)
+            except (OSError, ValueError):
+                log.info('Error reading %s.  Starting a new security master.' % filename)
+
+    def get(self, ticker):
+        return self.securities.get(ticker)
+
+    def known(self, ticker, now=None):
+        info = self.securities.get(ticker)
+        return info is not None and (now or time.time()) - info['updated'] < self.refresh
+
+    def update(self, ticker, quote):
+        #save the name, etc. from a full quote.  price-only quotes (no name) are ignored
+        name = cleanName(quote.get('name') or '')
+        if not name.strip(): return
+        info = self.securities.get(ticker, {})
+        self.securities[ticker] = {'name': name,
+                                   'type': quote.get('type') or info.get('type', ''),
+                                   'currency': quote.get('currency') or info.get('currency', ''),
+                                   'timezone': quote.get('timezone') or info.get('timezone', ''),
+                                   'updated': time.time()}
+        self.changed = True
+
+    def save(self):
+        #write to a temp file and rename, as with QuoteCache
+        if not self.changed: return
+        tmp = self.filename + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.securities, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.filename)
+            self.changed = False
+        except OSError:
+            log.warning('Error writing %s' % self.filename)
 
 class OfxWriter:
     """
     Create an OFX file based on a list of stocks and mutual funds.
+    The file is written with OfxStream, one element at a time.
     """
 
     def __init__(self, currency, account, shares, stockList, mfList):
@@ -194,234 +672,310 @@ class OfxWriter:
 
         return dtasof
 
-    def _signOn(self):
+    def _signOn(self, s):
         """Generate server signon response message"""
 
-        return OfxTag("SIGNONMSGSRSV1",
-                    OfxTag("SONRS",
-                         OfxTag("STATUS",
-                             OfxField("CODE", "0"),
-                             OfxField("SEVERITY", "INFO"),
-                             OfxField("MESSAGE","Successful Sign On")
-                         ),
-                         OfxField("DTSERVER", dateTimeStr()),
-                         OfxField("LANGUAGE", "ENG"),
-                         OfxField("DTPROFUP", "20010918083000"),
-                         OfxTag("FI", OfxField("ORG", "PocketSense"))
-                     )
-               )
-
-    def invPosList(self):
-        # create INVPOSLIST section, including all stock and MF symbols
-        posstock = []
-        for stock in self.stockList:
-            posstock.append(self._pos("stock", stock.symbol, stock.price, stock.quoteTime))
-
-        posmf = []
-        for mf in self.mfList:
-            posmf.append(self._pos("mf", mf.symbol, mf.price, mf.quoteTime))
-
-        return OfxTag("INVPOSLIST",
-                    join("", posstock),     #str.join("",StrList) = "str(0)+str(1)+str(2)..."
-                    join("", posmf))
-
-
-    def _pos(self, type, symbol, price, quoteTime):
-        return OfxTag("POS" + type.upper(),
-                   OfxTag("INVPOS",
-                       OfxTag("SECID",
-                           OfxField("UNIQUEID", symbol),
-                           OfxField("UNIQUEIDTYPE", "TICKER")
-                       ),
-                       OfxField("HELDINACCT", "CASH"),
-                       OfxField("POSTYPE", "LONG"),
-                       OfxField("UNITS", str(self.shares)),
-                       OfxField("UNITPRICE", price),
-                       OfxField("MKTVAL", str(float2(price)*self.shares)),
-                       #OfxField("MKTVAL", "0"),     #rlc:08-2013
-                       OfxField("DTPRICEASOF", quoteTime)
-                   )
-               )
-
-    def invStmt(self, acctid):
+        with s.aggregate("SIGNONMSGSRSV1"), s.aggregate("SONRS"):
+            with s.aggregate("STATUS"):
+                s.fields(("CODE", "0"),
+                         ("SEVERITY", "INFO"),
+                         ("MESSAGE","Successful Sign On"))
+            s.fields(("DTSERVER", dateTimeStr()),
+                     ("LANGUAGE", "ENG"),
+                     ("DTPROFUP", "20010918083000"))
+            with s.aggregate("FI"):
+                s.field("ORG", "PocketSense")
+
+    def invPosList(self, s):
+        # write INVPOSLIST section, including all stock and MF symbols
+        with s.aggregate("INVPOSLIST"):
+            for stock in self.stockList:
+                self._pos(s, "stock", stock.symbol, stock.price, stock.quoteTime)
+            for mf in self.mfList:
+                self._pos(s, "mf", mf.symbol, mf.price, mf.quoteTime)
+
+    def _pos(self, s, type, symbol, price, quoteTime):
+        with s.aggregate("POS" + type.upper()), s.aggregate("INVPOS"):
+            with s.aggregate("SECID"):
+                s.fields(("UNIQUEID", symbol),
+                         ("UNIQUEIDTYPE", "TICKER"))
+            s.fields(("HELDINACCT", "CASH"),
+                     ("POSTYPE", "LONG"),
+                     ("UNITS", str(self.shares)),
+                     ("UNITPRICE", price),
+                     ("MKTVAL", str(float2(price)*self.shares)),
+                     #("MKTVAL", "0"),     #rlc:08-2013
+                     ("DTPRICEASOF", quoteTime))
+
+    def invStmt(self, s, acctid):
         #write the INVSTMTRS section
-        stmt = OfxTag("INVSTMTRS",
-                OfxField("DTASOF", self.dtasof),
-                OfxField("CURDEF", self.currency),
-                OfxTag("INVACCTFROM",
-                    OfxField("BROKERID", "PocketSense"),
-                    OfxField("ACCTID",acctid)
-                ),
-                OfxTag("INVTRANLIST",
-                    OfxField("DTSTART", self.dtasof),
-                    OfxField("DTEND", self.dtasof),
-                ),
-                self.invPosList()
-               )
-
-        return stmt
-
-    def invServerMsg(self,stmt):
-        #wrap stmt in INVSTMTMSGSRSV1 tag set
-        s = OfxTag("INVSTMTTRNRS",
-                    OfxField("TRNUID",ofxUUID()),
-                    OfxTag("STATUS",
-                        OfxField("CODE", "0"),
-                        OfxField("SEVERITY", "INFO")),
-                    OfxField("CLTCOOKIE","4"),
-                    stmt)
-        return OfxTag("INVSTMTMSGSRSV1", s)
-
-    def _secList(self):
-        stockinfo = []
-        for stock in self.stockList:
-            stockinfo.append(self._info("stock", stock.symbol, stock.name, stock.price))
-
-        mfinfo = []
-        for mf in self.mfList:
-            mfinfo.append(self._info("mf", mf.symbol, mf.name, mf.price))
-
-        return OfxTag("SECLISTMSGSRSV1",
-                   OfxTag("SECLIST",
-                        join("", stockinfo),
-                        join("", mfinfo)
-                   )
-               )
-
-    def _info(self, type, symbol, name, price):
-        secInfo = OfxTag("SECINFO",
-                       OfxTag("SECID",
-                           OfxField("UNIQUEID", symbol),
-                           OfxField("UNIQUEIDTYPE", "TICKER")
-                       ),
-                       OfxField("SECNAME", name),
-                       OfxField("TICKER", symbol),
-                       OfxField("UNITPRICE", price),
-                       OfxField("DTASOF", self.dtasof)
-                   )
-        if type.upper() == "MF":
-            info = OfxTag(type.upper() + "INFO",
-                       secInfo,
-                       OfxField("MFTYPE", "OPENEND")
-                   )
-        else:
-            info = OfxTag(type.upper() + "INFO", secInfo)
-
-        return info
+        with s.aggregate("INVSTMTRS"):
+            s.fields(("DTASOF", self.dtasof),
+                     ("CURDEF", self.currency))
+            with s.aggregate("INVACCTFROM"):
+                s.fields(("BROKERID", "PocketSense"),
+                         ("ACCTID",acctid))
+            with s.aggregate("INVTRANLIST"):
+                s.fields(("DTSTART", self.dtasof),
+                         ("DTEND", self.dtasof))
+            self.invPosList(s)
+
+    def invServerMsg(self, s, acctid):
+        #write the statement, wrapped in INVSTMTMSGSRSV1 tag set
+        with s.aggregate("INVSTMTMSGSRSV1"), s.aggregate("INVSTMTTRNRS"):
+            s.field("TRNUID",ofxUUID())
+            with s.aggregate("STATUS"):
+                s.fields(("CODE", "0"),
+                         ("SEVERITY", "INFO"))
+            s.field("CLTCOOKIE","4")
+            self.invStmt(s, acctid)
+
+    def _secList(self, s):
+        with s.aggregate("SECLISTMSGSRSV1"), s.aggregate("SECLIST"):
+            for stock in self.stockList:
+                self._info(s, "stock", stock.symbol, stock.name, stock.price)
+            for mf in self.mfList:
+                self._info(s, "mf", mf.symbol, mf.name, mf.price)
+
+    def _info(self, s, type, symbol, name, price):
+        with s.aggregate(type.upper() + "INFO"):
+            with s.aggregate("SECINFO"):
+                with s.aggregate("SECID"):
+                    s.fields(("UNIQUEID", symbol),
+                             ("UNIQUEIDTYPE", "TICKER"))
+                s.fields(("SECNAME", name),
+                         ("TICKER", symbol),
+                         ("UNITPRICE", price),
+                         ("DTASOF", self.dtasof))
+            if type.upper() == "MF":
+                s.field("MFTYPE", "OPENEND")
+
+    def write(self, f):
+        #write the OFX message (with header) to f
+        s = OfxStream(f)
+        s.header()
+        with s.aggregate('OFX'):
+            s.raw('<!--Created by PocketSense scripts for Money-->')
+            s.raw('<!--https://sites.google.com/site/pocketsense/home-->')
+            self._signOn(s)
+            self.invServerMsg(s, self.account)
+            self._secList(s)
 
     def getOfxMsg(self):
-        #create main OFX message block
-        return join('', [OfxTag('OFX',
-                        '<!--Created by PocketSense scripts for Money-->',
-                        '<!--https://sites.google.com/site/pocketsense/home-->',
-                        self._signOn(),
-                        self.invServerMsg(self.invStmt(self.account)),
-                        self._secList()
-                    )])
+        #OFX message as a string (header included)
+        f = io.StringIO()
+        self.write(f)
+        return f.getvalue()
 
     def writeFile(self, name):
-        f = open(name,"w")
-        f.write(OfxSGMLHeader())
-        f.write(self.getOfxMsg())
-        f.close()
+        with open(name, "w") as f:
+            self.write(f)
 
-def getYahooSession():
-    #create requests session for yahoo finance
-    #gets session cookie/crumb and reuses until it expires
-    #deleting cookie file will force a refresh
+class YahooAuth:
+    """
+    Yahoo Finance session cookie and crumb, shared by all quote threads.
 
-    cookieFile='cookies.dat'
-    yCookies, cookie, crumb=None, None, None
+    The cookie/crumb are saved to cookieFile and reused until the cookie expires (deleting the
+    file forces a refresh).  If Yahoo rejects them early (401, or an invalid crumb/cookie message),
+    the first request to see it refreshes them under a lock, and every request that was sent with
+    the old crumb is sent again with the new one.  At most maxRefresh refreshes are tried per run.
+    """
 
+    cookieFile = 'cookies.dat'
     headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 6.2; Win64; x64)'}
-    if glob.glob(cookieFile):
-        #read cookie info
+    _rejected = re.compile(r'invalid (crumb|cookie)', re.I)
+
+    def __init__(self, maxRefresh=1, timeout=None):
+        import requests
+        self.lock = threading.Lock()
+        self.generation = 0         #incremented each time the cookie/crumb are refreshed
+        self.refreshes = 0
+        self.maxRefresh = maxRefresh
+        self.timeout = timeout      #seconds per request (None = no limit)
+        self.crumb = None
+        self.session = requests.session()
+        #connection pool large enough for all quote threads
+        self.session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=quoteWorkers))
+        self.session.headers.update(self.headers)
+        if not self.load():
+            self.fetch()
+
+    def load(self):
+        #use the saved cookie/crumb.  returns False if not found or expiring soon
+        import pickle
+        if not glob.glob(self.cookieFile): return False
         try:
-            with open(cookieFile, 'rb') as f:
-                data=pickle.load(f)
-                yahooFin = data['yahooFinance']
-                cookie = yahooFin['cookie']
-                crumb  = yahooFin['crumb']
-                expires = datetime.fromtimestamp(cookie.expires)
-                if datetime.now() > (expires - timedelta(days=1)):
-                    cookie=None
-        except Exception as e:
-            log.debug('Error loading %s' % cookieFile)
-
-    if not cookie:
-        #cookie not found or expiring soon.  refresh
+            with open(self.cookieFile, 'rb') as f:
+                yahooFin = pickle.load(f)['yahooFinance']
+            cookie, crumb = yahooFin['cookie'], yahooFin['crumb']
+        except Exception:
+            log.debug('Error loading %s' % self.cookieFile)
+            return False
+        if not crumb: return False
+        if cookie.expires and datetime.now() > datetime.fromtimestamp(cookie.expires) - timedelta(days=1):
+            return False
+        self.setCookie(cookie, crumb)
+        return True
+
+    def fetch(self):
+        #get a new cookie and crumb from Yahoo and save them.  returns True if successful
+        import requests
         log.info('Fetching new Yahoo Finance cookie')
-        response = requests.get("https://fc.yahoo.com", headers=headers, allow_redirects=True)
-        if not response.cookies:
+        cookie, crumb = None, None
+        try:
+            response = requests.get("https://fc.yahoo.com", headers=self.headers, allow_redirects=True)
+            if response.cookies:
+                cookie = list(response.cookies)[0]     #first cookie in cookiejar (cookie.name, cookie.value, etc.)
+            crumb_response = requests.get("https://query2.finance.yahoo.com/v1/test/getcrumb",
+                    headers=self.headers,
+                    cookies=response.cookies,
+                    allow_redirects=True,
+                )
+            if crumb_response.status_code == 200 and not self.rejected(crumb_response):
+                crumb = crumb_response.text.strip()
+        except requests.RequestException as e:
+            log.error('Error connecting to Yahoo Finance: %s' % e)
+
+        if not cookie:
             log.error("Failed to obtain Yahoo auth cookie")
-        else:
-            yCookies=response.cookies   #requests cookiejar
-
-        cookie = list(yCookies)[0]      #first cookie in cookiejar.  namespace type with all fields (i.e., cookie.name, cookie.value, etc.)
-        expires = datetime.fromtimestamp(cookie.expires)
-
-        crumb = None
-        crumb_response = requests.get("https://query2.finance.yahoo.com/v1/test/getcrumb",
-                headers=headers,
-                cookies=yCookies,
-                allow_redirects=True,
-            )
-        crumb = crumb_response.text
-        if crumb is None:
+        elif not crumb:
             log.error("Failed to retrieve Yahoo crumb")
+        else:
+            self.setCookie(cookie, crumb)
+            self.save(cookie, crumb)
+            return True
+        return False
+
+    def setCookie(self, cookie, crumb):
+        self.session.cookies.set(cookie.name, cookie.value)
+        self.crumb = crumb
+        if Debug:
+            expires = datetime.fromtimestamp(cookie.expires).strftime('%m/%d/%Y') if cookie.expires else 'session'
+            log.debug('YahooFinance: cookie={cookie}, expires={expires}, crumb={crumb}'.format(
+                        cookie=cookie, expires=expires, crumb=crumb)
+                     )
 
-        #save cookie info
-        cookieData = {'yahooFinance': {'cookie': cookie, 'crumb': crumb}}
-        with open(cookieFile,'wb') as f:
-            pickle.dump(cookieData, f)
-
-    if Debug:
-        log.debug('YahooFinance: cookie={cookie}, expires={expires}, crumb={crumb}'.format(
-                    cookie=cookie, expires=expires.strftime('%m/%d/%Y'), crumb=crumb)
-                 )
-    session = requests.session()
-    session.headers.update(headers)
-    session.cookies.update({cookie.name: cookie.value})
-    return session, crumb
+    def save(self, cookie, crumb):
+        #write to a temp file and rename, so other runs never read a partial file
+        import pickle
+        tmp = self.cookieFile + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                pickle.dump({'yahooFinance': {'cookie': cookie, 'crumb': crumb}}, f)
+            os.replace(tmp, self.cookieFile)
+        except OSError:
+            log.warning('Error writing %s' % self.cookieFile)
+
+    def rejected(self, response):
+        #did Yahoo reject the cookie/crumb?  error messages are short, so only the start of the body is checked
+        return response.status_code == 401 or self._rejected.search(response.text, 0, 512) is not None
+
+    def refresh(self, generation):
+        #a request sent with generation's crumb was rejected.  returns True if there's a new crumb to retry with
+        with self.lock:
+            if self.generation != generation:
+                return True         #already refreshed by another thread
+            if self.refreshes >= self.maxRefresh:
+                return False
+            self.refreshes += 1
+            log.info('Yahoo Finance rejected the saved cookie/crumb.  Refreshing.')
+            if not self.fetch():
+                return False
+            self.generation += 1
+            return True
+
+    def get(self, url):
+        #GET url with the current crumb.  if Yahoo rejects it, refresh and send again
+        generation, crumb = self.generation, self.crumb
+        response = self.session.get(url, params={'crumb': crumb}, timeout=self.timeout)
+        if self.rejected(response) and self.refresh(generation):
+            response = self.session.get(url, params={'crumb': self.crumb}, timeout=self.timeout)
+        return response
+
+def fetchQuotes(stocks, funds, cache=None, master=None, fx=None, cfg=None):
+    #get quotes for stocks and funds using up to quoteWorkers threads.  fresh quotes in cache aren't requested
+    #cfg = site_cfg with the quote settings (default: sites.dat)
+    #names come from the security master, when given, and new securities are added to it
+    #fx (FxRates) converts quotes with a c: currency.  exchange rates are requested with the quotes
+    #returns status, stockList, mfList.  lists are in sites.dat order, and only include valid quotes
+    if cfg is None: cfg = site_cfg.userdat()
+    secs = [Security(item, cfg.YahooTimeZone) for item in stocks + funds]
+    stale = [sec for sec in secs if not (cache and sec.getCachedQuote(cache, master))]
+    pairs = fx.need(secs) if fx else []
+
+    if stale or pairs:
+        providers = quoteProviders(cfg, master)
+        tickers = []
+        for ticker in [sec.ticker for sec in stale] + pairs:
+            if ticker not in tickers: tickers.append(ticker)
+
+        found = {}
+        deadline = time.time() + cfg.quoteTimeout if cfg.quoteTimeout else float('inf')    #for the whole quote stage.  0 = no limit
+        #provider requests get their own threads, so a slow provider can be abandoned (hedged requests)
+        providerPool = ThreadPoolExecutor(max_workers=max(1, quoteWorkers * len(providers)))
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, min(quoteWorkers, len(tickers)))) as pool:
+                fetch = lambda chunk: hedgedQuotes(chunk, providers, providerPool, deadline, cfg.quoteHedgeDelay)
+                todo = tickers
+                size = providers[0].batchSize if providers else 1
+                if size > 1 and len(todo) > 1:
+                    #batch requests first.  anything missing is requested individually
+                    chunks = [todo[i:i+size] for i in range(0, len(todo), size)]
+                    for results in pool.map(fetch, chunks): found.update(results)
+                    todo = [t for t in tickers if t not in found]
+                    if todo:
+                        log.info('%d symbol(s) not found in batch quotes.  Requesting individually.' % len(todo))
+                if todo and providers:
+                    for results in pool.map(fetch, [[t] for t in todo]): found.update(results)
+        finally:
+            #don't wait for abandoned requests
+            providerPool.shutdown(wait=False, cancel_futures=True)
+            for provider in providers: provider.close()
+
+        for sec in stale:
+            quote, provider = found.get(sec.ticker, (None, None))
+            info = None
+            if master:
+                if quote: master.update(sec.ticker, quote)
+                info = master.get(sec.ticker)
+            sec.useQuote(quote, provider.source if provider else 'Y', info)
+            if cache and sec.status: cache.put(sec.ticker, dict(sec.quote, source=sec.source))
+        if cache: cache.save()
+        if master: master.save()
+        if fx: fx.update(found)
+
+    if fx: fx.convert([sec for sec in secs if sec.status])
+
+    status = all(sec.status for sec in secs)
+    stockList = [sec for sec in secs[:len(stocks)] if sec.status]
+    mfList    = [sec for sec in secs[len(stocks):] if sec.status]
+    return status, stockList, mfList
 
 #----------------------------------------------------------------------------
 def getQuotes():
 
-    global YahooURL, eYahoo, YahooTimeZone
     status = True    #overall status flag across all operations (true == no errors getting data)
 
     global log
     log = logging.getLogger('root')
 
     #get site and other user-defined data
-    userdat = site_cfg.site_cfg()
+    userdat = site_cfg.userdat()
     stocks = userdat.stocks
     funds = userdat.funds
-    eYahoo = userdat.enableYahooFinance
-    YahooURL = userdat.YahooURL
-    YahooTimeZone = userdat.YahooTimeZone
     currency = userdat.quotecurrency
     account = userdat.quoteAccount
     ofxFile1, ofxFile2, htmFileName = '','',''
 
-    #use single requests session for all
-    global yahooSession, yahooCrumb
-    yahooSession, yahooCrumb = getYahooSession()
+    cache = None
+    if userdat.quoteCacheTTL > 0:
+        cache = QuoteCache(quoteCacheFile, userdat.quoteCacheTTL, userdat.quoteMarketHours, userdat.YahooTimeZone)
+
+    master = SecurityMaster(securityFile, securityRefresh)
+    fx = FxRates(currency, fxCacheFile, userdat.fxCacheTTL)
 
     log.info('Getting security and fund quotes')
-    stockList, mfList = [], []
-    with yahooSession:
-        for item in stocks:
-            sec = Security(item)
-            sec.getQuote()
-            status = status and sec.status
-            if sec.status: stockList.append(sec)
-
-        for item in funds:
-            sec = Security(item)
-            sec.getQuote()
-            status = status and sec.status
-            if sec.status: mfList.append(sec)
+    status, stockList, mfList = fetchQuotes(stocks, funds, cache, master, fx, userdat)
 
     qList = stockList + mfList
 
@@ -447,21 +1001,12 @@ def getQuotes():
         # write quotes.htm file
         htmFileName = QuoteHTMwriter(qList)
 
-        #append results to QuoteHistory.csv if enabled
+        #save results to the quote history store if enabled
         if status and userdat.savequotehistory:
-            csvFile = xfrdir+"QuoteHistory.csv"
-            log.info('Appending quote results to {0}'.format(csvFile))
-            newfile = (glob.glob(csvFile) == [])
-            f = open(csvFile,"a")
-            if newfile:
-                f.write('Symbol,Name,Price,Date/Time,LastClose,%Change\n')
-            for s in qList:
-                #Fieldnames: symbol, name, price, quoteTime, pclose, pchange
-                t = s.quoteTime
-                t2 = t[4:6]+'/'+t[6:8]+'/'+t[0:4]+' '+ t[8:10]+":"+t[10:12]+":"+t[12:14]
-                line = '"{0}","{1}",{2},{3},{4},{5}\n' \
-                        .format(s.symbol, s.name, s.price, t2, s.pclose, s.pchange)
-                f.write(line)
-            f.close()
+            import quotehist
+            try:
+                quotehist.saveQuotes(qList, userdat.quoteHistoryFile)
+            except Exception:
+                log.exception('An error occurred saving quotes to %s' % userdat.quoteHistoryFile)
 
     return status, ofxFile1, ofxFile2, htmFileName
@@ -19,11 +19,20 @@
 #   - removed OfxDate() and added dateTimeStr()
 # 19Jun2023*rlc
 #   - add logging
-
-import os, glob, site_cfg, time, uuid, re, random
-import hashlib, urllib.parse, getpass
+# 19Oct2026
+#   - add MappedFile for bytes-level (mmap) processing of large statement files
+#   - QuoteHTMwriter uses the process-wide site_cfg.userdat()
+#   - import pyDes, pickle, hashlib and getpass when first needed
+#   - acctEncrypt/acctDecrypt crypt all account fields in one pass (pyDes encrypt_many/decrypt_many)
+#   - create_logger() searches the existing log file in place (mmap) rather than reading it
+#   - add OfxStream: streaming ofx writer (aggregates and fields written directly to a file)
+#   - combineOfx() streams sections to the combined file instead of building it in memory
+#   - add daemonize() (credagent.py, getdatad.py)
+
+import os, glob, time, uuid, re, random, mmap, contextlib
+import urllib.parse
 import logging, logging.handlers
-import sys, pyDes, pickle
+import sys
 from datetime import datetime
 from control2 import *
 
@@ -67,22 +76,29 @@ def create_logger(name, filename):
     if logFileEnable: logger.addHandler(file_handler)
 
     #warn if sensitive info is in the log file, which may happen during debug
-    try:
-        with open(filename) as f:
-            log=f.read()
-        if '<USERID>' in log or '<USERPASS>' in log:
-            logger.warn('**Sensitive user/account info found in %s' % filename)
-    except:
-        raise
+    if os.path.getsize(filename) > 0:
+        with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as log:
+            if log.find(b'<USERID>') >= 0 or log.find(b'<USERPASS>') >= 0:
+                logger.warning('**Sensitive user/account info found in %s' % filename)
     
     return logger
 
 #logging handlers <end> ------
 
+def daemonize():
+    #fork into the background, detached from the terminal (requires os.fork).
+    #returns True in the parent, which should exit, and False in the background process
+    if os.fork(): return True
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in range(3):
+        os.dup2(devnull, fd)
+    return False
 
 def clientUID(url, username, delKey=False):
     #get clientUID for urlHost+username.  if not exists, create
     #delete key if delKey=True
+    import hashlib, pickle
 
     dTable = {}
     found=False
@@ -134,7 +150,7 @@ def get_int(prompt):
     return a
 
 def FieldVal(dic, fieldname):
-    #get field value from a dict list
+    #get field value from a dict list (or a site_cfg.SiteRecord.  use site.field attributes where possible)
     #return value for fieldname (returns as type defined in dict)
     val = ''
     fieldname = fieldname.upper()
@@ -144,6 +160,7 @@ def FieldVal(dic, fieldname):
 
 def getDes_pw(prompt = 'Password'):
     #ask for password and force to an 8-byte size, consistent with DES key requirements
+    import getpass
     pw=' '
     while len(pw) < 3 or (' ' in pw):
         pw = getpass.getpass(prompt+': ')
@@ -162,6 +179,7 @@ def getDes_pw(prompt = 'Password'):
 def decrypt_pw(pwkey):
     #validate password if pwkey isn't null
     if not len(pwkey): return
+    import pyDes
 
     #file encrypted... need password
     pw = getDes_pw()        #ask for password
@@ -174,26 +192,31 @@ def decrypt_pw(pwkey):
 
     return pws
 
+_acctFields = (1, 3, 4)     #encrypted AcctArray fields: account#, username, password
+
 def acctEncrypt(AcctArray, pwkey):
-    #encrypt accounts
+    #encrypt accounts.  all fields are encrypted in one pass
+    import pyDes
     k = pyDes.des(pwkey)
-    for acct in AcctArray:
-       acct[1] = k.encrypt(acct[1],' ')
-       acct[3] = k.encrypt(acct[3],' ')
-       acct[4] = k.encrypt(acct[4],' ')
+    fields = k.encrypt_many([acct[i] for acct in AcctArray for i in _acctFields], ' ')
+    for n, acct in enumerate(AcctArray):
+        for j, i in enumerate(_acctFields):
+            acct[i] = fields[n*3 + j]
     return AcctArray
 
 def acctDecrypt(AcctArray, pwkey):
-    #decrypt accounts
+    #decrypt accounts.  all fields are decrypted in one pass
+    import pyDes
     k = pyDes.des(pwkey)
-    for acct in AcctArray:
-       acct[1] = k.decrypt(acct[1],' ').decode('utf-8')
-       acct[3] = k.decrypt(acct[3],' ').decode('utf-8')
-       acct[4] = k.decrypt(acct[4],' ').decode('utf-8')
+    fields = k.decrypt_many([acct[i] for acct in AcctArray for i in _acctFields], ' ')
+    for n, acct in enumerate(AcctArray):
+        for j, i in enumerate(_acctFields):
+            acct[i] = fields[n*3 + j].decode('utf-8')
     return AcctArray
 
 def get_cfg():
     #read in user configuration
+    import pickle
 
     AcctArray = []        #AcctArray = [['SiteName', 'Account#', 'AcctType', 'UserName', 'PassWord'], ...]
     pwkey=''              #default = no encryption
@@ -214,8 +237,9 @@ def QuoteHTMwriter(qList):
     # Supports Yahoo! finance links
     # See quotes.py for qList structure
     global userdat
+    import site_cfg
     log = logging.getLogger('root')
-    userdat = site_cfg.site_cfg()
+    userdat = site_cfg.userdat()
 
     # CREATE FILE
     filename = xfrdir + "quotes.htm"
@@ -392,6 +416,64 @@ def OfxTag(tag,*contents):
     tag2 = '</' + tag + '>'
     return '\r\n'.join([tag1]+list(contents)+[tag2])
 
+class OfxStream:
+    """
+    Streaming OFX writer.  Aggregates and fields are written directly to f (file, StringIO, etc.)
+    as they're generated, so the document is never held in memory.
+
+        s = OfxStream(f)
+        s.header()
+        with s.aggregate('OFX'):
+            with s.aggregate('SIGNONMSGSRSV1'):
+                s.field('DTSERVER', dateTimeStr())
+                ...
+
+    field() skips empty values, and terminates elements for ofx 2.x, as OfxField() does.
+    Output matches OfxTag/OfxField, one tag per line.
+    """
+
+    def __init__(self, f, ofxver='102', newline='\r\n'):
+        self.f = f
+        self.ofxver = ofxver
+        self.newline = newline
+        self.stack = []     #open aggregates
+
+    def header(self):
+        self.f.write(OfxSGMLHeader())
+
+    def open(self, tag):
+        self.f.write('<' + tag + '>' + self.newline)
+        self.stack.append(tag)
+
+    def close(self, tag=None):
+        #close the innermost aggregate.  tag (optional) must match it
+        top = self.stack.pop()
+        if tag and tag != top:
+            raise ValueError('OfxStream: closing <%s>, but <%s> is open' % (tag, top))
+        self.f.write('</' + top + '>' + self.newline)
+
+    def end(self):
+        #close all open aggregates
+        while self.stack: self.close()
+
+    @contextlib.contextmanager
+    def aggregate(self, tag):
+        self.open(tag)
+        yield self
+        self.close(tag)
+
+    def field(self, tag, value):
+        field = OfxField(tag, value, self.ofxver)
+        if field: self.f.write(field + self.newline)
+
+    def fields(self, *pairs):
+        #write several fields: fields(('CODE', '0'), ('SEVERITY', 'INFO'))
+        for tag, value in pairs: self.field(tag, value)
+
+    def raw(self, text):
+        #write pre-formatted ofx text (e.g., aggregates copied from another statement)
+        if text: self.f.write(text if text.endswith('\n') else text + self.newline)
+
 def dateTimeStr(utc=False, tz=False):
     if utc:
         #return time at GMT
@@ -405,6 +487,7 @@ def ofxUUID():
 
 def validOFX(content):
     #does content appear to be a valid ofx statement?  returns message indicating reason (null if valid)
+    if isinstance(content, MappedFile): return _validOFXbytes(content.buf)
     msg=''
     content = content.upper().rstrip()
 
@@ -426,6 +509,151 @@ def validOFX(content):
 
     return msg
 
+#bytes-level validOFX() tests, searched in place (no upper-case copy of the buffer)
+_vEmpty   = re.compile(rb'\s*\Z')
+_vOFX     = re.compile(rb'OFXHEADER:|<OFX>|</OFX>', re.IGNORECASE)
+_vError   = re.compile(rb'<SEVERITY>ERROR', re.IGNORECASE)
+_vDenied  = re.compile(rb'ACCESSDENIED', re.IGNORECASE)
+_vInvpos  = re.compile(rb'<INVPOS>', re.IGNORECASE)
+_vSeclist = re.compile(rb'<SECLIST>', re.IGNORECASE)
+
+def _validOFXbytes(buf):
+    #validOFX() for a bytes buffer
+    msg=''
+    if _vEmpty.match(buf): msg = 'Null statement received'
+
+    elif not _vOFX.search(buf): msg = 'Invalid OFX statement detected'
+
+    elif _vError.search(buf): msg = 'OFX message contains ERROR condition'
+
+    elif _vDenied.search(buf): msg = 'Access denied'
+
+    if _vInvpos.search(buf) and not _vSeclist.search(buf):
+        msg = "OFX statement contains <INVPOS> record but missing required <SECLIST> section"
+
+    return msg
+
+_bytesPatterns = {}
+
+def bytesPattern(p):
+    #bytes version of compiled str regex p (cached)
+    pb = _bytesPatterns.get(p)
+    if pb is None:
+        pb = re.compile(p.pattern.encode('latin-1'), p.flags & ~re.UNICODE)
+        _bytesPatterns[p] = pb
+    return pb
+
+class _ByteMatch:
+    #presents a bytes regex match as str, so str-based re.sub() functions can be used on bytes
+    #latin-1 maps each byte to one char, so the text round-trips exactly
+    __slots__ = ('m',)
+
+    def __init__(self, m):
+        self.m = m
+
+    def group(self, i=0):
+        g = self.m.group(i)
+        return None if g is None else g.decode('latin-1')
+
+    def groups(self):
+        return tuple(None if g is None else g.decode('latin-1') for g in self.m.groups())
+
+    def start(self, i=0): return self.m.start(i)
+    def end(self, i=0): return self.m.end(i)
+
+class MappedFile:
+    # Memory-mapped (read-only) view of a large text file, processed as bytes.
+    # search() and sub() take the same compiled str regexes used for text, and sub() streams
+    # the result to a new work file that becomes the current buffer.  No whole-file str copies
+    # are created, so memory use doesn't depend on the file size.  save() replaces the original
+    # file with the final result.
+    def __init__(self, filename):
+        self.filename = filename
+        self.current = filename
+        self._work = [filename + '.tmp1', filename + '.tmp2']
+        self._open(filename)
+
+    def _open(self, name):
+        self._file = open(name, 'rb')
+        self.buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _unmap(self):
+        if self.buf is not None:
+            self.buf.close()
+            self._file.close()
+            self.buf = None
+
+    def __getitem__(self, i):
+        #slices are returned as str (e.g., content[:200])
+        return self.buf[i].decode('latin-1')
+
+    def __len__(self):
+        return len(self.buf)
+
+    def find(self, s):
+        return self.buf.find(s.encode('latin-1'))
+
+    def search(self, p):
+        m = bytesPattern(p).search(self.buf)
+        return _ByteMatch(m) if m else None
+
+    def findall(self, p):
+        return [_ByteMatch(m).group() for m in bytesPattern(p).finditer(self.buf)]
+
+    def sub(self, p, repl):
+        #p.sub(repl), where repl is a template string or function(match) returning str or None
+        #returns the number of substitutions.  The buffer isn't rewritten if nothing matches.
+        pb = bytesPattern(p)
+        if not pb.search(self.buf): return 0
+        if not callable(repl): repl = repl.encode('latin-1')
+        out = self._work[1] if self.current == self._work[0] else self._work[0]
+        n, pos = 0, 0
+        view = memoryview(self.buf)
+        try:
+            with open(out, 'wb') as f:
+                for m in pb.finditer(self.buf):
+                    f.write(view[pos:m.start()])
+                    if callable(repl):
+                        f.write((repl(_ByteMatch(m)) or '').encode('latin-1'))
+                    else:
+                        f.write(m.expand(repl))
+                    pos = m.end()
+                    n += 1
+                f.write(view[pos:])
+        finally:
+            view.release()
+        self._unmap()
+        self.current = out
+        self._open(out)
+        return n
+
+    def text(self):
+        #save and return the whole file as str (for routines that require one)
+        self.save()
+        with open(self.filename) as f:
+            return f.read()
+
+    def close(self):
+        #close without saving
+        self._unmap()
+        for name in self._work:
+            if os.path.exists(name): os.remove(name)
+
+    def save(self):
+        #replace the original file with the processed version, and close
+        self._unmap()
+        if self.current != self.filename:
+            os.replace(self.current, self.filename)
+            self.current = self.filename
+        self.close()
+
+def useMappedFile(filename):
+    #True if filename is large enough to process as a MappedFile (see mmapFileLimit in control2.py)
+    try:
+        return os.path.getsize(filename) > mmapFileLimit * 1024**2
+    except OSError:
+        return False
+
 def int2(str):
     #convert str to int, without throwing exception.  If str is not a "number", returns zero.
     try:
@@ -457,25 +685,16 @@ def copy_txt_file(infile, outfile):
 
 def combineOfx(ofxList):
     #combine ofx statements into a single file in a manner that Money seems to accept
-
-    dtnow = dateTimeStr()
-    signon =  "\n".join([
-              "<SIGNONMSGSRSV1><SONRS>",
-              "<STATUS><CODE>0<SEVERITY>INFO<MESSAGE>Successful Sign On</STATUS>",
-              "<DTSERVER>" + dtnow,
-              "<LANGUAGE>ENG<DTPROFUP>20010101010000",
-              "<FI><ORG>PocketSense</FI></SONRS></SIGNONMSGSRSV1>"])
+    #statements are copied to a spool file per section as each file is read, and the sections are
+    #then streamed to the combined file.  only one input file is held in memory at a time
+    import tempfile
 
     #these regexes capture everything between the tags, but not the tags
-    bRe = re.compile('(?:<BANKMSGSRSV1>)(.*?)(?:</BANKMSGSRSV1>)', re.IGNORECASE)
-    cRe = re.compile('(?:<CREDITCARDMSGSRSV1>)(.*?)(?:</CREDITCARDMSGSRSV1>)', re.IGNORECASE)
-    iRe = re.compile('(?:<INVSTMTMSGSRSV1>)(.*?)(?:</INVSTMTMSGSRSV1>)', re.IGNORECASE)
-    sRe = re.compile('(?:<SECLIST>)(.*?)(?:</SECLIST>)', re.IGNORECASE)
-
-    bantrn=''
-    crdtrn=''
-    invtrn=''
-    sectrn=''
+    sections = [('BANKMSGSRSV1',       re.compile('(?:<BANKMSGSRSV1>)(.*?)(?:</BANKMSGSRSV1>)', re.IGNORECASE)),
+                ('CREDITCARDMSGSRSV1', re.compile('(?:<CREDITCARDMSGSRSV1>)(.*?)(?:</CREDITCARDMSGSRSV1>)', re.IGNORECASE)),
+                ('INVSTMTMSGSRSV1',    re.compile('(?:<INVSTMTMSGSRSV1>)(.*?)(?:</INVSTMTMSGSRSV1>)', re.IGNORECASE)),
+                ('SECLIST',            re.compile('(?:<SECLIST>)(.*?)(?:</SECLIST>)', re.IGNORECASE))]
+    spool = [tempfile.SpooledTemporaryFile(max_size=1<<20, mode='w+') for s in sections]
 
     for file in ofxList:
         if glob.glob(file[2]):
@@ -486,37 +705,32 @@ def combineOfx(ofxList):
             ofx = ofx.replace(chr(13),'')   #remove CRs
             ofx = ofx.replace(chr(10),'')   #remove LFs
 
-            #create a string for each section found in the file
-            #re.findall() returns a list of all matching sections
-            b = '\n'.join(bRe.findall(ofx))
-            c = '\n'.join(cRe.findall(ofx))
-            i = '\n'.join(iRe.findall(ofx))
-            s = '\n'.join(sRe.findall(ofx))
-
             #add statements to each section
-            if b: bantrn = bantrn + '\n' + b
-            if c: crdtrn = crdtrn + '\n' + c
-            if i: invtrn = invtrn + '\n' + i
-            if s: sectrn = sectrn + '\n' + s
-
-    if bantrn: bantrn = OfxTag('BANKMSGSRSV1', bantrn)
-    if crdtrn: crdtrn = OfxTag('CREDITCARDMSGSRSV1', crdtrn)
-    if invtrn: invtrn = OfxTag('INVSTMTMSGSRSV1', invtrn)
-    if sectrn: sectrn = OfxTag('SECLISTMSGSRSV1', OfxTag('SECLIST', sectrn))
-
-    combOfx = '\n'.join(['<OFX>', signon, bantrn, crdtrn, invtrn, sectrn, '</OFX>'])
-
-    #remove blank lines (not required... just to clean it up)
-    combOfx2=''
-    for line in combOfx.splitlines():
-        if line: combOfx2 = combOfx2 + line + '\n'
-
-    combOfx = OfxSGMLHeader() + combOfx2
+            for (tag, sRe), sp in zip(sections, spool):
+                for stmt in sRe.findall(ofx):
+                    if stmt: sp.write(stmt + '\n')
 
     #there should never be two combined*.ofx files here, but we'll use a unique name just in case
     cfile = xfrdir + 'combined' + str(random.randrange(1e5,1e6)) + '.ofx'
-    f=open(cfile,'w')
-    f.write(combOfx)
-    f.close()
+    with open(cfile,'w') as f:
+        s = OfxStream(f, newline='\n')
+        s.header()
+        with s.aggregate('OFX'):
+            with s.aggregate('SIGNONMSGSRSV1'), s.aggregate('SONRS'):
+                with s.aggregate('STATUS'):
+                    s.fields(('CODE', '0'), ('SEVERITY', 'INFO'), ('MESSAGE', 'Successful Sign On'))
+                s.fields(('DTSERVER', dateTimeStr()), ('LANGUAGE', 'ENG'), ('DTPROFUP', '20010101010000'))
+                with s.aggregate('FI'):
+                    s.field('ORG', 'PocketSense')
+
+            for (tag, sRe), sp in zip(sections, spool):
+                if not sp.tell(): continue
+                sp.seek(0)
+                if tag == 'SECLIST': s.open('SECLISTMSGSRSV1')
+                with s.aggregate(tag):
+                    for line in sp: s.raw(line)
+                if tag == 'SECLIST': s.close('SECLISTMSGSRSV1')
+
+    for sp in spool: sp.close()
     print('Combined OFX created: %s' % cfile)
     return cfile
@@ -67,6 +67,11 @@
 #  - open ofx file w/ 'U' qualifier.  Forces newlines to match Windows convention (e.g., \n = <CR><LF>)
 #19Jun2023*rlc
 #   - add logging
+#19Oct2026
+#   - large files are scrubbed as memory-mapped bytes (see MappedFile in rlib1 and mmapFileLimit in control2)
+#   - regex patterns compiled once, at import
+#   - use the process-wide site_cfg.userdat()
+#   - read site fields as SiteRecord attributes
 
 import os, sys, re, glob, logging
 import site_cfg
@@ -76,23 +81,59 @@ from rlib1 import *
 
 log = logging.getLogger('root')
 
-userdat = site_cfg.site_cfg()
 stat = False    #global used between re lambda subs to track status
 
+#scrub routines work on a str, or on a MappedFile for large statements.  Use these helpers
+#rather than calling str or regex methods directly.
+def _sub(p, repl, ofx):
+    if isinstance(ofx, MappedFile):
+        ofx.sub(p, repl)
+        return ofx
+    return p.sub(repl, ofx)
+
+def _subn(p, repl, ofx):
+    if isinstance(ofx, MappedFile):
+        return ofx, ofx.sub(p, repl)
+    return p.subn(repl, ofx)
+
+def _search(p, ofx):
+    return ofx.search(p) if isinstance(ofx, MappedFile) else p.search(ofx)
+
+def _findall(p, ofx):
+    return ofx.findall(p) if isinstance(ofx, MappedFile) else p.findall(ofx)
+
+_invstmtRe     = re.compile(r'<INVSTMTTRNRS>', re.IGNORECASE)
+_timeRe        = re.compile(r'(<DT.+?>)([^<\s]+)', re.IGNORECASE)
+_dtstartRe     = re.compile(r'(<DTSTART>[^<\s]+)', re.IGNORECASE)
+_shiftTimeRe   = re.compile(r'(<DTASOF>)([^<\s]+)', re.IGNORECASE | re.DOTALL)
+_invSignRe     = re.compile(r'(<INVBUY>|<INVSELL>)(.+?<UNITS>)(.+?)(<.+?<TOTAL>)([^<]+)', re.IGNORECASE | re.DOTALL)
+_reinvSignRe   = re.compile(r'(<REINVEST>)(.+?<TOTAL>)(.+?)(<.+?<UNITS>)([^<]+)', re.IGNORECASE | re.DOTALL)
+_uTags         = ['CORRECTACTION', 'CORRECTFITID', 'REFNUM', 'SIC']   #tags that Money doesn't support
+_uTagRes       = [(tag, re.compile(r'<'+tag+'>[^<]*', re.IGNORECASE), re.compile(r'</'+tag+'>',re.IGNORECASE))
+                  for tag in _uTags]
+_ampRe         = re.compile(r'&(?!#?\w+;)')
+_trntypeRe     = re.compile(r'(<TRNTYPE>)(.*?)([<\s])', re.IGNORECASE)
+_zeroTransRe   = re.compile(r'(<STMTTRN>.*?<TRNAMT>)(.+?)(<.*?</STMTTRN>)', re.DOTALL | re.IGNORECASE)
+_headerRe      = re.compile(r'(^[^<:\n]+:)(\s)([^\n]+)', re.MULTILINE)
+
 def scrubPrint(line):
-    if not userdat.quietScrub:
+    if not site_cfg.userdat().quietScrub:
         log.info("+ %s" % line)
 
 def scrub(filename, site):
     #filename = string
-    #site = DICT structure containing full site info from sites.dat
-
-    siteURL = FieldVal(site, 'url').upper()
-    dtHrs = FieldVal(site, 'timeOffset')
-    accType = FieldVal(site, 'CAPS')[1]
-    site_skip_zt = FieldVal(site, 'skipzerotrans')
-    with open(filename,'r') as f:
-        ofx = f.read()  #as-found ofx message
+    #site = site_cfg.SiteRecord containing full site info from sites.dat
+
+    siteURL = site.url.upper()
+    dtHrs = site.timeoffset
+    accType = site.caps[1]
+    site_skip_zt = site.skipzerotrans
+    userdat = site_cfg.userdat()
+    if useMappedFile(filename):
+        ofx = MappedFile(filename)      #large file: scrub as memory-mapped bytes
+    else:
+        with open(filename,'r') as f:
+            ofx = f.read()  #as-found ofx message
 
     ofx = _scrubHeader(ofx) #Remove illegal spaces in OFX header lines
 
@@ -103,7 +144,7 @@ def scrub(filename, site):
     ofx= _scrubDTSTART(ofx)  #fix missing <DTEND> fields
 
     #fix malformed investment buy/sell/reinvest signs (neg vs pos), if they exist
-    if "<INVSTMTTRNRS>" in ofx.upper():
+    if _search(_invstmtRe, ofx):
         ofx= _scrubINVsign(ofx)
         ofx= _scrubREINVESTsign(ofx)
 
@@ -116,7 +157,10 @@ def scrub(filename, site):
 
     #run custom srub routines
     #any scrub_*.py file found in the current folder will be processed
-    for scrubFile in glob.glob('scrub_*.py'):
+    scrubFiles = glob.glob('scrub_*.py')
+    if scrubFiles and isinstance(ofx, MappedFile):
+        ofx = ofx.text()    #custom routines require a str
+    for scrubFile in scrubFiles:
         scrublet = scrubFile.strip('.py')
         try:
             s = __import__(scrublet)
@@ -129,8 +173,11 @@ def scrub(filename, site):
             log.exception('An error occurred when processing scrub module: %s' % scrublet)
 
     #write the new version to the same file
-    with open(filename, 'w') as f:
-        f.write(ofx)
+    if isinstance(ofx, MappedFile):
+        ofx.save()
+    else:
+        with open(filename, 'w') as f:
+            f.write(ofx)
 
 #--------------------------------
 def _scrubTime(ofx):
@@ -138,12 +185,11 @@ def _scrubTime(ofx):
 
     #regex p captures everything from <DT*> up to the next <tag>, but excludes the next "<".
     #p produces 2 results:  group(1) = <DT*> field, group(2)=dateval
-    p = re.compile(r'(<DT.+?>)([^<\s]+)', re.IGNORECASE)
     #call date correct function (inline lamda, takes regex result = r tuple)
 
     global stat
     stat = False
-    ofx_final = p.sub(lambda r: _scrubTime_r1(r), ofx)
+    ofx_final = _sub(_timeRe, lambda r: _scrubTime_r1(r), ofx)
     if stat: scrubPrint("Scrubber: Null time values updated.")
 
     return ofx_final
@@ -178,11 +224,10 @@ def _scrubDTSTART(ofx):
         #we have a dtstart, but no dtend... fix it.
         scrubPrint("Scrubber: Fixing missing <DTEND> field")
 
-        #regex p captures everything from <DTSTART> up to the next <tag> or white space into group(1)
-        p = re.compile(r'(<DTSTART>[^<\s]+)', re.IGNORECASE)
-        if Debug: log.debug('DTSTART: findall()=%s' % p.findall(ofx_final))
+        #regex captures everything from <DTSTART> up to the next <tag> or white space into group(1)
+        if Debug: log.debug('DTSTART: findall()=%s' % _findall(_dtstartRe, ofx_final))
         #replace group1 with (group1 + <DTEND> + datetime)
-        ofx_final = p.sub(r'\1<DTEND>'+nowstr, ofx_final)
+        ofx_final = _sub(_dtstartRe, r'\1<DTEND>'+nowstr, ofx_final)
 
     return ofx_final
 
@@ -192,12 +237,11 @@ def _scrubShiftTime(ofx, h):
 
     #regex p captures everything from <DTASOF> up to the next <tag> or white-space.
     #p produces 2 results:  group(1) = <DTASOF> field, group(2)=dateval
-    p = re.compile(r'(<DTASOF>)([^<\s]+)', re.IGNORECASE | re.DOTALL)
-
     #call date correct function (inline lamda, takes regex result = r tuple)
-    if p.search(ofx):
+    ofx_final = ofx
+    if _search(_shiftTimeRe, ofx):
         scrubPrint("Scrubber: Shifting DTASOF time values " + str(h) + " hours.")
-        ofx_final = p.sub(lambda r: _scrubShiftTime_r1(r,h), ofx)
+        ofx_final = _sub(_shiftTimeRe, lambda r: _scrubShiftTime_r1(r,h), ofx)
 
     return ofx_final
 
@@ -247,8 +291,7 @@ def _scrubINVsign(ofx):
 
     global stat
     stat = False
-    p = re.compile(r'(<INVBUY>|<INVSELL>)(.+?<UNITS>)(.+?)(<.+?<TOTAL>)([^<]+)', re.IGNORECASE | re.DOTALL)
-    ofx_final=p.sub(lambda r: _scrubINVsign_r1(r), ofx)
+    ofx_final=_sub(_invSignRe, lambda r: _scrubINVsign_r1(r), ofx)
     if stat:
         scrubPrint("Scrubber: Invalid investment sign (pos/neg) found.  Corrected.")
 
@@ -286,8 +329,7 @@ def _scrubREINVESTsign(ofx):
 
     global stat
     stat=False
-    p = re.compile(r'(<REINVEST>)(.+?<TOTAL>)(.+?)(<.+?<UNITS>)([^<]+)', re.IGNORECASE | re.DOTALL)
-    ofx_final=p.sub(lambda r: _scrubREINVESTsign_r1(r), ofx)
+    ofx_final=_sub(_reinvSignRe, lambda r: _scrubREINVESTsign_r1(r), ofx)
     if stat:
         scrubPrint("  +Scrubber: Invalid reinvestment sign (pos/neg) found.  Corrected.")
 
@@ -317,38 +359,28 @@ def _scrubGeneral(ofx):
     #1. Remove tag/value pairs that Money doesn't support
     #define unsupported tags that we've had trouble with
     global stat
-    uTags = []
-    uTags.append('CORRECTACTION')
-    uTags.append('CORRECTFITID')
-    uTags.append('REFNUM')
-    uTags.append('SIC')
-
-    for tag in uTags:
+    for tag, p1, p2 in _uTagRes:
         # Remove open tag and value
-        p = re.compile(r'<'+tag+'>[^<]*', re.IGNORECASE)
-        if p.search(ofx):
-            ofx = p.sub('',ofx)
+        if _search(p1, ofx):
+            ofx = _sub(p1, '', ofx)
             scrubPrint("Scrubber: <"+tag+"> tags removed.  Not supported by Money.")
         # Remove close tag (if any) [could probably create a very smart RE to merge these two REs]
-        p = re.compile(r'</'+tag+'>',re.IGNORECASE)
-        if p.search(ofx):
-            ofx = p.sub('',ofx)
+        if _search(p2, ofx):
+            ofx = _sub(p2, '', ofx)
             scrubPrint("Scrubber: </"+tag+"> closing tags removed.")
 
     #2. Replace ampersands '&' that aren't part of a valid escape code (i.e., is NOT like &amp;, &#012; etc)
     #   literally:  replace '&' chars with '&amp;' when the next chars are not
     #               a '#' or valid alphanumerics followed by a ;
-    p = re.compile(r'&(?!#?\w+;)')
-    if p.search(ofx):
+    if _search(_ampRe, ofx):
         scrubPrint("Scrubber: Replace invalid '&' chars with '&amp;'")
-        ofx = p.sub('&amp;',ofx)
+        ofx = _sub(_ampRe, '&amp;', ofx)
 
     #3. Replace null or missing <TRNTYPE> with 'OTHER'
     #   regex captures <TRNTYPE>, value, and first '<' or white space char
-    p = re.compile(r'(<TRNTYPE>)(.*?)([<\s])', re.IGNORECASE)
-    if p.search(ofx):
+    if _search(_trntypeRe, ofx):
         stat=False
-        ofx = p.sub(lambda r: _scrubGeneral_r1(r), ofx)
+        ofx = _sub(_trntypeRe, lambda r: _scrubGeneral_r1(r), ofx)
         if stat: scrubPrint("Null or missing TRNTYPE replaced with 'OTHER' ")
     return ofx
 
@@ -369,9 +401,7 @@ def _scrubRemoveZeroTrans(ofx):
 
     global stat
     stat=False
-    p = re.compile(r'(<STMTTRN>.*?<TRNAMT>)(.+?)(<.*?</STMTTRN>)', re.DOTALL | re.IGNORECASE)
-
-    ofx = p.sub(lambda r: _scrubRemoveZeroTrans_r1(r), ofx)
+    ofx = _sub(_zeroTransRe, lambda r: _scrubRemoveZeroTrans_r1(r), ofx)
     if stat: scrubPrint('Zero amount ($0.00) transactions removed.')
     return ofx
 
@@ -385,10 +415,9 @@ def _scrubRemoveZeroTrans_r1(r):
 def _scrubHeader(ofx):
     # Look for header lines that have space after the colon.
     #(we look based on format, in theory the RE could find them in the wrong place)
-    p = re.compile(r'(^[^<:\n]+:)(\s)([^\n]+)', re.MULTILINE)
-    if p.search(ofx):
+    if _search(_headerRe, ofx):
         # Remove the space
-        result = p.subn(r'\1\3',ofx)
+        result = _subn(_headerRe, r'\1\3',ofx)
         ofx = result[0]
         scrubPrint("Scrubber: Removed spaces in " + str(result[1]) + " header lines.")
     return ofx
@@ -52,11 +52,190 @@
 #   -change YahooURL for new v10 service
 # 17Jul2023*rlc
 #   -remove reference to google finance.  not supported
-
-import os, glob, re, random
+# 19Oct2026
+#   -add Warehouse and WarehouseFile options
+#   -parse sites.dat in a single pass (sites, stocks, funds and global options)
+#   -add userdat():  process-wide site_cfg, re-read only when sites.dat changes
+#   -save parsed sites.dat to a compiled cache file (sites.cache), rebuilt when sites.dat changes
+#   -store sites as immutable SiteRecord objects (typed fields, pre-parsed url host/path, ofxver as int)
+#   -add YahooBatchURL and QuoteBatchSize options (multi-symbol quote requests)
+#   -add QuoteCacheTTL and QuoteMarketHours options (quote cache)
+#   -add QuoteHistoryFile option (quotehist.py)
+#   -add YahooChartURL option (backfill.py)
+#   -add QuoteProviders, QuoteFile, QuoteHedgeDelay and QuoteTimeout options (quote providers)
+#   -add c:currency stock/fund option and FxCacheTTL (currency conversion)
+#   -add <schedule> section (getdatad.py)
+#   -validate site OFXVER.  an unknown version is logged and the default (102) is used
+#   -SiteRecord item access (site['OFXVER'], FieldVal) returns ofxver as a string and caps as a list,
+#    as before SiteRecord.  site.ofxver and site.caps are typed
+
+import os, glob, re, random, io, hashlib, marshal, urllib.parse, logging
 from rlib1 import *
 from control2 import *
 
+log = logging.getLogger('root')
+
+_datfile = 'sites.dat'
+_cachefile = 'sites.cache'
+_parserVersion = 10     #increment when parse() output changes, to invalidate existing cache files
+
+def _yes(value):
+    return value[:1].upper() == 'Y'
+
+def _yesNo(value):
+    #site options: True for Yes, False for No, None (use global setting) if not given
+    return True if 'Y' in value else False if 'N' in value else None
+
+_ofxVersions = (102, 103, 151, 160, 200, 201, 202, 203, 210, 211, 220)
+
+def _ofxVer(value):
+    #site OFXVER: one of the OFX versions (e.g., 102).  ValueError if it isn't
+    ver = int(value)
+    if ver not in _ofxVersions: raise ValueError(value)
+    return ver
+
+def _list(value):
+    #comma separated list (lower case)
+    return [v.strip().lower() for v in value.split(',') if v.strip()]
+
+#global options:  FIELDNAME: (site_cfg attribute, value conversion)
+_globalOpts = {
+    'DEFAULTINTERVAL':      ('defaultInterval', int2),
+    'PROMPTINTERVAL':       ('promptInterval', _yes),
+    'SAVETICKERSFIRST':     ('savetickersfirst', _yes),
+    'SAVEQUOTEHISTORY':     ('savequotehistory', _yes),
+    'SHOWQUOTEHTM':         ('showquotehtm', _yes),
+    'ASKQUOTEHTM':          ('askquotehtm', _yes),
+    'ENABLEYAHOOFINANCE':   ('enableYahooFinance', _yes),
+    'YAHOOURL':             ('YahooURL', str),
+    'YAHOOBATCHURL':        ('YahooBatchURL', str),
+    'YAHOOCHARTURL':        ('YahooChartURL', str),
+    'QUOTEBATCHSIZE':       ('quoteBatchSize', int2),
+    'QUOTECACHETTL':        ('quoteCacheTTL', int2),
+    'QUOTEMARKETHOURS':     ('quoteMarketHours', str),
+    'YAHOOTIMEZONE':        ('YahooTimeZone', str),
+    'GOOGLEURL':            ('GoogleURL', str),
+    'QUOTECURRENCY':        ('quotecurrency', str),
+    'COMBINEOFX':           ('combineofx', _yes),
+    'QUIETSCRUB':           ('quietScrub', _yes),
+    'FORCEQUOTES':          ('forceQuotes', _yes),
+    'QUOTEACCOUNT':         ('quoteAccount', str),
+    'SKIPZEROTRANSACTIONS': ('skipZeroTransactions', _yes),
+    'SKIPFAILEDLOGON':      ('skipFailedLogon', _yes),
+    'PROMPTSTART':          ('promptStart', _yes),
+    'PROMPTEND':            ('promptEnd', _yes),
+    'WAREHOUSE':            ('warehouse', _yes),
+    'WAREHOUSEFILE':        ('warehouseFile', str),
+    'QUOTEHISTORYFILE':     ('quoteHistoryFile', str),
+    'QUOTEPROVIDERS':       ('quoteProviders', _list),
+    'QUOTEFILE':            ('quoteFile', str),
+    'QUOTEHEDGEDELAY':      ('quoteHedgeDelay', float2),
+    'QUOTETIMEOUT':         ('quoteTimeout', float2),
+    'FXCACHETTL':           ('fxCacheTTL', int2),
+    }
+
+#site fields:  FIELDNAME: value conversion
+_siteFields = {
+    'SITENAME':      str.upper,
+    'ACCTTYPE':      str.upper,
+    'FIORG':         str,
+    'FID':           str,
+    'URL':           str,
+    'BANKID':        str,
+    'BROKERID':      str,
+    'OFXVER':        _ofxVer,
+    'APPID':         str,
+    'APPVER':        str,
+    'MININTERVAL':   int,
+    'TIMEOFFSET':    float,
+    'DELAY':         float,
+    'SKIPZEROTRANS': _yesNo,
+    'DTACCTUP':      str,
+    'USERAGENT':     str,
+    'CLIENTUID':     str,
+    }
+
+_siteDefaults = {'SITENAME': '', 'ACCTTYPE': '', 'FIORG': '', 'URL': '', 'FID': '', 'BANKID': '', 'BROKERID': '',
+                 'OFXVER': 102, 'MININTERVAL': 0, 'TIMEOFFSET': 0.0, 'DELAY': 0.0,
+                 'SKIPZEROTRANS': None, 'DTACCTUP': None, 'USERAGENT': None, 'CLIENTUID': None}
+
+_tickerRe = re.compile("(.+?) ")         #ticker symbol is first option
+_multRe   = re.compile(" M:(.+?) ")      #multiplier option
+_symbolRe = re.compile(" S:(.+?) ")      #symbol to pass to Money (optional)
+_currRe   = re.compile(" C:(.+?) ")      #currency of the quote (optional)
+
+_userdat = None
+_userdatKey = None
+
+class SiteRecord:
+    """immutable site entry from sites.dat, with typed fields"""
+
+    #site fields are attributes: site.url, site.caps, site.ofxver, ...
+    #site['URL'], 'URL' in site and FieldVal(site, 'url') still work (field names aren't case sensitive).
+    #item access returns the types sites were stored with before SiteRecord (e.g., user scrub_*.py modules):
+    #ofxver as a string ('102') and caps as a list
+    __slots__ = ('caps', 'fiorg', 'fid', 'url', 'host', 'path', 'bankid', 'brokerid', 'ofxver', 'appid', 'appver',
+                 'mininterval', 'timeoffset', 'delay', 'skipzerotrans', 'dtacctup', 'useragent', 'clientuid')
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            object.__setattr__(self, name, fields[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError('SiteRecord is read-only')
+
+    def __delattr__(self, name):
+        raise AttributeError('SiteRecord is read-only')
+
+    def __getitem__(self, field):
+        name = field.lower()
+        if name not in _siteSlots: raise KeyError(field)
+        value = getattr(self, name)
+        return _itemTypes[name](value) if name in _itemTypes else value
+
+    def __contains__(self, field):
+        return field.lower() in _siteSlots
+
+    def __eq__(self, other):
+        return isinstance(other, SiteRecord) and self.asdict() == other.asdict()
+
+    def __repr__(self):
+        return 'SiteRecord(%s)' % ', '.join('%s=%r' % (f, getattr(self, f)) for f in self.__slots__)
+
+    def get(self, field, default=None):
+        return self[field] if field in self else default
+
+    def keys(self):
+        return [f.upper() for f in self.__slots__]
+
+    def asdict(self):
+        return dict((f, getattr(self, f)) for f in self.__slots__)
+
+_siteSlots = frozenset(SiteRecord.__slots__)
+_itemTypes = {'ofxver': str, 'caps': list}
+
+def _siteRecord(fields):
+    #build a SiteRecord from the parsed sites.dat fields {FIELDNAME: value}
+    #the url is split once here, rather than for each OFXClient
+    url = urllib.parse.urlparse(fields['URL'])
+    rec = dict((f.lower(), v) for f, v in fields.items() if f != 'ACCTTYPE')
+    return SiteRecord(caps=('SIGNON', fields['ACCTTYPE']), host=url.netloc, path=url.path, **rec)
+
+def _datKey():
+    try:
+        st = os.stat(_datfile)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def userdat():
+    #process-wide site_cfg.  sites.dat is only parsed again if it changes (modified time or size)
+    global _userdat, _userdatKey
+    if _userdat is None or _datKey() != _userdatKey:
+        _userdat = site_cfg()
+        _userdatKey = _datKey()
+    return _userdat
+
 class site_cfg:
     """read-in site and ticker data from sites.dat and define the data structures used by ofx.py"""
 
@@ -67,20 +246,23 @@ class site_cfg:
     #******************************************************************************
     # NOTE:
     #   The parse routine separates the user site list into
-    #   a Python DICT format that looks like the following:
+    #   a Python DICT of SiteRecords that looks like the following:
     #       Sites = {
-    #               "UNIVERSAL_ATT": {
-    #                    "caps": [ "SIGNON", "CCSTMT" ],
-    #                   "fiorg": "Citigroup",
-    #                     "fid": "24909",
-    #                     "url": "https://secureofx2.bankhost.com/citi/cgi-forte/ofx_rt?servicename=ofx_rt&pagename=ofx",
-    #                     field: value,
-    #                            etc...
-    #               },
-    #               "site2": {...}
+    #               "UNIVERSAL_ATT": SiteRecord(
+    #                    caps = ( "SIGNON", "CCSTMT" ),
+    #                   fiorg = "Citigroup",
+    #                     fid = "24909",
+    #                     url = "https://secureofx2.bankhost.com/citi/cgi-forte/ofx_rt?servicename=ofx_rt&pagename=ofx",
+    #                    host = "secureofx2.bankhost.com",
+    #                  ofxver = 102,
+    #                   field = value,
+    #                           etc...
+    #               ),
+    #               "site2": SiteRecord(...)
     #               }
     #
     #   Stocks are parsed into a list named stocks[].  Funds go into funds[], although there is really no difference.
+    #   Schedule entries (getdatad.py) go into schedule[] as [target, cron expression].
     #******************************************************************************
 
     def __init__(self):
@@ -92,11 +274,22 @@ class site_cfg:
         self.sites = {}
         self.stocks= []
         self.funds = []
+        self.schedule = []      #[[target, cron expression], ...] from the <schedule> section
         self.defaultInterval = 7
         self.promptInterval=False
         self.YahooURL = 'https://query2.finance.yahoo.com/v10/finance/quoteSummary/{ticker}?modules=price'
+        self.YahooBatchURL = 'https://query2.finance.yahoo.com/v7/finance/quote?symbols={symbols}'
+        self.quoteBatchSize = 50
+        self.YahooChartURL = 'https://query2.finance.yahoo.com/v8/finance/chart/{ticker}?period1={period1}&period2={period2}&interval=1d'
+        self.quoteCacheTTL = 15
+        self.quoteMarketHours = '09:30-16:00'
+        self.quoteProviders = ['yahoo']
+        self.quoteFile = 'prices.csv'
+        self.quoteHedgeDelay = 2.0
+        self.quoteTimeout = 20.0
+        self.fxCacheTTL = 60
         self.GoogleURL = 'http://www.google.com/finance/quote'
-        self.datfile= 'sites.dat'
+        self.datfile= _datfile
         self.bakfile= 'sites.bak'
         self.tmplfile = 'sites.template'
         self.savetickersfirst = False
@@ -114,6 +307,9 @@ class site_cfg:
         self.skipFailedLogon = True
         self.promptStart = True
         self.promptEnd   = False
+        self.warehouse = False
+        self.warehouseFile = 'warehouse.db'
+        self.quoteHistoryFile = 'quotehist.db'
 
         if glob.glob(self.datfile) == []:
             if glob.glob(self.bakfile) != []:
@@ -127,220 +323,143 @@ class site_cfg:
             self.load_cfg()
 
     def load_cfg(self):
-        #read in sites.dat
-        self.load_sites()
-        self.load_stocks()
-        self.load_funds()
+        #read in sites.dat: sites, stocks, funds and global options are parsed in a single pass
+        #the parsed result is saved to a cache file, keyed by a hash of the sites.dat contents,
+        #the parser version and the control2.py defaults that are copied into site entries
+        with open(self.datfile, 'rb') as f:
+            data = f.read()
+        key = hashlib.sha1(data)
+        key.update(('|%d|%s|%s' % (_parserVersion, DefaultAppID, DefaultAppVer)).encode('utf-8'))
+        key = key.hexdigest()
+
+        if not self.load_cache(key):
+            self.parse(io.TextIOWrapper(io.BytesIO(data)))    #same decoding as open(datfile, 'r')
+            self.save_cache(key)
 
-    def load_sites(self):
-        f = open(self.datfile, 'r')
-        parsing = False
+        if self.askquotehtm: self.showquotehtm = False  #can't have both.  Asking overrides "always"
 
-        #find each <site> entry and read-in the parameters
-        for line in f:
+    def parse(self, lines):
+        #parse sites.dat lines.  section = SITE, STOCKS, FUNDS, SCHEDULE or None (global options)
+        section = None
+        site = None
+
+        for line in lines:
+            raw   = line.split('#')[0].strip()
             line  = self.clean_line(line)    #remove comments, spaces, tabs, newlines, etc
+            if not line: continue
             lineU = line.upper()
 
-            #reset parameters between sites
-            if not parsing:
-                sitename=''
-                accttype=''
-                fiorg=''
-                fid =''
-                url=''
-                bankid=''
-                brokerid=''
-                ofxver = '102'
-                appid  = DefaultAppID       #defined in control2.py
-                appver = DefaultAppVer
-                mininterval = 0
-                timeOffset = 0.0
-                delay = 0.0
-                dtacctup = None
-                skipzerotrans = None
-                useragent = None
-                clientuid = None
-
-            if '<SITE>' in lineU:
-                parsing = True
-
-            if '</SITE>' in lineU:
-                parsing = False    #end parsing site
-                if sitename != '' and url != '':
-                    X = {sitename: {
-                               'CAPS': ['SIGNON', accttype],
-                              'FIORG': fiorg,
-                                'URL': url,
-                                'FID': fid,
-                             'BANKID': bankid,
-                           'BROKERID': brokerid,
-                             'OFXVER': ofxver,
-                              'APPID': appid,
-                             'APPVER': appver,
-                        'MININTERVAL': mininterval,
-                         'TIMEOFFSET': timeOffset,
-                              'DELAY': delay,
-                      'SKIPZEROTRANS': skipzerotrans,
-                           'DTACCTUP': dtacctup,
-                          'USERAGENT': useragent,
-                          'CLIENTUID': clientuid}
-                        }
-                    self.sites.update(X)
-
-            #parse the site parameters for the current site
-            field = self.get_fieldname(line).upper()
-            value = self.get_paramval(line)
-
-            if value:
-                if parsing:
-                    if field == 'SITENAME': sitename = value.upper()
-                    elif field == 'ACCTTYPE': accttype = value.upper()
-                    elif field == 'FIORG': fiorg = value
-                    elif field == 'FID': fid = value
-                    elif field == 'URL': url = value
-                    elif field == 'BANKID': bankid = value
-                    elif field == 'BROKERID': brokerid = value
-                    elif field == 'OFXVER': ofxver = value
-                    elif field == 'APPID': appid = value
-                    elif field == 'APPVER': appver = value
-                    elif field == 'MININTERVAL': mininterval = int(value)
-                    elif field == 'TIMEOFFSET': timeOffset = float(value)
-                    elif field == 'DELAY': delay = float(value)
-                    elif field == 'SKIPZEROTRANS': skipzerotrans = True if 'Y' in value else False if 'N' in value else None
-                    elif field == 'DTACCTUP': dtacctup = value
-                    elif field == 'USERAGENT': useragent = value
-                    elif field == 'CLIENTUID': clientuid = value
-
+            if section == 'SCHEDULE':
+                if '</SCHEDULE>' in lineU:
+                    section = None
                 else:
-                    #look for individual parameters while we're NOT parsing site info
-                    if field == 'DEFAULTINTERVAL':
-                        self.defaultInterval = int2(value)
-
-                    if field == 'PROMPTINTERVAL':
-                        self.promptInterval = (value[:1].upper() == 'Y')
-
-                    if field == 'SAVETICKERSFIRST':
-                        self.savetickersfirst = (value[:1].upper() == 'Y')
-
-                    if field == 'SAVEQUOTEHISTORY':
-                        self.savequotehistory = (value[:1].upper() == 'Y')
-
-                    if field == 'SHOWQUOTEHTM':
-                        self.showquotehtm = (value[:1].upper() == 'Y')
-
-                    if field == 'ASKQUOTEHTM':
-                        self.askquotehtm = (value[:1].upper() == 'Y')
-
-                    if field == 'ENABLEYAHOOFINANCE':
-                        self.enableYahooFinance = (value[:1].upper() == 'Y')
-
-                    if field == 'YAHOOURL':
-                        self.YahooURL = value
-
-                    if field == 'YAHOOTIMEZONE':
-                        self.YahooTimeZone = value
-
-                    if field == 'GOOGLEURL':
-                        self.GoogleURL = value
-
-                    if field == 'QUOTECURRENCY':
-                        self.quotecurrency = value
-
-                    if field == 'COMBINEOFX':
-                        self.combineofx = (value[:1].upper() == 'Y')
-
-                    if field == 'QUIETSCRUB':
-                        self.quietScrub = (value[:1].upper() == 'Y')
-
-                    if field == 'FORCEQUOTES':
-                        self.forceQuotes = (value[:1].upper() == 'Y')
-
-                    if field == 'QUOTEACCOUNT':
-                        self.quoteAccount = value
-
-                    if field == 'SKIPZEROTRANSACTIONS':
-                        self.skipZeroTransactions = (value[:1].upper() == 'Y')
+                    entry = self.parseSchedule(raw)
+                    if entry: self.schedule.append(entry)
+                continue
 
-                    if field == 'SKIPFAILEDLOGON':
-                        self.skipFailedLogon = (value[:1].upper() == 'Y')
+            if '<SCHEDULE>' in lineU:
+                section = 'SCHEDULE'
+                continue
 
-                    if field == 'PROMPTSTART':
-                        self.promptStart = (value[:1].upper() == 'Y')
-
-                    if field == 'PROMPTEND':
-                        self.promptEnd = (value[:1].upper() == 'Y')
-
-           #end_for line
-
-        f.close()
-
-        if self.askquotehtm: self.showquotehtm = False  #can't have both.  Asking overrides "always"
-
-        return
-
-    def load_stocks(self):
-        f = open(self.datfile, 'r')
-        parsing = False
-
-        #find each stock entry and read-in the parameters
-        for line in f:
-            line = line.upper()
-            line = self.clean_line(line)
-
-            if '<STOCKS>' in line:
-                parsing = True
-
-            elif '</STOCKS>' in line:
-                parsing = False
-
-            elif parsing and len(line) > 0:
-                entry = self.parseTicker(line)
-                if entry['ticker'] != "err":
-                    self.stocks.append(entry)
-        #end_for
-
-        f.close()
-        return
-
-    def load_funds(self):
-        f = open(self.datfile, 'r')
-        parsing = False
-
-        #find each stock entry and read-in the parameters
-        for line in f:
-            line = line.upper()
-            line = self.clean_line(line)
-
-            if '<FUNDS>' in line:
-                parsing = True
-
-            elif '</FUNDS>' in line:
-                parsing = False
-
-            elif parsing and len(line) > 0:
-                entry = self.parseTicker(line)
-                if entry['ticker']  != "err":
-                    self.funds.append(entry)
-        #end_for
-
-        f.close()
-        return
+            if section == 'STOCKS' or section == 'FUNDS':
+                if '</' + section + '>' in lineU:
+                    section = None
+                else:
+                    entry = self.parseTicker(lineU)
+                    if entry['ticker'] != "err":
+                        (self.stocks if section == 'STOCKS' else self.funds).append(entry)
+                continue
+
+            if '<STOCKS>' in lineU:
+                section = 'STOCKS'
+                continue
+
+            if '<FUNDS>' in lineU:
+                section = 'FUNDS'
+                continue
+
+            if '<SITE>' in lineU and section != 'SITE':
+                #reset parameters between sites
+                section = 'SITE'
+                site = dict(_siteDefaults, APPID=DefaultAppID, APPVER=DefaultAppVer)  #defaults from control2.py
+
+            if '</SITE>' in lineU and section == 'SITE':
+                section = None    #end parsing site
+                sitename = site.pop('SITENAME')
+                if sitename != '' and site['URL'] != '':
+                    self.sites[sitename] = _siteRecord(site)
+                continue
+
+            #parse the field : value pair on the line
+            i = line.find(':')
+            if i < 0: continue
+            field = lineU[:i].strip()
+            value = line[i+1:].strip()
+            if not value: continue
+
+            if section == 'SITE':
+                if field in _siteFields:
+                    try:
+                        site[field] = _siteFields[field](value)
+                    except ValueError:
+                        log.warning('%s: invalid %s value (%s) for site %s.  Using %s.' %
+                                    (self.datfile, field, value, site['SITENAME'] or '?', _siteDefaults[field]))
+                        site[field] = _siteDefaults[field]
+            elif field in _globalOpts:
+                #individual parameters found while we're NOT parsing site info
+                attr, conv = _globalOpts[field]
+                setattr(self, attr, conv(value))
+
+    def load_cache(self, key):
+        #load parsed data from the cache file, if it matches key.  returns True if loaded
+        try:
+            with open(_cachefile, 'rb') as f:
+                cache = marshal.load(f)
+            if cache.get('key') != key: return False
+            self.sites  = dict((name, SiteRecord(**rec)) for name, rec in cache['sites'].items())
+            self.stocks = cache['stocks']
+            self.funds  = cache['funds']
+            self.schedule = cache['schedule']
+            for attr, value in cache['opts'].items():
+                setattr(self, attr, value)
+        except Exception:
+            return False
+        return True
+
+    def save_cache(self, key):
+        cache = {'key': key, 'sites': dict((name, site.asdict()) for name, site in self.sites.items()),
+                 'stocks': self.stocks, 'funds': self.funds, 'schedule': self.schedule,
+                 'opts': dict((attr, getattr(self, attr)) for attr, conv in _globalOpts.values())}
+        tmpfile = _cachefile + '.tmp'
+        try:
+            with open(tmpfile, 'wb') as f:
+                marshal.dump(cache, f)
+            os.replace(tmpfile, _cachefile)     #atomic: never leave a partial cache file
+        except Exception:
+            pass    #the cache is optional (e.g., read-only folder)
 
     def parseTicker(self, line):
-        t = re.compile("(.+?) ")         #ticker symbol is first option
-        m = re.compile(" M:(.+?) ")      #multiplier option
-        s = re.compile(" S:(.+?) ")      #symbol to pass to Money (optional)
         line += " "                      #pad a space onto the end for re.search
-        tr = t.search(line)
-        mr = m.search(line)
-        sr = s.search(line)
+        tr = _tickerRe.search(line)
+        mr = _multRe.search(line)
+        sr = _symbolRe.search(line)
+        cr = _currRe.search(line)
         if tr: ticker=tr.group(1)
         else: ticker = "err"
         if mr: multiplier=float2(mr.group(1))
         else: multiplier = 1.0
         if sr: symbol=sr.group(1)
         else: symbol = ticker
-        return {'ticker': ticker, 'm': multiplier, 's': symbol}
+        if cr: currency=cr.group(1)
+        else: currency = ''
+        return {'ticker': ticker, 'm': multiplier, 's': symbol, 'c': currency}
+
+    def parseSchedule(self, line):
+        #target (site name, site:account, quotes or default) followed by a 5 field cron expression.
+        #the raw line is used, since clean_line removes the commas in cron lists
+        fields = line.split()
+        if len(fields) < 6: return None
+        return [' '.join(fields[:-5]).upper(), ' '.join(fields[-5:])]
 
     def clean_line(self, line):
         #remove comments
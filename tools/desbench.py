@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+
+""" pyDes known-answer tests and benchmark
+
+Checks pyDes against published DES/3DES test vectors and against a reference
+bit-list implementation (the original pyDes engine), then measures key setup,
+ECB/CBC throughput (blocks/sec) and the acctEncrypt/acctDecrypt round trip.
+
+Results can be saved as a baseline (--save) and compared on later runs.
+"""
+
+import sys
+import os.path
+import time
+import json
+import random
+import argparse
+
+pkgdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, pkgdir)
+
+import pyDes
+import rlib1
+
+baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'desbench_baseline.json')
+
+# (key, plaintext, ciphertext) hex.  FIPS 81 / NBS SP 500-20 / SP 800-67 examples
+des_vectors = [
+    ('133457799BBCDFF1', '0123456789ABCDEF', '85E813540F0AB405'),
+    ('0E329232EA6D0D73', '8787878787878787', '0000000000000000'),
+    ('0123456789ABCDEF', '4E6F772069732074', '3FA40E8A984D4815'),
+    ('0101010101010101', '95F8A5E5DD31D900', '8000000000000000'),
+    ('0101010101010101', '0000000000000000', '8CA64DE9C1B123A7'),
+    ('8001010101010101', '0000000000000000', '95A8D72813DAA94D'),
+    ('7CA110454A1A6E57', '01A1D6D039776742', '690F5B0D9A26939B'),
+]
+
+tdes_vectors = [
+    ('0123456789ABCDEF23456789ABCDEF01456789ABCDEF0123',
+     b'The qufck brown fox jump'.hex(),
+     'A826FD8CE53B855FCCE21C8112256FE668D5C05DD9B6B900'),
+]
+
+# CBC example from FIPS 81: key, IV, plaintext, ciphertext
+cbc_vectors = [
+    ('0123456789ABCDEF', '1234567890ABCDEF',
+     b'Now is the time for all '.hex(),
+     'E5C7CDDE872BF27C43E934008C389C0F683788499A7C05F6'),
+]
+
+
+class RefDes:
+    """ Reference DES: the original pyDes bit-list engine (ECB/CBC, no padding) """
+
+    def __init__(self, key):
+        t = lambda name: getattr(pyDes.des, '_des__' + name)
+        self.ip, self.fp, self.e, self.p = t('ip'), t('fp'), t('expansion_table'), t('p')
+        self.sbox = t('sbox')
+        key = self.permute(t('pc1'), self.bits(key))
+        L, R = key[:28], key[28:]
+        self.Kn = []
+        for r in t('left_rotations'):
+            L = L[r:] + L[:r]
+            R = R[r:] + R[:r]
+            self.Kn.append(self.permute(t('pc2'), L + R))
+
+    @staticmethod
+    def bits(data):
+        return [(ch >> (7 - i)) & 1 for ch in data for i in range(8)]
+
+    @staticmethod
+    def unbits(bits):
+        return bytes(sum(bits[i + j] << (7 - j) for j in range(8)) for i in range(0, len(bits), 8))
+
+    @staticmethod
+    def permute(table, block):
+        return list(map(lambda x: block[x], table))
+
+    def block(self, block, decrypt=False):
+        block = self.permute(self.ip, block)
+        L, R = block[:32], block[32:]
+        for Kn in (self.Kn[::-1] if decrypt else self.Kn):
+            B = list(map(lambda x, y: x ^ y, self.permute(self.e, R), Kn))
+            Bn = []
+            for j in range(8):
+                b = B[6*j:6*j+6]
+                v = self.sbox[j][(((b[0] << 1) + b[5]) << 4) + (b[1] << 3) + (b[2] << 2) + (b[3] << 1) + b[4]]
+                Bn += [(v >> 3) & 1, (v >> 2) & 1, (v >> 1) & 1, v & 1]
+            L, R = R, list(map(lambda x, y: x ^ y, self.permute(self.p, Bn), L))
+        return self.permute(self.fp, R + L)
+
+
+class RefCipher:
+    """ Reference DES or EDE triple DES over whole messages """
+
+    def __init__(self, key, mode=pyDes.ECB, IV=None):
+        keys = [key[i:i+8] for i in range(0, len(key), 8)]
+        if len(keys) == 2:
+            keys.append(keys[0])
+        self.des = [RefDes(k) for k in keys]
+        self.mode = mode
+        self.iv = IV or (key[:8] if len(keys) == 3 else None)
+
+    def _block(self, bits, decrypt):
+        if len(self.des) == 1:
+            return self.des[0].block(bits, decrypt)
+        k1, k2, k3 = self.des
+        if decrypt:
+            return k1.block(k2.block(k3.block(bits, True)), True)
+        return k3.block(k2.block(k1.block(bits), True))
+
+    def crypt(self, data, decrypt=False):
+        xor = lambda a, b: list(map(lambda x, y: x ^ y, a, b))
+        iv = RefDes.bits(self.iv) if self.mode == pyDes.CBC else None
+        out = []
+        for i in range(0, len(data), 8):
+            block = RefDes.bits(data[i:i+8])
+            if iv is None:
+                out.append(self._block(block, decrypt))
+            elif decrypt:
+                out.append(xor(self._block(block, True), iv))
+                iv = block
+            else:
+                iv = self._block(xor(block, iv), False)
+                out.append(iv)
+        return b''.join(RefDes.unbits(b) for b in out)
+
+
+def known_answers():
+    """ Published test vectors.  Returns list of failures """
+
+    failed = []
+    for key, pt, ct in des_vectors + tdes_vectors:
+        key, pt, ct = bytes.fromhex(key), bytes.fromhex(pt), bytes.fromhex(ct)
+        k = pyDes.des(key) if len(key) == 8 else pyDes.triple_des(key)
+        if k.encrypt(pt) != ct or k.decrypt(ct) != pt:
+            failed.append('ECB key=%s' % key.hex())
+        if RefCipher(key).crypt(pt) != ct:
+            failed.append('reference ECB key=%s' % key.hex())
+    for key, iv, pt, ct in cbc_vectors:
+        key, iv, pt, ct = bytes.fromhex(key), bytes.fromhex(iv), bytes.fromhex(pt), bytes.fromhex(ct)
+        k = pyDes.des(key, pyDes.CBC, iv)
+        if k.encrypt(pt) != ct or k.decrypt(ct) != pt:
+            failed.append('CBC key=%s' % key.hex())
+    return failed
+
+
+def cross_check(count, seed=1):
+    """ Compare pyDes with the reference engine on random data.  Returns list of failures """
+
+    rnd = random.Random(seed)
+    rb = lambda n: bytes(rnd.getrandbits(8) for i in range(n))
+    failed = []
+    for keylen in (8, 16, 24):
+        cls = pyDes.des if keylen == 8 else pyDes.triple_des
+        for mode in (pyDes.ECB, pyDes.CBC):
+            for padmode, pad in ((pyDes.PAD_NORMAL, b' '), (pyDes.PAD_PKCS5, None)):
+                for i in range(count):
+                    key = rb(keylen)
+                    iv = rb(8) if mode == pyDes.CBC else None
+                    data = rb(rnd.randrange(1, 80))
+                    k = cls(key, mode, iv, padmode=padmode)
+                    padded = k._padData(data, pad, padmode)
+                    expect = RefCipher(key, mode, k.getIV()).crypt(padded)
+                    ct = k.encrypt(data, pad)
+                    name = '%s %s %s len=%d' % (cls.__name__, ['ECB', 'CBC'][mode],
+                                                ['', 'PAD_NORMAL', 'PAD_PKCS5'][padmode], len(data))
+                    if ct != expect:
+                        failed.append('encrypt ' + name)
+                    elif k.decrypt(ct, pad) != k._unpadData(padded, pad, padmode):
+                        failed.append('decrypt ' + name)
+                    if k.encrypt_many([data, data], pad) != [ct, ct]:
+                        failed.append('encrypt_many ' + name)
+    return failed
+
+
+def timed(func, mintime=0.2):
+    """ Return seconds per call """
+
+    n = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        n += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= mintime:
+            return elapsed / n
+
+
+def benchmark(sizes, reference, reflimit, accounts):
+    """ Return {test: value} """
+
+    results = {}
+    key8, key24, iv = b'8bytekey', b'twentyfour byte key 3des', b'\0' * 8
+
+    print('Key setup (us)')
+    n = [0]
+    def newkey():
+        n[0] += 1
+        pyDes.des(n[0].to_bytes(8, 'big'))
+    for name, func in (('des new key', newkey),
+                       ('des cached key', lambda: pyDes.des(key8)),
+                       ('triple_des cached key', lambda: pyDes.triple_des(key24))) + \
+                      ((('reference des key', lambda: RefDes(key8)),) if reference else ()):
+        results['keysetup ' + name] = us = timed(func) * 1e6
+        print('    %-24s %10.1f' % (name, us))
+
+    print('Throughput (blocks/sec)')
+    for size in sizes:
+        data = bytes(random.Random(size).getrandbits(8) for i in range(size))
+        blocks = size // 8
+        tests = []
+        for mode in (pyDes.ECB, pyDes.CBC):
+            m = ['ECB', 'CBC'][mode]
+            tests.append(('des %s' % m, pyDes.des(key8, mode, iv).encrypt, data))
+            tests.append(('triple_des %s' % m, pyDes.triple_des(key24, mode, iv).encrypt, data))
+            if reference and size <= reflimit:
+                tests.append(('reference des %s' % m, RefCipher(key8, mode, iv).crypt, data))
+        for name, func, arg in tests:
+            bps = blocks / timed(lambda: func(arg))
+            results['%s %d' % (name, size)] = bps
+            print('    %-24s %8d B %12.0f' % (name, size, bps))
+
+    print('Account round trip (accounts/sec)')
+    AcctArray = [['SITE%d' % i, '%012d' % (i * 7919), 'CHECKING', 'user%d' % i, 'password%d' % i]
+                 for i in range(accounts)]
+    def roundtrip():
+        a = rlib1.acctEncrypt([list(acct) for acct in AcctArray], key8)
+        rlib1.acctDecrypt(a, key8)
+    aps = accounts / timed(roundtrip)
+    results['acct roundtrip %d' % accounts] = aps
+    print('    %-24s %10d %12.0f' % ('acctEncrypt+acctDecrypt', accounts, aps))
+
+    return results
+
+
+def compare(results, baseline):
+    """ Print change from baseline """
+
+    print('\nChange from baseline (%s)' % baseline.get('date', ''))
+    for name, value in results.items():
+        old = baseline['results'].get(name)
+        if not old:
+            continue
+        #key setup is time per call: lower is better
+        ratio = old / value if name.startswith('keysetup') else value / old
+        print('    %-40s %8.2fx' % (name, ratio))
+
+
+def main(argv):
+    """ Main """
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-s', '--sizes', type=int, nargs='*', default=[8, 64, 1024, 65536, 1048576],
+                        help='input sizes in bytes [default: 8 64 1024 65536 1048576]')
+    parser.add_argument('-a', '--accounts', type=int, default=200, help='accounts for round trip [default: 200]')
+    parser.add_argument('-r', '--reference', action='store_true',
+                        help='also benchmark the reference bit-list engine')
+    parser.add_argument('--reflimit', type=int, default=65536,
+                        help='largest input for the reference engine [default: 65536]')
+    parser.add_argument('--check-only', action='store_true', help='run the correctness tests only')
+    parser.add_argument('--save', action='store_true', help='save results as the baseline')
+    parser.add_argument('--baseline', default=baseline_file, help='baseline file [default: %(default)s]')
+    args = parser.parse_args(argv)
+
+    failed = known_answers() + cross_check(4)
+    for f in failed:
+        print('FAILED: ' + f)
+    print('Correctness: %s' % ('FAILED' if failed else 'OK'))
+    if failed:
+        return 1
+    if args.check_only:
+        return 0
+
+    results = benchmark(sorted(set(args.sizes)), args.reference, args.reflimit, args.accounts)
+
+    if args.save:
+        with open(args.baseline, 'w') as f:
+            json.dump({'date': time.strftime('%Y-%m-%d'), 'python': sys.version.split()[0],
+                       'results': results}, f, indent=1, sort_keys=True)
+        print('\nBaseline saved to %s' % args.baseline)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
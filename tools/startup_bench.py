@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+""" Measure module import time for Getdata.py and Setup.py
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter,
+reports the median cumulative import time and the slowest imports, and
+exits non-zero if a module exceeds the --budget-ms limit.
+
+Default budget: 80 ms per module.  With lazy loading, Getdata and Setup
+import in about 30 ms; importing requests/ofx up front took about 160 ms.
+The budget leaves room for slower machines, but not for an eager requests
+import.  Use --budget-ms 0 to only report.
+"""
+
+import sys
+import os.path
+import statistics
+import subprocess
+import argparse
+
+
+def import_times(module, pkgdir):
+    """ Import module once in a child interpreter and return {name: cumulative_us} """
+
+    stmt = f'import {module}' if module else 'pass'
+    cmd = [sys.executable, '-X', 'importtime', '-c', stmt]
+    proc = subprocess.run(cmd, cwd=pkgdir, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"{stmt} failed:\n{proc.stderr}")
+
+    times = {}
+    for line in proc.stderr.splitlines():
+        #import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        fields = line[12:].split('|')
+        name = fields[2].strip()
+        times[name] = int(fields[1])
+
+    return times
+
+
+def bench(module, pkgdir, runs, top):
+    """ Return median cumulative time (ms) for module over several runs """
+
+    #modules loaded by interpreter startup (site, .pth hooks) aren't ours
+    startup = set(import_times(None, pkgdir))
+
+    totals = []
+    samples = {}
+    for i in range(runs):
+        times = import_times(module, pkgdir)
+        totals.append(times.get(module, 0))
+        for name, us in times.items():
+            if name not in startup:
+                samples.setdefault(name, []).append(us)
+
+    total = statistics.median(totals) / 1000
+    print(f"{module}: {total:.1f} ms (median of {runs})")
+
+    slow = sorted(((statistics.median(v), k) for (k, v) in samples.items() if k != module),
+                  reverse=True)
+    for us, name in slow[:top]:
+        print(f"    {us/1000:8.1f} ms  {name}")
+
+    return total
+
+
+def main(argv):
+    """ Main """
+
+    pkgdir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', default=['Getdata', 'Setup'],
+                        help='modules to import [default: Getdata Setup]')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='runs per module [default: 5]')
+    parser.add_argument('-t', '--top', type=int, default=8, help='slowest imports to list [default: 8]')
+    parser.add_argument('-b', '--budget-ms', type=float, default=80,
+                        help='fail if any module takes longer than this (ms) [default: 80, 0 = no limit]')
+    args = parser.parse_args(argv)
+
+    over = False
+    for module in args.modules:
+        total = bench(module, pkgdir, max(args.runs, 1), args.top)
+        if args.budget_ms and total > args.budget_ms:
+            print(f"    ** over budget ({args.budget_ms:.1f} ms)")
+            over = True
+
+    return 1 if over else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+
+# valuation.py
+# daily market value of investment positions, by account, from the warehouse and quote history
+# Initial version: Oct-2026
+
+# Positions come from the statements saved in the warehouse (warehouse.py, INVPOSLIST).  Accounts
+# are identified by (orgid, acctid), since account numbers are only unique at one institution.
+# Each statement is a complete snapshot of its account: units are carried forward to the following
+# days until the next statement, and a security missing from a later statement is sold (0 units).
+# Prices come from the quote history store (quotehist.py): the last quote each day, carried
+# forward over weekends and holidays.  Securities without quote history use the statement
+# unit price.  Position secids (e.g., CUSIPs) are matched to quote symbols through the
+# warehouse securities table (ticker).
+#
+# All days and positions are valued together as NumPy arrays (positions x days).
+#
+# Returns are holdings-based: each day's return is the value of the previous day's units at
+# today's prices, over their value at yesterday's prices.  Deposits, withdrawals and trades
+# don't count as gains or losses.
+#
+# Example:
+#   import valuation
+#   v = valuation.load('2026-01-01', '2026-06-30')
+#   print(v.total[-1], v.change()['return'], v.change(account=v.accounts[0]))
+#
+# Usage:  valuation.py [-s start] [-e end] [-a acctid] [-o orgid] [--daily]
+#
+# Requires numpy (pip install numpy)
+
+import sys, argparse, logging
+from datetime import datetime, timedelta
+from control2 import *
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+log = logging.getLogger('root')
+
+def _days(dates):
+    #'YYYY-MM-DD...' strings --> numpy datetime64[D] array
+    return np.array([d[:10] for d in dates], dtype='datetime64[D]')
+
+def _carry(dates, values, days, fill):
+    #value at each of days, carried forward from the last of dates on or before it (sorted).
+    #values = 1-d (one series) or 2-d (rows x dates).  days before the first date get fill
+    idx = np.searchsorted(dates, days, side='right') - 1
+    out = values[..., np.maximum(idx, 0)]
+    out[..., idx < 0] = fill
+    return out
+
+class Valuation:
+    """
+    Market value of positions by account and day.
+
+    fields:
+        days      = datetime64[D] array (D)
+        keys      = [(orgid, acctid, secid), ...] (K), grouped by account
+        units     = K x D units held
+        prices    = K x D unit prices (nan if unknown)
+        values    = K x D market values
+        accounts  = [(orgid, acctid), ...] (A)
+        byAccount = A x D market value per account
+        total     = D total market value
+    """
+
+    def __init__(self, positions, quotes, tickers, start, end):
+        #positions = [(orgid, acctid, date, secid, units, unitprice), ...]
+        #quotes    = {symbol: [(time, price), ...] sorted by time}
+        #tickers   = {secid: quote symbol}
+        #start/end = 'YYYY-MM-DD', inclusive
+        if np is None:
+            raise ImportError('valuation.py requires numpy (pip install numpy)')
+
+        self.days = np.arange(np.datetime64(start), np.datetime64(end) + 1, dtype='datetime64[D]')
+        D = len(self.days)
+
+        #statement snapshots per account: {(orgid, acctid): {date: {secid: (units, unitprice)}}}
+        stmts = {}
+        for orgid, acctid, date, secid, units, unitprice in positions:
+            snap = stmts.setdefault((orgid, acctid), {}).setdefault(date[:10], {})
+            u, p = snap.get(secid, (0.0, None))
+            snap[secid] = (u + (units or 0.0), unitprice if unitprice is not None else p)
+
+        self.accounts = sorted(stmts)
+        self.keys = []
+        units, stmtPrices, bounds = [], [], [0]
+        for account in self.accounts:
+            snaps = stmts[account]
+            dates = sorted(snaps)
+            secids = sorted(set(s for d in dates for s in snaps[d]))
+            U = np.zeros((len(secids), len(dates)))
+            P = np.full((len(secids), len(dates)), np.nan)
+            row = {s: i for i, s in enumerate(secids)}
+            for j, d in enumerate(dates):
+                for secid, (u, p) in snaps[d].items():
+                    U[row[secid], j] = u
+                    if p is not None: P[row[secid], j] = p
+            sdays = _days(dates)
+            units.append(_carry(sdays, U, self.days, 0.0))
+            stmtPrices.append(_carry(sdays, P, self.days, np.nan))
+            self.keys.extend(account + (s,) for s in secids)
+            bounds.append(len(self.keys))
+
+        K = len(self.keys)
+        self.units = np.vstack(units) if K else np.zeros((0, D))
+        self.prices = np.vstack(stmtPrices) if K else np.zeros((0, D))
+
+        #quote history prices, where available
+        series = {}
+        for k, (orgid, acctid, secid) in enumerate(self.keys):
+            symbol = tickers.get(secid) or secid
+            if symbol not in series:
+                series[symbol] = self._quoteSeries(quotes.get(symbol))
+            qp = series[symbol]
+            if qp is not None:
+                self.prices[k] = np.where(np.isnan(qp), self.prices[k], qp)
+
+        self.values = np.where(self.units != 0, self.units * np.nan_to_num(self.prices), 0.0)
+        starts = np.array(bounds[:-1], dtype=int)
+        self.byAccount = np.add.reduceat(self.values, starts, axis=0) if K else np.zeros((0, D))
+        self.total = self.values.sum(axis=0)
+
+    def _quoteSeries(self, rows):
+        #daily price series (D) from [(time, price), ...], carried forward.  None if no quotes
+        rows = [r for r in rows or () if r[1] is not None]
+        if not rows: return None
+        qdays = _days([r[0] for r in rows])
+        prices = np.array([r[1] for r in rows], dtype=float)
+        last = np.append(qdays[1:] != qdays[:-1], True)   #last quote of each day
+        return _carry(qdays[last], prices[last], self.days, np.nan)
+
+    def _index(self, day):
+        #index of day in self.days (clipped to the range)
+        i = int(np.searchsorted(self.days, np.datetime64(day), side='right')) - 1
+        return min(max(i, 0), len(self.days) - 1)
+
+    def returns(self, account=None):
+        #holdings-based daily returns (D-1), for all accounts or one (orgid, acctid)
+        rows = slice(None) if account is None else [k for k, key in enumerate(self.keys) if key[:2] == tuple(account)]
+        U, P = self.units[rows], self.prices[rows]
+        #only positions with a price on both days
+        U = np.where(np.isnan(P[:, :-1]) | np.isnan(P[:, 1:]), 0.0, U[:, :-1])
+        P = np.nan_to_num(P)
+        held = (U * P[:, 1:]).sum(axis=0)
+        prev = (U * P[:, :-1]).sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(prev != 0, held / prev - 1, 0.0)
+
+    def change(self, start=None, end=None, account=None):
+        #value change from start to end (dates within the valuation range; default = whole range),
+        #for all accounts or one (orgid, acctid)
+        #returns {'start', 'end', 'value0', 'value1', 'change', 'return'}
+        i = self._index(start) if start else 0
+        j = self._index(end) if end else len(self.days) - 1
+        values = self.total if account is None else self.byAccount[self.accounts.index(tuple(account))]
+        r = self.returns(account)[i:j]
+        return {'start': str(self.days[i]), 'end': str(self.days[j]),
+                'value0': float(values[i]), 'value1': float(values[j]),
+                'change': float(values[j] - values[i]),
+                'return': float(np.prod(1 + r) - 1)}
+
+def load(start, end, acctid=None, warehouseFile=None, quoteFile=None, orgid=None):
+    #build a Valuation from the warehouse and the quote history store.  acctid/orgid select accounts
+    import warehouse, quotehist
+
+    with warehouse.Warehouse(warehouseFile) as wh:
+        positions = [(p['orgid'], p['acctid'], p['date'], p['secid'], p['units'], p['unitprice'])
+                     for p in wh.positions(acctid, None, end) if orgid is None or p['orgid'] == orgid]
+        tickers = {s['secid']: s['ticker'] for s in wh.securities() if s['ticker']}
+
+    #quotes for the held symbols only: the last one before start (carried forward), and start through end
+    before = (datetime.strptime(start, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+    quotes = {}
+    with quotehist.QuoteHistory(quoteFile) as qh:
+        for symbol in set(tickers.get(p[3]) or p[3] for p in positions):
+            rows = qh.latest(symbol, before) + qh.history(symbol, start, end)
+            if rows: quotes[symbol] = [(q['time'], q['price']) for q in rows]
+
+    return Valuation(positions, quotes, tickers, start, end)
+
+def main(argv):
+    """ Main """
+
+    import site_cfg
+    userdat = site_cfg.userdat()
+    today = datetime.now().strftime('%Y-%m-%d')
+    parser = argparse.ArgumentParser(description='Market value of investment positions by account.')
+    parser.add_argument('-s', '--start', help='first day (YYYY-MM-DD) [default: 30 days before end]')
+    parser.add_argument('-e', '--end', default=today, help='last day (YYYY-MM-DD) [default: today]')
+    parser.add_argument('-a', '--account', help='account number (ACCTID) [default: all]')
+    parser.add_argument('-o', '--org', help='institution (ORGID) [default: all]')
+    parser.add_argument('--daily', action='store_true', help='list the total value and return for each day')
+    parser.add_argument('--warehouse', default=userdat.warehouseFile, help='warehouse file [default: %(default)s]')
+    parser.add_argument('--quotes', default=userdat.quoteHistoryFile, help='quote history file [default: %(default)s]')
+    args = parser.parse_args(argv)
+    if not args.start:
+        args.start = (datetime.strptime(args.end, '%Y-%m-%d') - timedelta(days=30)).strftime('%Y-%m-%d')
+
+    if np is None:
+        print('valuation.py requires numpy (pip install numpy)')
+        return 1
+
+    v = load(args.start, args.end, args.account, args.warehouse, args.quotes, args.org)
+    if not v.accounts:
+        print('No positions found in %s' % args.warehouse)
+        return 1
+
+    print('{0:16}{1:20}{2:>16}{3:>16}{4:>14}{5:>10}'.format('Org', 'Account', args.start, args.end, 'Change', 'Return'))
+    print('-'*92)
+    for account in v.accounts + [None]:
+        c = v.change(account=account)
+        if account is None: print('-'*92)
+        orgid, acctid = account or ('', 'Total')
+        print('{0:16}{1:20}{2:16,.2f}{3:16,.2f}{4:14,.2f}{5:9.2f}%'.format(
+              orgid, acctid, c['value0'], c['value1'], c['change'], c['return'] * 100))
+
+    if args.daily:
+        r = np.concatenate(([0.0], v.returns()))
+        print('\n{0:12}{1:>16}{2:>10}'.format('Date', 'Value', 'Return'))
+        for day, value, ret in zip(v.days, v.total, r):
+            print('{0:12}{1:16,.2f}{2:9.2f}%'.format(str(day), value, ret * 100))
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
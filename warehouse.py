@@ -0,0 +1,347 @@
+# warehouse.py
+# http://sites.google.com/site/pocketsense/
+# local SQLite warehouse for downloaded and imported statements
+# Initial version: Oct-2026
+
+# Every scrubbed statement (accounts, transactions, balances, positions and securities) is
+# stored in an SQLite database so reports can query history without re-parsing old OFX files.
+# Enabled in sites.dat with "Warehouse: Yes".  The database file defaults to warehouse.db,
+# and can be changed with "WarehouseFile: filename"
+#
+# Example:
+#   import warehouse
+#   wh = warehouse.Warehouse()
+#   for t in wh.transactions(acctid='12345', start='2026-01-01'):
+#       print(t['date'], t['amount'], t['name'])
+
+import os, re, sqlite3, logging
+from datetime import datetime
+from control2 import *
+
+log = logging.getLogger('root')
+
+_schema = """
+CREATE TABLE IF NOT EXISTS accounts (
+    id          INTEGER PRIMARY KEY,
+    orgid       TEXT NOT NULL,
+    acctid      TEXT NOT NULL,
+    stmttype    TEXT,
+    accttype    TEXT,
+    site        TEXT,
+    curdef      TEXT,
+    updated     TEXT,
+    UNIQUE (orgid, acctid)
+);
+CREATE TABLE IF NOT EXISTS transactions (
+    account     INTEGER NOT NULL REFERENCES accounts(id),
+    fitid       TEXT NOT NULL,
+    date        TEXT,
+    trntype     TEXT,
+    amount      REAL,
+    name        TEXT,
+    memo        TEXT,
+    checknum    TEXT,
+    secid       TEXT,
+    units       REAL,
+    unitprice   REAL,
+    PRIMARY KEY (account, fitid)
+);
+CREATE INDEX IF NOT EXISTS trn_acct_date ON transactions (account, date);
+CREATE INDEX IF NOT EXISTS trn_date      ON transactions (date);
+CREATE INDEX IF NOT EXISTS trn_fitid     ON transactions (fitid);
+CREATE TABLE IF NOT EXISTS balances (
+    account     INTEGER NOT NULL REFERENCES accounts(id),
+    date        TEXT NOT NULL,
+    baltype     TEXT NOT NULL,
+    amount      REAL,
+    PRIMARY KEY (account, date, baltype)
+);
+CREATE INDEX IF NOT EXISTS bal_date ON balances (date);
+CREATE TABLE IF NOT EXISTS positions (
+    account     INTEGER NOT NULL REFERENCES accounts(id),
+    date        TEXT NOT NULL,
+    secid       TEXT NOT NULL,
+    heldinacct  TEXT NOT NULL DEFAULT '',
+    postype     TEXT NOT NULL DEFAULT '',
+    units       REAL,
+    unitprice   REAL,
+    mktval      REAL,
+    PRIMARY KEY (account, date, secid, heldinacct, postype)
+);
+CREATE INDEX IF NOT EXISTS pos_date  ON positions (date);
+CREATE INDEX IF NOT EXISTS pos_secid ON positions (secid);
+CREATE TABLE IF NOT EXISTS securities (
+    secid       TEXT PRIMARY KEY,
+    ticker      TEXT,
+    name        TEXT,
+    sectype     TEXT,
+    unitprice   REAL,
+    date        TEXT
+);
+CREATE INDEX IF NOT EXISTS sec_ticker ON securities (ticker);
+"""
+
+#statement aggregates --> (account aggregate, org id field)
+_stmtTypes = {'STMTRS':    ('BANKACCTFROM', 'BANKID'),
+              'CCSTMTRS':  ('CCACCTFROM',   None),
+              'INVSTMTRS': ('INVACCTFROM',  'BROKERID')}
+
+#captures </close>, tag name and the value (if any) for each tag in an ofx message
+_tagRe = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+_ofxRe = re.compile(r'<OFX>', re.IGNORECASE)
+
+class _Node:
+    #ofx aggregate: fields = {tag: value} for the elements it contains, children = sub-aggregates
+    __slots__ = ('tag', 'fields', 'children')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.fields = {}
+        self.children = []
+
+    def get(self, tag, default=''):
+        return self.fields.get(tag, default)
+
+    def child(self, tag):
+        #first direct sub-aggregate named tag (or None)
+        for c in self.children:
+            if c.tag == tag: return c
+        return None
+
+    def find(self, tag):
+        #all aggregates named tag, anywhere below this one
+        for c in self.children:
+            if c.tag == tag:
+                yield c
+            else:
+                for n in c.find(tag): yield n
+
+    def first(self, tag):
+        return next(self.find(tag), None)
+
+    def search(self, field, default=''):
+        #value of field in this aggregate, or the first sub-aggregate that defines it
+        if field in self.fields: return self.fields[field]
+        for c in self.children:
+            v = c.search(field, None)
+            if v is not None: return v
+        return default
+
+def parseOfx(ofx):
+    #parse an SGML (1.x) or XML (2.x) ofx message into a tree of _Node aggregates
+    #SGML elements have no closing tag, so a tag without a value is assumed to open an aggregate.
+    #An aggregate that is closed implicitly (by the close of its parent) was really an empty
+    #element, and its contents are moved back up to the parent.
+    root = _Node('')
+    stack = [root]
+    m = _ofxRe.search(ofx)
+    start = m.start() if m else 0
+
+    for close, tag, value in _tagRe.findall(ofx, start):
+        tag = tag.upper()
+        if close:
+            for i in range(len(stack)-1, 0, -1):
+                if stack[i].tag == tag: break
+            else:
+                continue    #closing tag for an element (ofx 2.x), or unmatched
+            for k in range(len(stack)-1, i, -1):
+                node, parent = stack[k], stack[k-1]
+                parent.children.remove(node)
+                parent.children.extend(node.children)
+                for f in node.fields: parent.fields.setdefault(f, node.fields[f])
+                parent.fields.setdefault(node.tag, '')
+            del stack[i:]
+        else:
+            value = value.strip()
+            if value:
+                stack[-1].fields.setdefault(tag, value)
+            else:
+                node = _Node(tag)
+                stack[-1].children.append(node)
+                stack.append(node)
+
+    return root
+
+def ofxDate(dt):
+    #ofx date/time (e.g., 20100730120000.000[-4:EDT]) --> 'YYYY-MM-DD'.  Returns '' if invalid.
+    dt = dt.strip()[:8]
+    if len(dt) < 8 or not dt.isdigit(): return ''
+    return dt[:4] + '-' + dt[4:6] + '-' + dt[6:8]
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class Warehouse:
+    """SQLite store of statement history.  See module notes for usage."""
+
+    def __init__(self, dbfile=None):
+        if dbfile is None:
+            import site_cfg
+            dbfile = site_cfg.userdat().warehouseFile
+        self.dbfile = dbfile
+        self.db = sqlite3.connect(dbfile)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(_schema)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    #------------------------------------------------------------------------------
+    # ingest
+
+    def ingestList(self, ofxList):
+        #ingest the files in a Getdata ofxList:  [[sitename, account, ofxFile], ...]
+        count = 0
+        for entry in ofxList:
+            if os.path.exists(entry[2]) and self.ingest(entry[2], entry[0]): count += 1
+        return count
+
+    def ingest(self, filename, site=''):
+        #add the statements in ofx file to the warehouse.  returns number of statements stored.
+        try:
+            with open(filename) as f:
+                tree = parseOfx(f.read())
+        except Exception:
+            log.exception('Warehouse: could not read %s' % filename)
+            return 0
+
+        count = 0
+        with self.db:   #single transaction per file
+            for stmtType in _stmtTypes:
+                for stmt in tree.find(stmtType):
+                    self._ingestStmt(stmt, site)
+                    count += 1
+            self._ingestSecList(tree)
+
+        if Debug: log.debug('Warehouse: %d statement(s) stored from %s' % (count, filename))
+        return count
+
+    def _account(self, stmt, site):
+        fromTag, orgField = _stmtTypes[stmt.tag]
+        acctFrom = stmt.child(fromTag) or _Node(fromTag)
+        orgid = acctFrom.get(orgField) if orgField else ''
+        acctid = acctFrom.get('ACCTID')
+        stmttype = stmt.tag[:-2]    #STMT, CCSTMT, INVSTMT
+        cur = self.db.execute('SELECT id FROM accounts WHERE orgid=? AND acctid=?', (orgid, acctid))
+        row = cur.fetchone()
+        values = (stmttype, acctFrom.get('ACCTTYPE'), site, stmt.get('CURDEF'),
+                  datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        if row:
+            self.db.execute('UPDATE accounts SET stmttype=?, accttype=?, site=?, curdef=?, updated=? WHERE id=?',
+                            values + (row[0],))
+            return row[0]
+        cur = self.db.execute('INSERT INTO accounts (stmttype, accttype, site, curdef, updated, orgid, acctid) '
+                              'VALUES (?,?,?,?,?,?,?)', values + (orgid, acctid))
+        return cur.lastrowid
+
+    def _ingestStmt(self, stmt, site):
+        acct = self._account(stmt, site)
+        trn, bal, pos = [], [], []
+
+        #bank and credit card transactions (also found in investment INVBANKTRAN records)
+        for t in stmt.find('STMTTRN'):
+            trn.append((acct, t.get('FITID'), ofxDate(t.get('DTPOSTED')), t.get('TRNTYPE'),
+                        _float(t.get('TRNAMT')), t.get('NAME'), t.get('MEMO'), t.get('CHECKNUM'),
+                        None, None, None))
+
+        #investment transactions: BUYSTOCK, SELLMF, INCOME, REINVEST, etc.
+        tranList = stmt.child('INVTRANLIST')
+        if tranList:
+            for t in tranList.children:
+                if t.tag == 'INVBANKTRAN': continue
+                invtran = t.first('INVTRAN') or t
+                secid = t.first('SECID')
+                trn.append((acct, invtran.get('FITID'), ofxDate(invtran.get('DTTRADE')), t.tag,
+                            _float(t.search('TOTAL', None)), None, invtran.get('MEMO'), None,
+                            secid.get('UNIQUEID') if secid else None,
+                            _float(t.search('UNITS', None)), _float(t.search('UNITPRICE', None))))
+
+        #balances
+        for tag in ('LEDGERBAL', 'AVAILBAL'):
+            b = stmt.child(tag)
+            if b: bal.append((acct, ofxDate(b.get('DTASOF')), tag, _float(b.get('BALAMT'))))
+
+        dtasof = ofxDate(stmt.get('DTASOF'))
+        invbal = stmt.child('INVBAL')
+        if invbal:
+            for f in ('AVAILCASH', 'MARGINBALANCE', 'SHORTBALANCE', 'BUYPOWER'):
+                if f in invbal.fields: bal.append((acct, dtasof, f, _float(invbal.get(f))))
+            for b in invbal.find('BAL'):
+                bal.append((acct, ofxDate(b.get('DTASOF')) or dtasof, b.get('NAME'), _float(b.get('VALUE'))))
+
+        #positions
+        posList = stmt.child('INVPOSLIST')
+        if posList:
+            for p in posList.find('INVPOS'):
+                secid = p.child('SECID') or _Node('SECID')
+                pos.append((acct, dtasof or ofxDate(p.get('DTPRICEASOF')), secid.get('UNIQUEID'),
+                            p.get('HELDINACCT'), p.get('POSTYPE'), _float(p.get('UNITS')),
+                            _float(p.get('UNITPRICE')), _float(p.get('MKTVAL'))))
+
+        self.db.executemany('INSERT OR REPLACE INTO transactions VALUES (?,?,?,?,?,?,?,?,?,?,?)',
+                            [t for t in trn if t[1]])
+        self.db.executemany('INSERT OR REPLACE INTO balances VALUES (?,?,?,?)', [b for b in bal if b[1]])
+        self.db.executemany('INSERT OR REPLACE INTO positions VALUES (?,?,?,?,?,?,?,?)', [p for p in pos if p[1]])
+
+    def _ingestSecList(self, tree):
+        sec = []
+        for secList in tree.find('SECLIST'):
+            for info in secList.children:
+                secinfo = info.child('SECINFO')
+                if not secinfo: continue
+                secid = secinfo.child('SECID') or _Node('SECID')
+                if not secid.get('UNIQUEID'): continue
+                sec.append((secid.get('UNIQUEID'), secinfo.get('TICKER'), secinfo.get('SECNAME'),
+                            info.tag[:-4],      #STOCKINFO --> STOCK, MFINFO --> MF, etc.
+                            _float(secinfo.get('UNITPRICE', None)), ofxDate(secinfo.get('DTASOF'))))
+        self.db.executemany('INSERT OR REPLACE INTO securities VALUES (?,?,?,?,?,?)', sec)
+
+    #------------------------------------------------------------------------------
+    # queries
+    #   acctid = account number (ACCTID), start/end = 'YYYY-MM-DD' (inclusive)
+    #   all queries return a list of sqlite3.Row records (access by index or column name)
+
+    def _query(self, table, dateField, acctid, start, end, where=(), args=(), order=''):
+        sql = 'SELECT a.acctid, a.orgid, a.site, t.* FROM %s t JOIN accounts a ON a.id = t.account' % table
+        where, args = list(where), list(args)
+        if acctid is not None:
+            where.append('a.acctid = ?'); args.append(acctid)
+        if start:
+            where.append('t.%s >= ?' % dateField); args.append(start)
+        if end:
+            where.append('t.%s <= ?' % dateField); args.append(end)
+        if where: sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY ' + (order or 't.account, t.%s' % dateField)
+        return self.db.execute(sql, args).fetchall()
+
+    def accounts(self):
+        return self.db.execute('SELECT * FROM accounts ORDER BY site, acctid').fetchall()
+
+    def transactions(self, acctid=None, start=None, end=None, fitid=None):
+        where, args = ([], []) if fitid is None else (['t.fitid = ?'], [fitid])
+        return self._query('transactions', 'date', acctid, start, end, where, args)
+
+    def balances(self, acctid=None, start=None, end=None, baltype=None):
+        where, args = ([], []) if baltype is None else (['t.baltype = ?'], [baltype])
+        return self._query('balances', 'date', acctid, start, end, where, args)
+
+    def positions(self, acctid=None, start=None, end=None, secid=None):
+        where, args = ([], []) if secid is None else (['t.secid = ?'], [secid])
+        return self._query('positions', 'date', acctid, start, end, where, args)
+
+    def securities(self, secid=None, ticker=None):
+        sql, args = 'SELECT * FROM securities', []
+        if secid is not None:
+            sql += ' WHERE secid = ?'; args.append(secid)
+        elif ticker is not None:
+            sql += ' WHERE ticker = ?'; args.append(ticker)
+        return self.db.execute(sql + ' ORDER BY ticker', args).fetchall()